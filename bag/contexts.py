@@ -1,25 +1,75 @@
-from django.shortcuts import get_object_or_404
+from decimal import Decimal
+
+from django.http import Http404
+from django.utils.functional import cached_property
+
 from products.models import Product
 
 
-def bag_contents(request):
+class Bag:
+    """
+    Resolve the session bag against the catalog. Products are loaded
+    lazily in a single query the first time the items or total are read.
+    """
+
+    def __init__(self, session_bag):
+        self.session_bag = dict(session_bag)
+
+    @cached_property
+    def items(self):
+        """Return the bag items in session order"""
+
+        # Bag templates only render base product fields, so skip the
+        # polymorphic child table queries
+        products = Product.objects.non_polymorphic().in_bulk(
+            [int(item_id) for item_id in self.session_bag])
+
+        bag_items = []
+        for item_id, quantity in self.session_bag.items():
+            product = products.get(int(item_id))
+            if product is None:
+                raise Http404('No Product matches the given query.')
+            bag_items.append({
+                'item_id': item_id,
+                'quantity': quantity,
+                'product': product,
+            })
+
+        return bag_items
 
-    bag_items = []
-    total = 0
-    bag = request.session.get('bag', {})
+    @cached_property
+    def total(self):
+        """Return the bag subtotal"""
 
-    for item_id, quantity in bag.items():
-        product = get_object_or_404(Product, pk=item_id)
-        total += quantity * product.price
-        bag_items.append({
-            'item_id': item_id,
-            'quantity': quantity,
-            'product': product,
-        })
+        return sum((item['quantity'] * item['product'].price
+                    for item in self.items), Decimal(0))
+
+
+def get_bag(request):
+    """
+    Return the resolved bag for this request, memoized on the request
+    object so it is only computed once per session bag state
+    """
+
+    session_bag = request.session.get('bag', {})
+    bag = getattr(request, '_bag', None)
+
+    if bag is None or bag.session_bag != session_bag:
+        bag = Bag(session_bag)
+        request._bag = bag
+
+    return bag
+
+
+def bag_contents(request):
+    """
+    Expose the bag to templates. Values are callables so that neither
+    the session nor the catalog is touched unless a template reads them.
+    """
 
     context = {
-        'bag_items': bag_items,
-        'total': total,
+        'bag_items': lambda: get_bag(request).items,
+        'total': lambda: get_bag(request).total,
     }
 
     return context
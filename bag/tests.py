@@ -1,3 +1,40 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from monitoring.testing import Budget, QueryBudgetTestCase
+
+
+class BagViewBudgetTests(QueryBudgetTestCase):
+    """Bag views with one item and with a full bag"""
+
+    budgets = {
+        'view_bag': Budget(queries=3, ms=250),
+        'bag_preview': Budget(queries=2, ms=250),
+        'add_to_bag': Budget(queries=6, ms=250),
+        'remove_from_bag': Budget(queries=6, ms=250),
+        'clear_bag': Budget(queries=4, ms=250),
+    }
+
+    def assertBagViewWithinBudget(self, method, path, data=None):
+        self.assertWithinBudget(
+            self.measure(method, path, data, user=self.small,
+                         bag=self.small.bag),
+            self.measure(method, path, data, user=self.large,
+                         bag=self.large.bag))
+
+    def test_view_bag(self):
+        self.assertBagViewWithinBudget('get', reverse('view_bag'))
+
+    def test_bag_preview(self):
+        self.assertBagViewWithinBudget('get', reverse('bag_preview'))
+
+    def test_add_to_bag(self):
+        self.assertBagViewWithinBudget(
+            'post', reverse('add_to_bag', args=[self.catalog[-1]]),
+            {'redirect_url': reverse('view_bag')})
+
+    def test_remove_from_bag(self):
+        self.assertBagViewWithinBudget(
+            'post', reverse('remove_from_bag', args=[self.catalog[0]]))
+
+    def test_clear_bag(self):
+        self.assertBagViewWithinBudget('post', reverse('clear_bag'))
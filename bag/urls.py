@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.view_bag, name='view_bag'),
+    path('preview/', views.bag_preview, name='bag_preview'),
     path('add/<item_id>/', views.add_to_bag, name='add_to_bag'),
     path('remove/<item_id>/', views.remove_from_bag, name='remove_from_bag'),
     path('clear', views.clear_bag, name='clear_bag'),
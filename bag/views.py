@@ -1,7 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404, HttpResponse
 from django.contrib import messages
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.views.decorators.cache import never_cache
 from products.models import Product
 
+from .contexts import get_bag
+
 
 def view_bag(request):
     """Return shopping bag template"""
@@ -9,6 +14,23 @@ def view_bag(request):
     return render(request, 'bag/bag.html')
 
 
+@never_cache
+def bag_preview(request):
+    """
+    Return the bag counter and preview markup, loaded by the client so
+    that page html does not depend on the session bag
+    """
+
+    bag = get_bag(request)
+    count = len(bag.items)
+    html = ''
+
+    if count:
+        html = render_to_string('bag/bag_button.html', request=request)
+
+    return JsonResponse({'count': count, 'html': html})
+
+
 def add_to_bag(request, item_id):
     """Add product to bag"""
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderLineItem
+from .models import Order, OrderLineItem, WebhookEvent
 
 
 class OrderLineItemAdminInline(admin.TabularInline):
@@ -18,13 +18,32 @@ class OrderAdmin(admin.ModelAdmin):
               'email', 'phone_number', 'country',
               'postcode', 'town_or_city', 'street_address1',
               'street_address2', 'county', 'delivery_cost',
-              'order_total', 'grand_total', 'original_bag', 'stripe_pid')
+              'order_total', 'grand_total', 'original_bag', 'stripe_pid',
+              'oversold')
 
     list_display = ('order_number', 'date', 'full_name',
                     'order_total', 'delivery_cost',
-                    'grand_total',)
+                    'grand_total', 'oversold')
+
+    list_filter = ('oversold',)
 
     ordering = ('-date',)
 
 
 admin.site.register(Order, OrderAdmin)
+
+
+class WebhookEventAdmin(admin.ModelAdmin):
+    readonly_fields = ('event_id', 'event_type', 'payload', 'status',
+                       'attempts', 'deliveries', 'received', 'next_attempt',
+                       'processed', 'duration', 'last_error')
+
+    list_display = ('event_id', 'event_type', 'status', 'attempts',
+                    'deliveries', 'received', 'processed', 'duration')
+
+    list_filter = ('status', 'event_type')
+    search_fields = ('event_id',)
+    ordering = ('-received',)
+
+
+admin.site.register(WebhookEvent, WebhookEventAdmin)
@@ -7,3 +7,5 @@ class CheckoutConfig(AppConfig):
 
     def ready(self):
         import checkout.signals
+        from checkout.payments import configure_stripe
+        configure_stripe()
@@ -0,0 +1,118 @@
+"""
+A minimal in-memory stand-in for the Stripe PaymentIntents API, used to
+benchmark checkout offline. Point STRIPE_API_BASE at it.
+"""
+
+import json
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+INTENT_PATH = re.compile(r'^/v1/payment_intents/(?P<id>[^/]+)(?P<cancel>/cancel)?$')
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """Serve the fake API, sleeping latency seconds before each response"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, FakeStripeHandler)
+        self.latency = latency
+        self.intents = {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Request-Id', f'req_{secrets.token_hex(8)}')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _error(self, status, message):
+        self._respond(status, {'error': {
+            'type': 'invalid_request_error', 'message': message}})
+
+    def _params(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/_calls':
+            with server.lock:
+                self._respond(200, dict(server.calls))
+            return
+
+        match = INTENT_PATH.match(self.path)
+        time.sleep(server.latency)
+        with server.lock:
+            server.calls['retrieve'] += 1
+            intent = server.intents.get(match['id']) if match else None
+        if intent is None:
+            self._error(404, 'No such payment_intent')
+        else:
+            self._respond(200, intent)
+
+    def do_POST(self):
+        server = self.server
+        params = self._params()
+        time.sleep(server.latency)
+
+        if self.path == '/v1/payment_intents':
+            intent_id = f'pi_{secrets.token_hex(12)}'
+            intent = {
+                'id': intent_id,
+                'object': 'payment_intent',
+                'amount': int(params.get('amount', 0)),
+                'currency': params.get('currency', 'gbp'),
+                'client_secret': f'{intent_id}_secret_{secrets.token_hex(12)}',
+                'status': 'requires_payment_method',
+                'metadata': {},
+            }
+            with server.lock:
+                server.calls['create'] += 1
+                server.intents[intent_id] = intent
+            self._respond(200, intent)
+            return
+
+        match = INTENT_PATH.match(self.path)
+        with server.lock:
+            intent = server.intents.get(match['id']) if match else None
+            if intent is None:
+                self._error(404, 'No such payment_intent')
+                return
+            if intent['status'] in ('succeeded', 'canceled'):
+                self._error(400, f'This PaymentIntent has a status of '
+                                 f'{intent["status"]}')
+                return
+
+            if match['cancel']:
+                server.calls['cancel'] += 1
+                intent['status'] = 'canceled'
+            else:
+                server.calls['modify'] += 1
+                if 'amount' in params:
+                    intent['amount'] = int(params['amount'])
+                for key, value in params.items():
+                    if key.startswith('metadata['):
+                        intent['metadata'][key[9:-1]] = value
+            self._respond(200, intent)
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, get_user_model)
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from checkout.fake_stripe import FakeStripeServer
+from checkout.models import CheckoutIntent
+from checkout.payments import (aprepare_checkout, configure_stripe,
+                               prepare_checkout)
+from products import inventory
+from products.models import Collectible
+
+
+class Command(BaseCommand):
+    help = ('Compare checkout preparation throughput of sync workers, '
+            'the async path and the checkout page served by the ASGI '
+            'handler against a local fake Stripe')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Simulated Stripe latency in seconds')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Sync workers, as gunicorn processes')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Requests in flight on the async path')
+
+    def requests(self, count):
+        return [SimpleNamespace(session=SessionStore())
+                for _ in range(count)]
+
+    def run_sync(self, requests, bag, workers):
+        retries = []
+
+        def prepare(request):
+            try:
+                while True:
+                    try:
+                        return prepare_checkout(request, bag, 1000)
+                    except DatabaseError:
+                        # SQLite reports lock contention as an error
+                        # instead of waiting, so retry
+                        retries.append(request)
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(prepare, requests))
+
+        if retries:
+            self.stdout.write(f'Retried {len(retries)} sync checkout(s) on '
+                              f'database errors, each can repeat a Stripe call')
+
+    def sessions(self, count, user, bag):
+        """Sessions of a logged in customer with the bag, as cookies"""
+
+        sessions = []
+        for _ in range(count):
+            session = SessionStore()
+            session.update({
+                SESSION_KEY: str(user.pk),
+                BACKEND_SESSION_KEY: 'django.contrib.auth.backends.ModelBackend',
+                HASH_SESSION_KEY: user.get_session_auth_hash(),
+                'bag': bag,
+            })
+            session.create()
+            sessions.append(SimpleNamespace(session=session))
+        return sessions
+
+    def run_asgi(self, requests, concurrency):
+        """
+        Request the checkout page through the whole ASGI handler, the
+        middleware included, as Uvicorn would
+        """
+
+        application = ASGIHandler()
+        path = reverse('checkout')
+        statuses = []
+
+        async def get(request):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'},
+                'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'root_path': '', 'server': ('localhost', 80),
+                'client': ('127.0.0.1', 0),
+                'headers': [
+                    (b'host', b'localhost'),
+                    (b'cookie', f'{settings.SESSION_COOKIE_NAME}='
+                                f'{request.session.session_key}'.encode()),
+                ],
+            }
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            await application(scope, receive, send)
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+
+            async def limited(request):
+                async with limit:
+                    await get(request)
+
+            await asyncio.gather(*[limited(request) for request in requests])
+
+        asyncio.run(main())
+
+        failed = [status for status in statuses if status != 200]
+        if failed:
+            self.stderr.write(f'{len(failed)} checkout page(s) were not '
+                              f'served, statuses {sorted(set(failed))}')
+            if connection.vendor == 'sqlite':
+                # Each ASGI request runs its sync code on a thread of its
+                # own and SQLite fails concurrent writes
+                self.stderr.write('SQLite reports "database is locked" for '
+                                  'concurrent checkouts, benchmark the ASGI '
+                                  'handler on PostgreSQL')
+
+    def run_async(self, requests, bag, concurrency):
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+
+            async def prepare(request):
+                async with limit:
+                    return await aprepare_checkout(request, bag, 1000)
+
+            return await asyncio.gather(*[prepare(request)
+                                          for request in requests])
+
+        return asyncio.run(main())
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(('127.0.0.1', 0),
+                                  latency=options['latency'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        count = options['requests']
+        product = Collectible.objects.create(
+            name='Async checkout benchmark', description='',
+            sku=f'BENCHMARK-{uuid.uuid4().hex[:8]}',
+            price=Decimal('10.00'), quantity=count * 3)
+        bag = {str(product.pk): 1}
+        user = get_user_model().objects.create_user(
+            f'benchmark-{uuid.uuid4().hex[:8]}')
+        session_keys = []
+
+        try:
+            with override_settings(STRIPE_API_BASE=server.url,
+                                   STRIPE_SECRET_KEY='sk_test_benchmark'):
+                configure_stripe()
+                for mode in ('sync', 'async', 'asgi'):
+                    if mode == 'asgi':
+                        requests = self.sessions(count, user, bag)
+                    else:
+                        requests = self.requests(count)
+                    start = time.perf_counter()
+                    if mode == 'sync':
+                        self.run_sync(requests, bag, options['workers'])
+                    elif mode == 'async':
+                        self.run_async(requests, bag,
+                                       options['concurrency'])
+                    else:
+                        self.run_asgi(requests, options['concurrency'])
+                    elapsed = time.perf_counter() - start
+                    session_keys += [request.session.session_key
+                                     for request in requests]
+                    self.stdout.write(
+                        f'{mode}: {count} checkouts in {elapsed:.2f}s '
+                        f'({count / elapsed:.1f}/s)')
+        finally:
+            configure_stripe()
+            server.shutdown()
+            server.server_close()
+            intents = CheckoutIntent.objects.filter(
+                session_key__in=session_keys)
+            inventory.release_all(
+                intents.values_list('payment_intent', flat=True))
+            intents.delete()
+            Session.objects.filter(session_key__in=session_keys).delete()
+            product.delete()
+            user.delete()
+
+        self.stdout.write(f'Stripe calls: {dict(server.calls)}')
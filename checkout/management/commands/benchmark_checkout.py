@@ -0,0 +1,87 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from checkout.fake_stripe import FakeStripeServer
+from checkout.models import CheckoutIntent
+from checkout.payments import configure_stripe
+from products import inventory
+from products.models import Collectible
+
+
+class Command(BaseCommand):
+    help = ('Load the checkout page repeatedly against a local fake Stripe '
+            'and report latency and Stripe calls')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--latency', type=float, default=0.25,
+                            help='Simulated Stripe latency in seconds')
+        parser.add_argument('--no-reuse', action='store_true',
+                            help='Create a PaymentIntent on every load, '
+                                 'as checkout used to')
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(('127.0.0.1', 0),
+                                  latency=options['latency'])
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        user = get_user_model().objects.create_user(
+            f'benchmark-{uuid.uuid4().hex[:8]}', password=None)
+        product = Collectible.objects.create(
+            name='Checkout benchmark', description='',
+            sku=f'BENCHMARK-{uuid.uuid4().hex[:8]}',
+            price=Decimal('10.00'), quantity=options['requests'])
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        session = client.session
+        session['bag'] = {str(product.pk): 1}
+        session.save()
+
+        timings = []
+        try:
+            with override_settings(STRIPE_API_BASE=server.url,
+                                   STRIPE_SECRET_KEY='sk_test_benchmark'):
+                configure_stripe()
+                for _ in range(options['requests']):
+                    if options['no_reuse']:
+                        CheckoutIntent.objects.filter(
+                            session_key=session.session_key).delete()
+                    start = time.perf_counter()
+                    response = client.get(reverse('checkout'))
+                    timings.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        self.stderr.write(
+                            f'Checkout returned {response.status_code} {response.get("Location")}')
+                        return
+        finally:
+            configure_stripe()
+            server.shutdown()
+            server.server_close()
+            intents = CheckoutIntent.objects.filter(
+                session_key=session.session_key)
+            inventory.release_all(
+                intents.values_list('payment_intent', flat=True))
+            inventory.release_all(server.intents)
+            intents.delete()
+            product.delete()
+            user.delete()
+
+        timings.sort()
+        p95 = timings[max(0, round(len(timings) * 0.95) - 1)]
+        self.stdout.write(f'Checkout loads: {len(timings)}, '
+                          f'mean {statistics.mean(timings) * 1000:.1f}ms, '
+                          f'p95 {p95 * 1000:.1f}ms')
+        calls = ', '.join(f'{name} {count}' for name, count in
+                          sorted(server.calls.items()))
+        self.stdout.write(f'Stripe calls: {calls or "none"}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from checkout.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = 'Serve a local fake of the Stripe PaymentIntents API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds to wait before each response')
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(('127.0.0.1', options['port']),
+                                  latency=options['latency'])
+        self.stdout.write(f'Serving fake Stripe on {server.url}, run the '
+                          f'site with STRIPE_API_BASE={server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
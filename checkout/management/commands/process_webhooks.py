@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from checkout import webhook_worker
+
+
+class Command(BaseCommand):
+    help = ('Process stored Stripe webhooks that have no queued task, '
+            'retrying failures with backoff')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process the events that are due and exit')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when no events are due')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            processed = webhook_worker.process_due(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} webhook(s)')
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from checkout import sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and per product sales rollups from every order'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        totalled = sales.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Totalled {totalled} order(s)'))
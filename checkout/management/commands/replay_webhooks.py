@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from checkout import webhook_worker
+from checkout.models import WebhookEvent
+from checkout.tasks import process_webhook
+
+
+class Command(BaseCommand):
+    help = ('Queue failed or stuck Stripe webhooks from the event ledger '
+            'for replay')
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*',
+                            help='Stripe event ids to replay')
+        parser.add_argument('--failed', action='store_true',
+                            help='Replay every failed event')
+        parser.add_argument('--stuck', action='store_true',
+                            help='Replay every event whose processing '
+                                 'outlived its lease')
+        parser.add_argument('--force', action='store_true',
+                            help='Also replay events still within their '
+                                 'processing lease')
+        parser.add_argument('--process', action='store_true',
+                            help='Process the replayed events now instead '
+                                 'of leaving them to the worker')
+
+    def handle(self, *args, **options):
+        if options['event_ids']:
+            webhook_events = WebhookEvent.objects.filter(
+                event_id__in=options['event_ids'])
+            missing = set(options['event_ids']) - set(
+                webhook_events.values_list('event_id', flat=True))
+            if missing:
+                raise CommandError(
+                    f'Unknown event id(s): {", ".join(sorted(missing))}')
+        elif options['failed'] or options['stuck']:
+            statuses = []
+            if options['failed']:
+                statuses.append(WebhookEvent.FAILED)
+            if options['stuck']:
+                statuses.append(WebhookEvent.PROCESSING)
+            webhook_events = WebhookEvent.objects.filter(status__in=statuses)
+        else:
+            raise CommandError('Give event ids, --failed or --stuck')
+
+        pks = list(webhook_events.values_list('pk', flat=True))
+        queued = webhook_worker.replay(WebhookEvent.objects.filter(pk__in=pks),
+                                       force=options['force'])
+        self.stdout.write(f'Queued {queued} webhook(s) for replay')
+
+        if options['process']:
+            processed = webhook_worker.process_due()
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {processed} webhook(s)'))
+        else:
+            for pk in pks:
+                process_webhook.delay(pk)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from checkout import payments
+
+
+class Command(BaseCommand):
+    help = 'Cancel the PaymentIntents of abandoned checkouts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None,
+                            help='Idle seconds before a checkout is '
+                                 'abandoned, defaults to the reservation TTL')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        swept = payments.sweep_abandoned(max_age=options['max_age'],
+                                         batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Swept {swept} abandoned PaymentIntent(s)'))
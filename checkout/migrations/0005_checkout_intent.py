@@ -0,0 +1,25 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0004_order_user_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutIntent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('payment_intent', models.CharField(max_length=254, unique=True)),
+                ('client_secret', models.CharField(max_length=254)),
+                ('amount', models.PositiveIntegerField()),
+                ('bag_fingerprint', models.CharField(max_length=40)),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
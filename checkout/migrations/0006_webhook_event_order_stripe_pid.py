@@ -0,0 +1,56 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:38
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.utils.timezone
+
+
+def rename_duplicate_orders(apps, schema_editor):
+    """
+    Keep the stripe_pid on the first order of each payment intent and
+    mark the duplicates created by repeated webhooks, so staff can find
+    them with a search for ':duplicate:'
+    """
+
+    Order = apps.get_model('checkout', 'Order')
+    duplicated = (Order.objects.exclude(stripe_pid='').values('stripe_pid')
+                  .annotate(orders=Count('pk'), first=Min('pk'))
+                  .filter(orders__gt=1))
+    for row in duplicated:
+        for order in Order.objects.filter(
+                stripe_pid=row['stripe_pid']).exclude(pk=row['first']):
+            order.stripe_pid = f'{row["stripe_pid"]}:duplicate:{order.pk}'
+            order.save(update_fields=['stripe_pid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0005_checkout_intent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=100)),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('received', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.RunPython(rename_duplicate_orders,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('stripe_pid', ''), _negated=True), fields=('stripe_pid',), name='unique_order_stripe_pid'),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(fields=['status', 'next_attempt'], name='checkout_we_status_7e65ad_idx'),
+        ),
+    ]
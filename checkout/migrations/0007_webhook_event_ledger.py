@@ -0,0 +1,63 @@
+import json
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def set_event_ids(apps, schema_editor):
+    """
+    Fill in the Stripe event ids. Deliveries stored more than once keep
+    the id on their first row, preferring one already processed, and
+    the others are marked as duplicates so the id can be unique.
+    """
+
+    WebhookEvent = apps.get_model('checkout', 'WebhookEvent')
+    seen = set()
+    webhook_events = WebhookEvent.objects.annotate(
+        processed_first=Case(When(status='done', then=Value(0)),
+                             default=Value(1))).order_by(
+                                 'processed_first', 'pk')
+    for webhook_event in webhook_events:
+        event_id = (json.loads(webhook_event.payload).get('id')
+                    or f'unknown_{webhook_event.pk}')
+        if event_id in seen:
+            event_id = f'{event_id}:duplicate:{webhook_event.pk}'
+        seen.add(event_id)
+        webhook_event.event_id = event_id
+        webhook_event.save(update_fields=['event_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0006_webhook_event_order_stripe_pid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.RunPython(set_event_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='processed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='deliveries',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
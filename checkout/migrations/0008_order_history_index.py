@@ -0,0 +1,17 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0007_webhook_event_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_profile', '-date'], name='order_history_idx'),
+        ),
+    ]
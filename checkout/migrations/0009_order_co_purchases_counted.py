@@ -0,0 +1,22 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0008_order_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='co_purchases_counted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('co_purchases_counted', False)), fields=['id'], name='order_copurchase_todo_idx'),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:51
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def total_existing_orders(apps, schema_editor):
+    """Flag the orders placed so far and total them into the rollups"""
+
+    Order = apps.get_model('checkout', 'Order')
+    OrderLineItem = apps.get_model('checkout', 'OrderLineItem')
+    DailySales = apps.get_model('checkout', 'DailySales')
+    DailyCategorySales = apps.get_model('checkout', 'DailyCategorySales')
+    ProductSales = apps.get_model('checkout', 'ProductSales')
+
+    def totals():
+        return {'orders': set(), 'units': 0, 'revenue': 0}
+
+    days = defaultdict(totals)
+    categories = defaultdict(totals)
+    products = defaultdict(totals)
+    details = {}
+
+    Order.objects.update(sales_recorded=True)
+    for (order_id, date, product_id, name, category, product_type, quantity,
+         total) in OrderLineItem.objects.values_list(
+            'order_id', 'order__date', 'product_id', 'product__name',
+            'product__category__name', 'product__polymorphic_ctype__model',
+            'quantity', 'lineitem_total').iterator(chunk_size=2000):
+        day = timezone.localdate(date)
+        category = category or ''
+        for row in (days[day], categories[(day, category, product_type)],
+                    products[product_id]):
+            row['orders'].add(order_id)
+            row['units'] += quantity
+            row['revenue'] += total
+
+        last_sold = details.get(product_id, {}).get('last_sold', day)
+        details[product_id] = {'name': name, 'category': category,
+                               'product_type': product_type,
+                               'last_sold': max(day, last_sold)}
+
+    def amounts(row):
+        return {'orders': len(row['orders']), 'units': row['units'],
+                'revenue': row['revenue']}
+
+    DailySales.objects.bulk_create([
+        DailySales(day=day, **amounts(row)) for day, row in days.items()
+    ], batch_size=2000)
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(day=day, category=category,
+                           product_type=product_type, **amounts(row))
+        for (day, category, product_type), row in categories.items()
+    ], batch_size=2000)
+    ProductSales.objects.bulk_create([
+        ProductSales(product_id=product_id, **amounts(row),
+                     **details[product_id])
+        for product_id, row in products.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_recommendations'),
+        ('checkout', '0009_order_co_purchases_counted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(blank=True, max_length=254)),
+                ('product_type', models.CharField(max_length=100)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily category sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=254)),
+                ('category', models.CharField(blank=True, max_length=254)),
+                ('product_type', models.CharField(max_length=100)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_sold', models.DateField()),
+            ],
+            options={
+                'verbose_name_plural': 'Product sales',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='sales_recorded',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='productsales',
+            index=models.Index(fields=['-revenue'], name='productsales_revenue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category', 'product_type'), name='unique_daily_category_sales'),
+        ),
+        migrations.RunPython(total_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.0.2 on 2026-10-17 21:54
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def total_recorded_orders(apps, schema_editor):
+    OrderLineItem = apps.get_model('checkout', 'OrderLineItem')
+    DailyProductSales = apps.get_model('checkout', 'DailyProductSales')
+
+    totals = defaultdict(lambda: {'orders': set(), 'units': 0, 'revenue': 0})
+    for order_id, date, product_id, quantity, total in (
+            OrderLineItem.objects.filter(order__sales_recorded=True)
+            .values_list('order_id', 'order__date', 'product_id', 'quantity',
+                         'lineitem_total').iterator(chunk_size=2000)):
+        row = totals[(timezone.localdate(date), product_id)]
+        row['orders'].add(order_id)
+        row['units'] += quantity
+        row['revenue'] += total
+
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(day=day, product_id=product_id,
+                          orders=len(row['orders']), units=row['units'],
+                          revenue=row['revenue'])
+        for (day, product_id), row in totals.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_recommendations'),
+        ('checkout', '0010_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product sales',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='unique_daily_product_sales'),
+        ),
+        migrations.RunPython(total_recorded_orders, migrations.RunPython.noop),
+    ]
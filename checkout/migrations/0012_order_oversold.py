@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0011_daily_product_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='oversold',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,7 +1,8 @@
 import uuid
 
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Q, Sum
+from django.utils import timezone
 
 from django_countries.fields import CountryField
 
@@ -10,6 +11,23 @@ from profiles.models import UserProfile
 
 
 class Order(models.Model):
+
+    class Meta:
+        constraints = [
+            # Lets the webhook find an order by its PaymentIntent alone and
+            # stops it from duplicating one saved by the checkout view
+            models.UniqueConstraint(fields=['stripe_pid'],
+                                    condition=~Q(stripe_pid=''),
+                                    name='unique_order_stripe_pid'),
+        ]
+        indexes = [
+            models.Index(fields=['user_profile', '-date'],
+                         name='order_history_idx'),
+            # Orders not yet counted by products.recommendations
+            models.Index(fields=['id'], condition=Q(co_purchases_counted=False),
+                         name='order_copurchase_todo_idx'),
+        ]
+
     order_number = models.CharField(max_length=32, null=False, editable=False)
     user_profile = models.ForeignKey(
         UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
@@ -33,6 +51,10 @@ class Order(models.Model):
     original_bag = models.TextField(null=False, blank=False, default='')
     stripe_pid = models.CharField(
         max_length=254, null=False, blank=False, default='')
+    co_purchases_counted = models.BooleanField(default=False, editable=False)
+    sales_recorded = models.BooleanField(default=False, editable=False)
+    # Paid for after its stock ran out, see checkout.orders.build_order
+    oversold = models.BooleanField(default=False)
 
     def _generate_order_number(self):
         return uuid.uuid4().hex.upper()
@@ -70,10 +92,148 @@ class OrderLineItem(models.Model):
     def save(self, *args, **kwargs):
         """
         Override the original save method to set the lineitem total and update the order total.
+        Stock is decremented per order by products.inventory.purchase.
         """
         self.lineitem_total = self.product.price * self.quantity
-        self.product.purchase()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f'SKU {self.product.sku} on order {self.order.order_number}'
+
+
+class CheckoutIntent(models.Model):
+    """
+    Stripe PaymentIntent reused by a session's checkout for as long as
+    it stays unpaid, so page loads do not create a new one every time
+    """
+
+    session_key = models.CharField(max_length=40, unique=True)
+    payment_intent = models.CharField(max_length=254, unique=True)
+    client_secret = models.CharField(max_length=254)
+    amount = models.PositiveIntegerField()
+    bag_fingerprint = models.CharField(max_length=40)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.payment_intent} for session {self.session_key}'
+
+
+class WebhookEvent(models.Model):
+    """
+    Ledger entry for a verified Stripe webhook, stored when it is
+    received and processed by the process_webhooks worker. Deliveries of
+    an event id already in the ledger are not processed again.
+    """
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    received = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    processed = models.DateTimeField(null=True, blank=True)
+    # seconds the handler took on its last attempt
+    duration = models.FloatField(null=True, blank=True)
+    deliveries = models.PositiveIntegerField(default=1)
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f'{self.event_id} {self.event_type} ({self.status})'
+
+
+class DailySales(models.Model):
+    """Sales of a day, kept by checkout.sales"""
+
+    class Meta:
+        verbose_name_plural = 'Daily sales'
+
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return str(self.day)
+
+
+class DailyCategorySales(models.Model):
+    """Sales of a day for one category and product type"""
+
+    class Meta:
+        verbose_name_plural = 'Daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'product_type'],
+                                    name='unique_daily_category_sales'),
+        ]
+
+    day = models.DateField()
+    category = models.CharField(max_length=254, blank=True)
+    product_type = models.CharField(max_length=100)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.day} {self.category} {self.product_type}'
+
+
+class DailyProductSales(models.Model):
+    """Sales of a day for one product"""
+
+    class Meta:
+        verbose_name_plural = 'Daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'],
+                                    name='unique_daily_product_sales'),
+        ]
+
+    day = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.day} {self.product_id}'
+
+
+class ProductSales(models.Model):
+    """All time sales of a product"""
+
+    class Meta:
+        verbose_name_plural = 'Product sales'
+        indexes = [
+            models.Index(fields=['-revenue'], name='productsales_revenue_idx'),
+        ]
+
+    product = models.OneToOneField(
+        Product, primary_key=True, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=254)
+    category = models.CharField(max_length=254, blank=True)
+    product_type = models.CharField(max_length=100)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_sold = models.DateField()
+
+    def __str__(self):
+        return self.name
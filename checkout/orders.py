@@ -0,0 +1,112 @@
+import logging
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from products import inventory
+from products.models import Product
+
+from . import summaries, tasks
+from .models import CheckoutIntent, Order, OrderLineItem
+
+logger = logging.getLogger(__name__)
+
+_deferred = threading.local()
+
+
+@transaction.atomic
+def build_order(order, bag, payment_intent=None):
+    """
+    Save an unsaved order together with the line items of a bag in a
+    fixed number of queries: one fetch for every product, one insert for
+    the order, one bulk insert for the line items and one stock update.
+    The sales rollups are updated by a task queued with the order.
+
+    Raises Product.DoesNotExist if a product in the bag is gone, in
+    which case nothing is saved. An order with a payment intent has been
+    paid for, so it is saved even if its reservation expired and the
+    stock can no longer cover it: it is flagged as oversold for staff to
+    restock or refund. Orders without one raise inventory.OutOfStock
+    instead.
+    """
+
+    items = {int(item_id): quantity for item_id, quantity in bag.items()}
+    products = Product.objects.non_polymorphic().in_bulk(list(items))
+
+    missing = set(items) - set(products)
+    if missing:
+        raise Product.DoesNotExist(f'Products {sorted(missing)} not found')
+
+    line_items = [
+        OrderLineItem(
+            order=order,
+            product=products[product_id],
+            quantity=quantity,
+            lineitem_total=products[product_id].price * quantity,
+        )
+        for product_id, quantity in items.items()
+    ]
+
+    # Totals are computed once here, bulk_create skips the per line item
+    # update_total signal
+    order.order_total = sum((line_item.lineitem_total
+                             for line_item in line_items), Decimal(0))
+    order.grand_total = order.order_total + order.delivery_cost
+    order.save()
+
+    OrderLineItem.objects.bulk_create(line_items)
+    oversold = inventory.purchase(items, payment_intent=payment_intent,
+                                  oversell=bool(payment_intent))
+    if oversold:
+        logger.warning('Order %s for %s oversold product(s) %s',
+                       order.order_number, payment_intent, oversold)
+        order.oversold = True
+        order.save(update_fields=['oversold'])
+    if payment_intent:
+        # The session must not reuse an intent that has been paid
+        CheckoutIntent.objects.filter(payment_intent=payment_intent).delete()
+    tasks.record_order_sales.delay(order.pk)
+
+    return order
+
+
+@contextmanager
+def deferred_totals():
+    """
+    Collect the orders whose totals are updated inside the block, such
+    as by the delete signal of each line item cascaded from a bulk
+    product delete, and update them all in one statement when it exits
+    """
+
+    _deferred.order_ids = set()
+    try:
+        yield
+        order_ids = _deferred.order_ids
+    finally:
+        _deferred.order_ids = None
+    update_totals(order_ids)
+
+
+def update_totals(order_ids):
+    """Recompute the totals of orders from their line items"""
+
+    if getattr(_deferred, 'order_ids', None) is not None:
+        _deferred.order_ids.update(order_ids)
+        return
+
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+
+    lineitems_total = Coalesce(Subquery(
+        OrderLineItem.objects.filter(order=OuterRef('pk')).values(
+            'order').annotate(total=Sum('lineitem_total')).values('total')),
+        Value(Decimal(0)))
+    orders = Order.objects.filter(pk__in=order_ids)
+    orders.update(order_total=lineitems_total,
+                  grand_total=lineitems_total + F('delivery_cost'))
+    summaries.invalidate_orders(orders.values_list('order_number', flat=True))
@@ -0,0 +1,196 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+import requests
+import stripe
+from asgiref.sync import sync_to_async
+
+from products import inventory
+
+from .models import CheckoutIntent, Order
+
+
+# Runs the Stripe calls of async views, one thread per pooled connection
+stripe_executor = ThreadPoolExecutor(max_workers=settings.STRIPE_POOL_SIZE,
+                                     thread_name_prefix='stripe')
+
+
+def _stripe_call(func):
+    return sync_to_async(func, thread_sensitive=False,
+                         executor=stripe_executor)
+
+
+def configure_stripe():
+    """
+    Point the Stripe client at its account once per process. Calls share
+    a pooled HTTP session with explicit timeouts, so concurrent requests
+    reuse connections instead of opening one per call.
+    """
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE or 'https://api.stripe.com'
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = stripe.http_client.RequestsClient(
+        timeout=settings.STRIPE_TIMEOUT, session=session)
+
+
+def bag_fingerprint(bag):
+    """Return a digest identifying the contents of a bag"""
+
+    return hashlib.sha1(
+        json.dumps(bag, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _intent_params(amount):
+    return {
+        'amount': amount,
+        'currency': settings.STRIPE_CURRENCY,
+        'automatic_payment_methods': {'enabled': True},
+    }
+
+
+def _current_intent(request):
+    """Return the session key and the CheckoutIntent it has, if any"""
+
+    if request.session.session_key is None:
+        request.session.save()
+    session_key = request.session.session_key
+
+    return session_key, CheckoutIntent.objects.filter(
+        session_key=session_key).first()
+
+
+def _store_intent(session_key, intent, amount, fingerprint):
+    checkout_intent, _ = CheckoutIntent.objects.update_or_create(
+        session_key=session_key,
+        defaults={
+            'payment_intent': intent.id,
+            'client_secret': intent.client_secret,
+            'amount': amount,
+            'bag_fingerprint': fingerprint,
+        })
+    return checkout_intent
+
+
+def _hold_stock(checkout_intent, bag, amount, fingerprint):
+    """
+    Reserve the bag for the intent unless an unchanged bag is still
+    held, in which case its reservation is only extended
+    """
+
+    if (checkout_intent.bag_fingerprint != fingerprint or
+            not inventory.extend(checkout_intent.payment_intent)):
+        inventory.reserve(checkout_intent.payment_intent, bag)
+
+    checkout_intent.amount = amount
+    checkout_intent.bag_fingerprint = fingerprint
+    checkout_intent.save()
+
+
+def prepare_checkout(request, bag, amount):
+    """
+    Return the CheckoutIntent of the session with stock held for the bag.
+    The session's PaymentIntent is reused across page loads, Stripe is
+    only called to create one or to modify one whose amount has changed.
+    Raises inventory.OutOfStock if the bag cannot be reserved.
+    """
+
+    session_key, checkout_intent = _current_intent(request)
+    fingerprint = bag_fingerprint(bag)
+
+    if checkout_intent is not None and checkout_intent.amount != amount:
+        try:
+            stripe.PaymentIntent.modify(checkout_intent.payment_intent,
+                                        amount=amount)
+        except stripe.error.InvalidRequestError:
+            # The intent was confirmed or canceled and can no longer change
+            inventory.release(checkout_intent.payment_intent)
+            checkout_intent = None
+
+    if checkout_intent is None:
+        intent = stripe.PaymentIntent.create(**_intent_params(amount))
+        checkout_intent = _store_intent(session_key, intent, amount,
+                                        fingerprint)
+
+    _hold_stock(checkout_intent, bag, amount, fingerprint)
+    return checkout_intent
+
+
+async def aprepare_checkout(request, bag, amount):
+    """
+    Async prepare_checkout. Stripe calls run on stripe_executor so a
+    process can keep many in flight, database work stays on the thread
+    sensitive executor.
+    """
+
+    session_key, checkout_intent = await sync_to_async(_current_intent)(
+        request)
+    fingerprint = bag_fingerprint(bag)
+
+    if checkout_intent is not None and checkout_intent.amount != amount:
+        try:
+            await _stripe_call(stripe.PaymentIntent.modify)(
+                checkout_intent.payment_intent, amount=amount)
+        except stripe.error.InvalidRequestError:
+            await sync_to_async(inventory.release)(
+                checkout_intent.payment_intent)
+            checkout_intent = None
+
+    if checkout_intent is None:
+        intent = await _stripe_call(stripe.PaymentIntent.create)(
+            **_intent_params(amount))
+        checkout_intent = await sync_to_async(_store_intent)(
+            session_key, intent, amount, fingerprint)
+
+    await sync_to_async(_hold_stock)(checkout_intent, bag, amount,
+                                     fingerprint)
+    return checkout_intent
+
+
+def sweep_abandoned(max_age=None, batch_size=100):
+    """
+    Cancel the PaymentIntents of checkouts left idle for longer than
+    max_age seconds and release their stock, a batch at a time. Intents
+    that became orders are only forgotten. Returns the number swept.
+    """
+
+    max_age = max_age or settings.STOCK_RESERVATION_TTL
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    swept = 0
+
+    while True:
+        batch = dict(CheckoutIntent.objects.filter(
+            updated__lte=cutoff).values_list(
+                'pk', 'payment_intent')[:batch_size])
+        if not batch:
+            break
+
+        paid = set(Order.objects.filter(
+            stripe_pid__in=list(batch.values())).values_list(
+                'stripe_pid', flat=True))
+        abandoned = [pid for pid in batch.values() if pid not in paid]
+
+        # Stripe has no bulk cancel, but the stock goes back in one UPDATE
+        for pid in abandoned:
+            try:
+                stripe.PaymentIntent.cancel(pid)
+            except stripe.error.InvalidRequestError:
+                # Already succeeded or canceled
+                pass
+        inventory.release_all(abandoned)
+
+        CheckoutIntent.objects.filter(pk__in=list(batch)).delete()
+        swept += len(batch)
+
+    return swept
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (DailyCategorySales, DailyProductSales, DailySales,
+                     Order, OrderLineItem, ProductSales)
+
+LINEITEM_FIELDS = ('order_id', 'order__date', 'product_id', 'product__name',
+                   'product__category__name',
+                   'product__polymorphic_ctype__model', 'quantity',
+                   'lineitem_total')
+
+
+class _Totals:
+    """
+    Running totals of one rollup row. Line items arrive grouped by order,
+    so an order is counted when it differs from the last one seen.
+    """
+
+    def __init__(self):
+        self.orders = 0
+        self.units = 0
+        self.revenue = Decimal(0)
+        self.last_order = None
+        self.extra = {}
+
+    def add(self, order_id, quantity, total):
+        if order_id != self.last_order:
+            self.orders += 1
+            self.last_order = order_id
+        self.units += quantity
+        self.revenue += total
+
+    def amounts(self):
+        return {'orders': self.orders, 'units': self.units,
+                'revenue': self.revenue}
+
+
+def _rollup(lineitems):
+    """
+    Total line item rows, grouped by order, by day, by day, category and
+    product type, by day and product, and by product
+    """
+
+    days = defaultdict(_Totals)
+    categories = defaultdict(_Totals)
+    day_products = defaultdict(_Totals)
+    products = defaultdict(_Totals)
+
+    for (order_id, date, product_id, name, category, product_type,
+         quantity, total) in lineitems:
+        day = timezone.localdate(date)
+        category = category or ''
+
+        days[day].add(order_id, quantity, total)
+        categories[(day, category, product_type)].add(
+            order_id, quantity, total)
+        day_products[(day, product_id)].add(order_id, quantity, total)
+
+        product = products[product_id]
+        product.add(order_id, quantity, total)
+        product.extra = {'name': name, 'category': category,
+                         'product_type': product_type,
+                         'last_sold': max(day, product.extra.get(
+                             'last_sold', day))}
+
+    return days, categories, day_products, products
+
+
+def _add(model, lookup, amounts, extra=None):
+    """Add amounts to a rollup row with a single UPDATE, creating it if new"""
+
+    increments = {field: F(field) + value for field, value in amounts.items()}
+    if model.objects.filter(**lookup).update(**increments, **(extra or {})):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **amounts, **(extra or {}))
+    except IntegrityError:
+        # Created by a concurrent order in the meantime
+        model.objects.filter(**lookup).update(**increments, **(extra or {}))
+
+
+def record_order(order_id):
+    """
+    Add an order to the rollups once. The order is flagged in the same
+    transaction, so running this again for it does nothing. Returns
+    whether the order was recorded.
+    """
+
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, sales_recorded=False).update(
+                sales_recorded=True):
+            return False
+
+        days, categories, day_products, products = _rollup(
+            OrderLineItem.objects.filter(order_id=order_id).values_list(
+                *LINEITEM_FIELDS))
+
+        for day, totals in days.items():
+            _add(DailySales, {'day': day}, totals.amounts())
+        for (day, category, product_type), totals in categories.items():
+            _add(DailyCategorySales, {'day': day, 'category': category,
+                                      'product_type': product_type},
+                 totals.amounts())
+        for (day, product_id), totals in day_products.items():
+            _add(DailyProductSales, {'day': day, 'product_id': product_id},
+                 totals.amounts())
+        for product_id, totals in products.items():
+            _add(ProductSales, {'product_id': product_id}, totals.amounts(),
+                 totals.extra)
+
+    return True
+
+
+@transaction.atomic
+def rebuild(batch_size=2000):
+    """
+    Replace the rollups with totals of every order. Orders whose record
+    task has not run yet are flagged first, so it skips them. Returns the
+    number of orders totalled.
+    """
+
+    Order.objects.filter(sales_recorded=False).update(sales_recorded=True)
+    DailySales.objects.all().delete()
+    DailyCategorySales.objects.all().delete()
+    DailyProductSales.objects.all().delete()
+    ProductSales.objects.all().delete()
+
+    days, categories, day_products, products = _rollup(OrderLineItem.objects.filter(
+        order__sales_recorded=True).order_by('order_id').values_list(
+            *LINEITEM_FIELDS).iterator(chunk_size=batch_size))
+
+    DailySales.objects.bulk_create([
+        DailySales(day=day, **totals.amounts())
+        for day, totals in days.items()
+    ], batch_size=batch_size)
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(day=day, category=category,
+                           product_type=product_type, **totals.amounts())
+        for (day, category, product_type), totals in categories.items()
+    ], batch_size=batch_size)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(day=day, product_id=product_id, **totals.amounts())
+        for (day, product_id), totals in day_products.items()
+    ], batch_size=batch_size)
+    ProductSales.objects.bulk_create([
+        ProductSales(product_id=product_id, **totals.amounts(),
+                     **totals.extra)
+        for product_id, totals in products.items()
+    ], batch_size=batch_size)
+
+    return Order.objects.filter(sales_recorded=True).count()
@@ -1,7 +1,9 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from .models import OrderLineItem
+from . import orders
+from .models import Order, OrderLineItem
+from .summaries import invalidate_order
 
 
 @receiver(post_save, sender=OrderLineItem)
@@ -15,4 +17,12 @@ def update_on_save(sender, instance, created, **kwargs):
 def update_on_delete(sender, instance, **kwargs):
     """Update order total on lineitem delete"""
 
-    instance.order.update_total()
+    orders.update_totals([instance.order_id])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_summary(sender, instance, **kwargs):
+    """Drop the cached summaries of a changed order"""
+
+    invalidate_order(instance.order_number)
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+
+from .models import OrderLineItem
+
+SUMMARY_TIMEOUT = 60 * 60 * 24 * 7
+
+# Templates rendering one order, cached per order number
+TEMPLATES = {
+    'history': 'profiles/order.html',
+    'details': 'checkout/order_details.html',
+}
+
+
+def summary_key(order_number, part):
+    return f'order:{part}:{order_number}'
+
+
+def prefetch_lineitems(orders):
+    """
+    Load the line items and products of orders in one query. Products
+    are joined as base rows since summaries only show base fields.
+    """
+
+    prefetch_related_objects(orders, Prefetch(
+        'lineitems', queryset=OrderLineItem.objects.select_related(
+            'product').order_by('pk')))
+
+
+def render_orders(orders, part, request=None):
+    """
+    Return the rendered part of each order, in order. Saved orders no
+    longer change short of admin edits, which invalidate them, so each
+    is rendered once and then served from the cache with one lookup per
+    page. Line items are only loaded for the orders that were missing.
+    """
+
+    orders = list(orders)
+    keys = {order.pk: summary_key(order.order_number, part)
+            for order in orders}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [order for order in orders if keys[order.pk] not in cached]
+    if missing:
+        prefetch_lineitems(missing)
+        rendered = {
+            keys[order.pk]: render_to_string(TEMPLATES[part],
+                                             {'order': order}, request)
+            for order in missing}
+        cache.set_many(rendered, SUMMARY_TIMEOUT)
+        cached.update(rendered)
+
+    return [cached[keys[order.pk]] for order in orders]
+
+
+def invalidate_order(order_number):
+    """Drop the cached summaries of an order once the change commits"""
+
+    invalidate_orders([order_number])
+
+
+def invalidate_orders(order_numbers):
+    """Drop the cached summaries of orders once the change commits"""
+
+    keys = [summary_key(order_number, part)
+            for order_number in order_numbers for part in TEMPLATES]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,29 @@
+from taskqueue.registry import task
+
+from . import sales, webhook_worker
+from .models import WebhookEvent
+
+
+@task
+def process_webhook(webhook_event_id):
+    """
+    Process a stored webhook if it is due, queueing the next attempt when
+    its handler asks to be retried
+    """
+
+    webhook_event = WebhookEvent.objects.filter(
+        pk=webhook_event_id).first()
+    if webhook_event is None or not webhook_worker.claim(webhook_event):
+        return
+
+    webhook_worker.process_event(webhook_event)
+    if webhook_event.status == WebhookEvent.PENDING:
+        process_webhook.schedule(webhook_event.next_attempt,
+                                 webhook_event_id)
+
+
+@task
+def record_order_sales(order_id):
+    """Add a new order to the sales rollups"""
+
+    sales.record_order(order_id)
@@ -1,3 +1,285 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+import stripe
+
+from checkout import orders, tasks, webhook_worker
+from checkout.fake_stripe import FakeStripeServer
+from checkout.models import Order, WebhookEvent
+from checkout.payments import configure_stripe
+from monitoring.testing import Budget, QueryBudgetTestCase
+from products import inventory
+from products.models import Book
+from taskqueue.models import Task
+
+WEBHOOK_SECRET = 'whsec_test'
+
+ADDRESS = {
+    'full_name': 'Budget Customer',
+    'email': 'budget@example.com',
+    'phone_number': '01234567890',
+    'country': 'GB',
+    'postcode': 'AB1 2CD',
+    'town_or_city': 'Town',
+    'street_address1': '1 Street',
+    'street_address2': '',
+    'county': '',
+}
+
+
+class CheckoutViewBudgetTests(QueryBudgetTestCase):
+    """Checkout with one item and with a full bag, against fake Stripe"""
+
+    budgets = {
+        'checkout': Budget(queries=20, ms=500),
+        'checkout_success': Budget(queries=8, ms=250),
+        'cache_checkout_data': Budget(queries=3, ms=250),
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripeServer(('127.0.0.1', 0))
+        threading.Thread(target=cls.stripe.serve_forever, daemon=True).start()
+        cls.stripe_settings = override_settings(
+            STRIPE_API_BASE=cls.stripe.url, STRIPE_SECRET_KEY='sk_test_budget')
+        cls.stripe_settings.enable()
+        configure_stripe()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stripe_settings.disable()
+        configure_stripe()
+        cls.stripe.shutdown()
+        cls.stripe.server_close()
+        super().tearDownClass()
+
+    def test_checkout(self):
+        path = reverse('checkout')
+        self.assertWithinBudget(
+            self.measure('get', path, user=self.small, bag=self.small.bag),
+            self.measure('get', path, user=self.large, bag=self.large.bag))
+
+    def test_place_order(self):
+        path = reverse('checkout')
+        small = self.measure(
+            'post', path, {**ADDRESS, 'client_secret': 'pi_small_secret_x'},
+            user=self.small, bag=self.small.bag)
+        large = self.measure(
+            'post', path, {**ADDRESS, 'client_secret': 'pi_large_secret_x'},
+            user=self.large, bag=self.large.bag)
+        self.assertEqual(large.response.status_code, 302)
+        self.assertEqual(Order.objects.get(
+            stripe_pid='pi_large_secret_x'.split('_secret')[0]
+        ).lineitems.count(), len(self.large.bag))
+        self.assertWithinBudget(small, large)
+
+    def test_checkout_success(self):
+        orders = {order.user_profile_id: order for order in Order.objects.filter(
+            user_profile__in=[self.small.userprofile, self.large.userprofile])}
+        self.assertWithinBudget(
+            self.measure('get', reverse('checkout_success', args=[
+                orders[self.small.userprofile.pk].order_number]),
+                user=self.small, bag=self.small.bag),
+            self.measure('get', reverse('checkout_success', args=[
+                orders[self.large.userprofile.pk].order_number]),
+                user=self.large, bag=self.large.bag))
+
+    def test_cache_checkout_data(self):
+        path = reverse('cache_checkout_data')
+        intent = stripe.PaymentIntent.create(amount=1000, currency='gbp')
+        data = json.dumps({'client_secret': intent.client_secret,
+                           'save_info': True})
+        small = self.measure('post', path, data, user=self.small,
+                             bag=self.small.bag,
+                             content_type='application/json')
+        large = self.measure('post', path, data, user=self.large,
+                             bag=self.large.bag,
+                             content_type='application/json')
+
+        # The bag is on the intent before the view returns
+        metadata = self.stripe.intents[intent.id]['metadata']
+        self.assertEqual(json.loads(metadata['bag']), self.large.bag)
+        self.assertEqual(metadata['username'], self.large.username)
+        self.assertWithinBudget(small, large)
+
+    def test_cache_checkout_data_rejected_by_stripe(self):
+        response = self.measure(
+            'post', reverse('cache_checkout_data'),
+            json.dumps({'client_secret': 'pi_missing_secret_x'}),
+            user=self.small, content_type='application/json').response
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STRIPE_WH_SECRET=WEBHOOK_SECRET, WEBHOOK_ORDER_GRACE=0)
+class WebhookLedgerTests(TestCase):
+    """Stripe webhooks are stored once and build at most one order"""
+
+    def setUp(self):
+        self.book = Book.objects.create(name='Horus Rising', description='',
+                                        price='10.00', quantity=5)
+
+    def payment_succeeded(self, event_id='evt_1', pid='pi_ledger'):
+        address = {'line1': '1 Street', 'line2': '', 'city': 'Town',
+                   'state': '', 'postal_code': 'AB1 2CD', 'country': 'GB'}
+        return {
+            'id': event_id,
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'data': {'object': {
+                'id': pid,
+                'object': 'payment_intent',
+                'metadata': {'bag': json.dumps({str(self.book.pk): 2}),
+                             'save_info': 'false', 'username': 'Anonymous'},
+                'charges': {'object': 'list', 'data': [{
+                    'billing_details': {'email': 'customer@example.com'}}]},
+                'shipping': {'name': 'Customer', 'phone': '01234567890',
+                             'address': address},
+            }},
+        }
+
+    def deliver(self, event):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(WEBHOOK_SECRET.encode('utf-8'),
+                             f'{timestamp}.{payload}'.encode('utf-8'),
+                             hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('webhook'), payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}')
+
+    def process(self, webhook_event):
+        tasks.process_webhook(webhook_event.pk)
+        webhook_event.refresh_from_db()
+        return webhook_event
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(
+            reverse('webhook'), json.dumps(self.payment_succeeded()),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE='t=1,v1=bad')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_duplicate_delivery_is_ignored(self):
+        event = self.payment_succeeded()
+        self.assertEqual(self.deliver(event).status_code, 200)
+        response = self.deliver(event)
+        self.assertContains(response, 'Duplicate ignored')
+
+        webhook_event = WebhookEvent.objects.get()
+        self.assertEqual(webhook_event.deliveries, 2)
+        self.assertEqual(Task.objects.filter(
+            name=tasks.process_webhook.name).count(), 1)
+
+        self.assertEqual(self.process(webhook_event).status,
+                         WebhookEvent.DONE)
+        self.process(webhook_event)
+        self.assertEqual(Order.objects.filter(
+            stripe_pid='pi_ledger').count(), 1)
+
+    def test_abandoned_processing_is_reclaimed(self):
+        self.deliver(self.payment_succeeded())
+        webhook_event = WebhookEvent.objects.get()
+
+        # The worker is killed while building the order
+        with mock.patch.object(orders, 'build_order',
+                               side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                tasks.process_webhook(webhook_event.pk)
+        webhook_event.refresh_from_db()
+        self.assertEqual(webhook_event.status, WebhookEvent.PROCESSING)
+
+        # Nobody else takes it while the lease lasts
+        self.assertEqual(webhook_worker.process_due(), 0)
+        self.assertFalse(webhook_worker.claim(webhook_event))
+
+        WebhookEvent.objects.update(
+            next_attempt=webhook_event.next_attempt - timedelta(
+                seconds=settings.WEBHOOK_LEASE + 1))
+        self.assertEqual(webhook_worker.process_due(), 1)
+        webhook_event.refresh_from_db()
+        self.assertEqual(webhook_event.status, WebhookEvent.DONE)
+        self.assertEqual(Order.objects.filter(
+            stripe_pid='pi_ledger').count(), 1)
+
+    def test_replay_stuck_events(self):
+        self.deliver(self.payment_succeeded())
+        webhook_event = WebhookEvent.objects.get()
+        self.assertTrue(webhook_worker.claim(webhook_event))
+        out = io.StringIO()
+
+        call_command('replay_webhooks', '--stuck', '--process', stdout=out)
+        self.assertIn('Queued 0 webhook(s)', out.getvalue())
+        self.assertFalse(Order.objects.exists())
+
+        call_command('replay_webhooks', 'evt_1', '--force', '--process',
+                     stdout=out)
+        self.assertIn('Queued 1 webhook(s)', out.getvalue())
+        webhook_event.refresh_from_db()
+        self.assertEqual(webhook_event.status, WebhookEvent.DONE)
+        self.assertEqual(Order.objects.filter(
+            stripe_pid='pi_ledger').count(), 1)
+
+    def test_retried_failure_creates_one_order(self):
+        self.deliver(self.payment_succeeded())
+        webhook_event = WebhookEvent.objects.get()
+
+        with mock.patch.object(inventory, 'purchase',
+                               side_effect=DatabaseError('database is locked')):
+            webhook_event = self.process(webhook_event)
+        self.assertEqual(webhook_event.status, WebhookEvent.PENDING)
+        self.assertEqual(webhook_event.attempts, 1)
+        self.assertIn('database is locked', webhook_event.last_error)
+        self.assertFalse(Order.objects.exists())
+
+        # The failed attempt queued its retry
+        self.assertTrue(Task.objects.filter(
+            name=tasks.process_webhook.name,
+            run_after=webhook_event.next_attempt).exists())
+        WebhookEvent.objects.update(next_attempt=webhook_event.received)
+        self.assertEqual(self.process(webhook_event).status,
+                         WebhookEvent.DONE)
+
+        # A redelivery of the event and a later event for the same
+        # payment find the order already built
+        self.deliver(self.payment_succeeded())
+        self.deliver(self.payment_succeeded(event_id='evt_2'))
+        self.process(WebhookEvent.objects.get(event_id='evt_2'))
+
+        order = Order.objects.get(stripe_pid='pi_ledger')
+        self.assertEqual(order.lineitems.get().quantity, 2)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.quantity, 3)
+
+    def test_paid_order_is_kept_when_its_reservation_expired(self):
+        inventory.reserve('pi_ledger', {self.book.pk: 2})
+        # The reservation runs out while the customer is paying and the
+        # stock is sold to someone else
+        released = inventory.release_expired(
+            now=timezone.now() + timedelta(days=1))
+        self.assertEqual(released, 2)
+        inventory.purchase({self.book.pk: 4})
+
+        self.deliver(self.payment_succeeded())
+        self.assertEqual(self.process(WebhookEvent.objects.get()).status,
+                         WebhookEvent.DONE)
+
+        order = Order.objects.get(stripe_pid='pi_ledger')
+        self.assertTrue(order.oversold)
+        self.assertEqual(order.lineitems.get().quantity, 2)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.quantity, self.book.reserved), (0, 0))
@@ -1,18 +1,24 @@
 import json
 
 from django.conf import settings
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404, render, redirect, reverse, HttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 
 import stripe
+from asgiref.sync import sync_to_async
 
-from bag.contexts import bag_contents
+from bag.contexts import get_bag
+from products import inventory
 from products.models import Product
 from profiles.models import UserProfile
 
 from .forms import OrderForm
-from .models import Order, OrderLineItem
+from .models import Order
+from .orders import build_order
+from .payments import aprepare_checkout
+from .summaries import render_orders
 
 
 @require_POST
@@ -20,11 +26,12 @@ def cache_checkout_data(request):
     try:
         data = json.loads(request.body.decode('utf-8'))
         pid = data.get('client_secret').split('_secret')[0]
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        # Synchronous, checkout.js confirms the payment once this returns
+        # and the payment webhook builds the order from this metadata
         stripe.PaymentIntent.modify(pid, metadata={
             'bag': json.dumps(request.session.get('bag', {})),
             'save_info': data.get('save_info'),
-            'username': request.user,
+            'username': str(request.user),
         })
         return HttpResponse(status=200)
     except Exception as error:
@@ -33,71 +40,75 @@ def cache_checkout_data(request):
         return HttpResponse(content=error, status=400)
 
 
-def checkout(request):
-    """Return checkout template and handle checkout logic"""
+def _place_order(request, user_profile):
+    """
+    Save the order from the checkout form, returning the redirect to
+    follow or None if the form is invalid
+    """
 
-    stripe_public_key = settings.STRIPE_PUBLIC_KEY
-    stripe_secret_key = settings.STRIPE_SECRET_KEY
+    bag = request.session.get('bag', {})
 
-    user_profile = get_object_or_404(UserProfile, user=request.user)
+    if 'address' in request.POST:
+        address = user_profile.addresses.get(
+            id=request.POST.get('address'))
+        form_data = {
+            'full_name': request.POST['full_name'],
+            'email': request.POST['email'],
+            'phone_number': address.phone_number,
+            'country': address.country,
+            'postcode': address.postcode,
+            'town_or_city': address.town_or_city,
+            'street_address1': address.street_address1,
+            'street_address2': address.street_address2,
+            'county': address.county,
+        }
+    else:
+        form_data = {
+            'full_name': request.POST['full_name'],
+            'email': request.POST['email'],
+            'phone_number': request.POST['phone_number'],
+            'country': request.POST['country'],
+            'postcode': request.POST['postcode'],
+            'town_or_city': request.POST['town_or_city'],
+            'street_address1': request.POST['street_address1'],
+            'street_address2': request.POST['street_address2'],
+            'county': request.POST['county'],
+        }
+
+    order_form = OrderForm(form_data)
+
+    if order_form.is_valid():
+        order = order_form.save(commit=False)
+        pid = request.POST.get('client_secret').split('_secret')[0]
+        order.stripe_pid = pid
+        order.original_bag = json.dumps(bag)
+        try:
+            build_order(order, bag, payment_intent=pid)
+        except IntegrityError:
+            # The payment webhook has already saved this order
+            order = get_object_or_404(Order, stripe_pid=pid)
+        except Product.DoesNotExist:
+            messages.error(
+                request, ("One of the products in your bag could not be found. Please contact us for assistance!"))
+            return redirect(reverse('view_bag'))
 
-    if request.method == 'POST':
-        bag = request.session.get('bag', {})
-
-        if 'address' in request.POST:
-            address = user_profile.addresses.get(
-                id=request.POST.get('address'))
-            form_data = {
-                'full_name': request.POST['full_name'],
-                'email': request.POST['email'],
-                'phone_number': address.phone_number,
-                'country': address.country,
-                'postcode': address.postcode,
-                'town_or_city': address.town_or_city,
-                'street_address1': address.street_address1,
-                'street_address2': address.street_address2,
-                'county': address.county,
-            }
-        else:
-            form_data = {
-                'full_name': request.POST['full_name'],
-                'email': request.POST['email'],
-                'phone_number': request.POST['phone_number'],
-                'country': request.POST['country'],
-                'postcode': request.POST['postcode'],
-                'town_or_city': request.POST['town_or_city'],
-                'street_address1': request.POST['street_address1'],
-                'street_address2': request.POST['street_address2'],
-                'county': request.POST['county'],
-            }
-
-        order_form = OrderForm(form_data)
-
-        if order_form.is_valid():
-            order = order_form.save(commit=False)
-            pid = request.POST.get('client_secret').split('_secret')[0]
-            order.stripe_pid = pid
-            order.original_bag = json.dumps(bag)
-            order.save()
-            for item_id, item_data in bag.items():
-                try:
-                    product = Product.objects.get(id=item_id)
-                    order_line_item = OrderLineItem(
-                        order=order,
-                        product=product,
-                        quantity=item_data,
-                    )
-                    order_line_item.save()
-                except Product.DoesNotExist:
-                    messages.error(
-                        request, ("One of the products in your bag could not be found. Please contact us for assistance!"))
-                    order.delete()
-                    return redirect(reverse('view_bag'))
-
-            return redirect(reverse('checkout_success', args=[order.order_number]))
-        else:
-            messages.error(request,
-                           'There was an error with your form. Please double check your details')
+        if order.oversold:
+            messages.warning(
+                request, 'Some items in your order sold out while you were '
+                         'paying, we will be in touch about them shortly')
+        return redirect(reverse('checkout_success', args=[order.order_number]))
+    else:
+        messages.error(request,
+                       'There was an error with your form. Please double check your details')
+
+    return None
+
+
+def _checkout_bag(request):
+    """
+    Return the session bag and its total in pence, with a redirect to
+    follow instead if the bag is empty
+    """
 
     bag = request.session.get('bag', {})
 
@@ -105,20 +116,17 @@ def checkout(request):
         if request.user.is_authenticated:
             messages.error(
                 request, 'There are no items in your bag currently')
-            return redirect(reverse('products'))
+            return bag, 0, redirect(reverse('products'))
         else:
             messages.error(request, 'Please log in to proceed to checkout')
-            return redirect(reverse('products'))
-
-    current_bag = bag_contents(request)
-    total = current_bag['total']
-    stripe_total = round(total * 100)
-    stripe.api_key = stripe_secret_key
-    intent = stripe.PaymentIntent.create(
-        amount=stripe_total,
-        currency=settings.STRIPE_CURRENCY,
-        automatic_payment_methods={'enabled': True},
-    )
+            return bag, 0, redirect(reverse('products'))
+
+    total = get_bag(request).total
+    return bag, round(total * 100), None
+
+
+def _render_checkout(request, user_profile, checkout_intent):
+    stripe_public_key = settings.STRIPE_PUBLIC_KEY
 
     order_form = OrderForm()
     addresses = user_profile.addresses.all()
@@ -130,13 +138,42 @@ def checkout(request):
     context = {
         'order_form': order_form,
         'stripe_public_key': stripe_public_key,
-        'client_secret': intent.client_secret,
+        'client_secret': checkout_intent.client_secret,
         'addresses': addresses,
     }
 
     return render(request, template, context)
 
 
+async def checkout(request):
+    """
+    Return checkout template and handle checkout logic. Stripe calls are
+    awaited so they do not hold a worker while in flight.
+    """
+
+    user_profile = await sync_to_async(get_object_or_404)(
+        UserProfile, user=request.user)
+
+    if request.method == 'POST':
+        response = await sync_to_async(_place_order)(request, user_profile)
+        if response is not None:
+            return response
+
+    bag, stripe_total, response = await sync_to_async(_checkout_bag)(request)
+    if response is not None:
+        return response
+
+    try:
+        checkout_intent = await aprepare_checkout(request, bag, stripe_total)
+    except inventory.OutOfStock:
+        messages.error(
+            request, 'Sorry, some items in your bag are no longer available')
+        return redirect(reverse('view_bag'))
+
+    return await sync_to_async(_render_checkout)(request, user_profile,
+                                                 checkout_intent)
+
+
 def checkout_success(request, order_number):
     """Handle successful checkout"""
 
@@ -144,8 +181,9 @@ def checkout_success(request, order_number):
 
     if request.user.is_authenticated:
         profile = UserProfile.objects.get(user=request.user)
-        order.user_profile = profile
-        order.save()
+        if order.user_profile_id != profile.pk:
+            order.user_profile = profile
+            order.save(update_fields=['user_profile'])
 
     messages.success(request, 'Your order was successfully placed!')
 
@@ -155,6 +193,7 @@ def checkout_success(request, order_number):
     template = 'checkout/checkout_success.html'
     context = {
         'order': order,
+        'order_html': render_orders([order], 'details', request)[0],
     }
 
     return render(request, template, context)
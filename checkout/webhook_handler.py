@@ -1,113 +1,88 @@
 import json
-import time
-from django.http import HttpResponse
+from datetime import timedelta
 
-from checkout.models import Order, OrderLineItem
-from products.models import Product
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from checkout.models import Order
+from checkout import orders
+from products import inventory
+
+
+class RetryLater(Exception):
+    """Raised when an event cannot be handled yet and should be retried"""
 
 
 class StripeWebhookHandler:
-    """Handle Stripe webhooks"""
+    """
+    Handle stored Stripe webhooks. Handlers return a short description
+    of what they did and raise to have the event retried.
+    """
 
-    def __init__(self, request):
-        self.request = request
+    def __init__(self, webhook_event):
+        self.webhook_event = webhook_event
+
+    def handle(self, event):
+        event_map = {
+            'payment_intent.succeeded': self.handle_payment_intent_succeeded,
+            'payment_intent.payment_failed': self.handle_payment_intent_failed,
+            'payment_intent.canceled': self.handle_payment_intent_canceled,
+        }
+        event_handler = event_map.get(event['type'], self.handle_event)
+
+        return event_handler(event)
 
     def handle_event(self, event):
         """Handle a generic/unknown/unexpected webhook event"""
-        return HttpResponse(
-            content=f'Unhandled webhook received: {event["type"]}',
-            status=200
-        )
+        return f'Unhandled webhook received: {event["type"]}'
 
     def handle_payment_intent_succeeded(self, event):
         intent = event.data.object
         pid = intent.id
         bag = intent.metadata.bag
-        save_info = intent.metadata.save_info
+
+        if Order.objects.filter(stripe_pid=pid).exists():
+            return 'Verified order already in database'
+
+        # The checkout view normally saves the order moments after the
+        # payment, so give it a chance before creating one from here
+        grace = timedelta(seconds=settings.WEBHOOK_ORDER_GRACE)
+        if timezone.now() < self.webhook_event.received + grace:
+            raise RetryLater(f'Order for {pid} not saved yet')
 
         billing_details = intent.charges.data[0].billing_details
         shipping_details = intent.shipping
-        grand_total = round(intent.charges.data[0].amount / 100, 2)
 
         for field, value in shipping_details.address.items():
             if value == "":
                 shipping_details.address[field] = None
 
-        order_exists = False
-        attempt = 1
-        while attempt <= 5:
-            try:
-                order = Order.objects.get(
-                    full_name__iexact=shipping_details.name,
-                    email__iexact=billing_details.email,
-                    phone_number__iexact=shipping_details.phone,
-                    country__iexact=shipping_details.address.country,
-                    postcode__iexact=shipping_details.address.postal_code,
-                    town_or_city__iexact=shipping_details.address.city,
-                    street_address1__iexact=shipping_details.address.line1,
-                    street_address2__iexact=shipping_details.address.line2,
-                    county__iexact=shipping_details.address.state,
-                    grand_total=grand_total,
-                    original_bag=bag,
-                    stripe_pid=pid,
-                )
-                order_exists = True
-                break
-            except Order.DoesNotExist:
-                attempt += 1
-                time.sleep(1)
-        if order_exists:
-            return HttpResponse(
-                content=(f'Webhook received: {event["type"]} | SUCCESS: '
-                         'Verified order already in database'),
-                status=200)
-        else:
-            order = None
-            try:
-                order = Order.objects.create(
-                    full_name=shipping_details.name,
-                    email=billing_details.email,
-                    phone_number=shipping_details.phone,
-                    country=shipping_details.address.country,
-                    postcode=shipping_details.address.postal_code,
-                    town_or_city=shipping_details.address.city,
-                    street_address1=shipping_details.address.line1,
-                    street_address2=shipping_details.address.line2,
-                    county=shipping_details.address.state,
-                    original_bag=bag,
-                    stripe_pid=pid,
-                )
-                for item_id, item_data in json.loads(bag).items():
-                    product = Product.objects.get(id=item_id)
-                    if isinstance(item_data, int):
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-                    else:
-                        for size, quantity in item_data['items_by_size'].items():
-                            order_line_item = OrderLineItem(
-                                order=order,
-                                product=product,
-                                quantity=quantity,
-                                product_size=size,
-                            )
-                            order_line_item.save()
-            except Exception as e:
-                if order:
-                    order.delete()
-                return HttpResponse(
-                    content=f'Webhook received: {event["type"]} | ERROR: {e}',
-                    status=500)
-        return HttpResponse(
-            content=(f'Webhook received: {event["type"]} | SUCCESS: '
-                     'Created order in webhook'),
-            status=200)
+        order = Order(
+            full_name=shipping_details.name,
+            email=billing_details.email,
+            phone_number=shipping_details.phone,
+            country=shipping_details.address.country,
+            postcode=shipping_details.address.postal_code,
+            town_or_city=shipping_details.address.city,
+            street_address1=shipping_details.address.line1,
+            street_address2=shipping_details.address.line2,
+            county=shipping_details.address.state,
+            original_bag=bag,
+            stripe_pid=pid,
+        )
+        try:
+            orders.build_order(order, json.loads(bag), payment_intent=pid)
+        except IntegrityError:
+            # The checkout view saved the order in the meantime
+            return 'Verified order already in database'
+
+        return 'Created order in webhook'
+
+    def handle_payment_intent_canceled(self, event):
+        """Give back the stock held for a canceled payment intent"""
+        inventory.release(event.data.object.id)
+        return 'Stock released'
 
     def handle_payment_intent_failed(self, event):
-        return HttpResponse(
-            content=f'Webhook received: {event["type"]}',
-            status=200
-        )
+        return f'Webhook received: {event["type"]}'
@@ -0,0 +1,119 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+import stripe
+
+from .models import WebhookEvent
+from .webhook_handler import RetryLater, StripeWebhookHandler
+
+
+def retry_delay(attempts):
+    """Return the backoff before the next attempt at a failed event"""
+
+    return timedelta(seconds=settings.WEBHOOK_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def process_event(webhook_event):
+    """
+    Run the handler of a claimed event and record the outcome. Failures
+    are rescheduled with exponential backoff instead of being waited on,
+    until WEBHOOK_MAX_ATTEMPTS is reached.
+    """
+
+    event = stripe.Event.construct_from(json.loads(webhook_event.payload),
+                                        stripe.api_key)
+    webhook_event.attempts += 1
+    start = time.perf_counter()
+
+    try:
+        StripeWebhookHandler(webhook_event).handle(event)
+    except Exception as error:
+        webhook_event.last_error = str(error)
+        if (not isinstance(error, RetryLater) and
+                webhook_event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS):
+            webhook_event.status = WebhookEvent.FAILED
+        else:
+            webhook_event.status = WebhookEvent.PENDING
+            webhook_event.next_attempt = (
+                timezone.now() + retry_delay(webhook_event.attempts))
+    else:
+        webhook_event.status = WebhookEvent.DONE
+        webhook_event.last_error = ''
+
+    webhook_event.processed = timezone.now()
+    webhook_event.duration = time.perf_counter() - start
+    webhook_event.save(update_fields=['status', 'attempts', 'next_attempt',
+                                      'processed', 'duration', 'last_error'])
+    return webhook_event
+
+
+def replay(webhook_events, force=False):
+    """
+    Queue events for another round of attempts, returning how many were
+    queued. Events being processed within their lease are left alone
+    unless forced.
+    """
+
+    if not force:
+        webhook_events = webhook_events.exclude(
+            status=WebhookEvent.PROCESSING,
+            next_attempt__gt=timezone.now())
+    return webhook_events.update(
+        status=WebhookEvent.PENDING, attempts=0,
+        next_attempt=timezone.now(), last_error='')
+
+
+def _claimable(now):
+    """
+    Pending events, and events whose processing outlived its lease
+    because the worker died or could not record the outcome
+    """
+
+    return WebhookEvent.objects.filter(
+        Q(status=WebhookEvent.PENDING) |
+        Q(status=WebhookEvent.PROCESSING, next_attempt__lte=now))
+
+
+def claim(webhook_event):
+    """
+    Mark an event as processing with a conditional UPDATE, so that
+    concurrent workers never process the same one. While it is processed
+    next_attempt holds the end of the worker's lease. Returns whether
+    this caller got it.
+    """
+
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.WEBHOOK_LEASE)
+    if not _claimable(now).filter(pk=webhook_event.pk).update(
+            status=WebhookEvent.PROCESSING, next_attempt=lease):
+        return False
+
+    webhook_event.status = WebhookEvent.PROCESSING
+    webhook_event.next_attempt = lease
+    return True
+
+
+def process_due(batch_size=100):
+    """
+    Claim and process the events that are due, returning the number
+    processed. Events are normally processed by the task queued when
+    they arrive; this sweeps up any left without one or abandoned by a
+    worker.
+    """
+
+    now = timezone.now()
+    due = list(_claimable(now).filter(next_attempt__lte=now).order_by(
+        'next_attempt')[:batch_size])
+
+    processed = 0
+    for webhook_event in due:
+        if claim(webhook_event):
+            process_event(webhook_event)
+            processed += 1
+
+    return processed
@@ -1,11 +1,13 @@
 
 
-from django.http import HttpResponse
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.http import HttpResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from checkout.webhook_handler import StripeWebhookHandler
+from checkout.models import WebhookEvent
+from checkout.tasks import process_webhook
 import stripe
 
 @require_POST
@@ -13,7 +15,6 @@ import stripe
 def webhook(request):
     """Listen for Stripe webhooks"""
     wh_secret = settings.STRIPE_WH_SECRET
-    stripe.api_key = settings.STRIPE_SECRET_KEY
 
     payload = request.body
     sig_header = request.META['HTTP_STRIPE_SIGNATURE']
@@ -32,17 +33,27 @@ def webhook(request):
     except Exception as e:
         return HttpResponse(content=e, status=400)
 
-    handler = StripeWebhookHandler(request)
-
-    event_map = {
-        'payment_intent.succeeded': handler.handle_payment_intent_succeeded,
-        'payment_intent.payment_failed': handler.handle_payment_intent_failed,
-    }
-
-    event_type = event['type']
+    # Redeliveries of an event already in the ledger are only counted,
+    # with a single UPDATE on the unique event id
+    if WebhookEvent.objects.filter(event_id=event['id']).update(
+            deliveries=F('deliveries') + 1):
+        return HttpResponse(
+            content=f'Webhook received: {event["type"]} | Duplicate ignored',
+            status=200)
 
-    event_handler = event_map.get(event_type, handler.handle_event)
-
-    response = event_handler(event)
-
-    return response
\ No newline at end of file
+    # Processing is left to a background task so that Stripe is
+    # answered straight away
+    try:
+        with transaction.atomic():
+            webhook_event = WebhookEvent.objects.create(
+                event_id=event['id'], event_type=event['type'],
+                payload=payload.decode('utf-8'))
+            process_webhook.delay(webhook_event.pk)
+    except IntegrityError:
+        # A concurrent delivery of the same event got there first
+        return HttpResponse(
+            content=f'Webhook received: {event["type"]} | Duplicate ignored',
+            status=200)
+
+    return HttpResponse(content=f'Webhook received: {event["type"]}',
+                        status=200)
@@ -46,6 +46,7 @@ class ContactForm(forms.Form):
         return subject, msg, email
 
     def send(self):
+        """Queue the confirmation email in the outbox"""
 
         subject, msg, email = self.get_info()
 
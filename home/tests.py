@@ -1,3 +1,28 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from monitoring.testing import Budget, QueryBudgetTestCase
+
+
+class HomeViewBudgetTests(QueryBudgetTestCase):
+    """Pages render the same for an anonymous visitor and a full bag"""
+
+    budgets = {
+        'home': Budget(queries=3, ms=250),
+        'legal': Budget(queries=2, ms=250),
+        'contact': Budget(queries=2, ms=250),
+    }
+
+    def assertPageWithinBudget(self, url_name):
+        path = reverse(url_name)
+        self.assertWithinBudget(
+            self.measure('get', path),
+            self.measure('get', path, user=self.large, bag=self.large.bag))
+
+    def test_home(self):
+        self.assertPageWithinBudget('home')
+
+    def test_legal(self):
+        self.assertPageWithinBudget('legal')
+
+    def test_contact(self):
+        self.assertPageWithinBudget('contact')
@@ -3,7 +3,7 @@ from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.contrib import messages
 
-from products.models import Product
+from products.models import ProductCard
 
 from .forms import ContactForm
 
@@ -11,7 +11,7 @@ from .forms import ContactForm
 def index(request):
     """Return Home page, including latest products"""
 
-    latest_products = Product.objects.order_by('-id')[:6]
+    latest_products = ProductCard.objects.order_by('-pk')[:6]
     template = 'home/index.html'
     context = {
         'products': latest_products
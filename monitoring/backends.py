@@ -0,0 +1,35 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .stats import current_sample
+
+
+class TimedTemplate(Template):
+    """Template adding its render time to the current request's stats"""
+
+    def render(self, context=None, request=None):
+        sample = current_sample.get()
+        if sample is None:
+            return super().render(context, request)
+
+        # Templates rendered while another renders are already timed
+        sample.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.render_depth -= 1
+            if not sample.render_depth:
+                sample.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template engine with render times recorded per view"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self)
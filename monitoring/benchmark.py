@@ -0,0 +1,234 @@
+"""
+Load test of the storefront's critical paths.
+
+Scenarios drive the site through the Django test client from concurrent
+threads, each a logged in customer with its own session, and every
+request is timed and its queries counted by URL name.
+"""
+import math
+import random
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.test import Client
+
+from products.models import Product
+
+from .synthetic import PASSWORD, WORDS, generate
+
+CATEGORIES = ('book', 'boxed_set', 'collectible')
+
+ADDRESS = {
+    'full_name': 'Benchmark Customer',
+    'phone_number': '01234567890',
+    'country': 'GB',
+    'postcode': 'AB1 2CD',
+    'town_or_city': 'Town',
+    'street_address1': '1 Street',
+    'street_address2': '',
+    'county': 'County',
+}
+
+_client_secret = re.compile(r'name="client_secret" value="([^"]+)"')
+
+
+def seed(products, users, orders, seed=0):
+    """
+    Fill an empty database with a synthetic catalog, customers and past
+    orders, with stock enough for every checkout. Returns the usernames.
+    """
+
+    generate(products, users, orders, seed, stock=10 ** 6)
+    return list(get_user_model().objects.order_by('pk').values_list(
+        'username', flat=True)[:users])
+
+
+class Recorder:
+    """Latencies and query counts of requests by URL name"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name, latency, queries, ok):
+        # list.append is atomic, so threads can share a recorder
+        self.latencies[name].append(latency)
+        self.queries[name].append(queries)
+        if not ok:
+            self.errors[name] += 1
+
+
+class Customer:
+    """A logged in client whose requests are recorded"""
+
+    def __init__(self, username, recorder, rng):
+        # A failing view is counted as an error instead of ending the run
+        self.client = Client(raise_request_exception=False,
+                             HTTP_HOST='localhost')
+        self.client.login(username=username, password=PASSWORD)
+        self.recorder = recorder
+        self.rng = rng
+
+    def request(self, method, path, data=None, expect=(200, 302)):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = getattr(self.client, method)(path, data or {})
+        latency = time.perf_counter() - start
+
+        match = response.resolver_match
+        name = match.url_name if match else path
+        self.recorder.add(name, latency, queries,
+                          response.status_code in expect)
+        return response
+
+
+def home(customer, catalog):
+    customer.request('get', '/')
+
+
+def search(customer, catalog):
+    customer.request('get', '/products/', {'q': customer.rng.choice(WORDS)})
+
+
+def sort(customer, catalog):
+    customer.request('get', '/products/', {
+        'sort': customer.rng.choice(['price', 'name']),
+        'direction': customer.rng.choice(['asc', 'desc'])})
+
+
+def category(customer, catalog):
+    customer.request('get', '/products/', {
+        'category': customer.rng.choice(CATEGORIES)})
+
+
+def product_detail(customer, catalog):
+    customer.request('get', f'/products/{customer.rng.choice(catalog)}/')
+
+
+def bag(customer, catalog):
+    pk = customer.rng.choice(catalog)
+    customer.request('post', f'/bag/add/{pk}/', {'redirect_url': '/bag/'})
+    customer.request('post', f'/bag/remove/{pk}/')
+
+
+def checkout(customer, catalog):
+    pk = customer.rng.choice(catalog)
+    customer.request('post', f'/bag/add/{pk}/', {'redirect_url': '/bag/'})
+
+    response = customer.request('get', '/checkout/')
+    secret = _client_secret.search(response.content.decode())
+    if secret is None:
+        return
+
+    response = customer.request('post', '/checkout/', {
+        'email': 'customer@example.com', 'client_secret': secret.group(1),
+        **ADDRESS})
+    if response.status_code == 302:
+        customer.request('get', response['Location'])
+
+
+# Scenarios whose transactions SQLite fails with "database is locked"
+# when they run concurrently, so there they run from a single client
+SQLITE_SERIAL_SCENARIOS = {'checkout'}
+
+SCENARIOS = {
+    'home': home,
+    'search': search,
+    'sort': sort,
+    'category': category,
+    'product_detail': product_detail,
+    'bag': bag,
+    'checkout': checkout,
+}
+
+
+def run(scenario, usernames, iterations, seed=0):
+    """
+    Run a scenario a number of times spread over one thread per user.
+    Returns the recorder and the elapsed seconds.
+    """
+
+    recorder = Recorder()
+    catalog = list(Product.objects.values_list('pk', flat=True))
+    customers = [Customer(username, recorder, random.Random(seed + number))
+                 for number, username in enumerate(usernames)]
+    func = SCENARIOS[scenario]
+
+    def drive(number):
+        customer = customers[number]
+        try:
+            for _ in range(number, iterations, len(customers)):
+                func(customer, catalog)
+        finally:
+            close_old_connections()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(customers)) as executor:
+        list(executor.map(drive, range(len(customers))))
+
+    return recorder, time.perf_counter() - start
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of a list of numbers"""
+
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(recorder, elapsed):
+    """Return latency percentiles in ms, throughput and queries by URL name"""
+
+    return {
+        name: {
+            'requests': len(latencies),
+            'errors': recorder.errors[name],
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'rps': len(latencies) / elapsed,
+            'queries': sum(recorder.queries[name]) / len(latencies),
+        }
+        for name, latencies in recorder.latencies.items()
+    }
+
+
+def compare(baseline, results, tolerance, floor):
+    """
+    Return the regressions of results against a baseline: a higher share
+    of failed requests, a p95 latency more than tolerance and floor ms
+    above it, or more queries per request
+    """
+
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if (result['errors'] / result['requests']
+                > before.get('errors', 0) / before['requests']):
+            regressions.append(
+                f'{name}: {before.get("errors", 0)}/{before["requests"]} -> '
+                f'{result["errors"]}/{result["requests"]} requests failed')
+        if (result['p95'] > before['p95'] * (1 + tolerance)
+                and result['p95'] - before['p95'] > floor):
+            regressions.append(
+                f'{name}: p95 {before["p95"]:.1f}ms -> {result["p95"]:.1f}ms')
+        if result['queries'] > before['queries'] + 0.5:
+            regressions.append(
+                f'{name}: {before["queries"]:.1f} -> '
+                f'{result["queries"]:.1f} queries per request')
+    return regressions
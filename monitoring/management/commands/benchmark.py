@@ -0,0 +1,152 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+
+from checkout.fake_stripe import FakeStripeServer
+from checkout.payments import configure_stripe
+from monitoring import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database at a chosen scale and load test the '
+            'storefront\'s critical paths from concurrent clients, '
+            'optionally saving or comparing against a JSON baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Concurrent customers')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Iterations of each scenario')
+        parser.add_argument('--scenario', action='append',
+                            choices=sorted(benchmark.SCENARIOS),
+                            help='Scenarios to run, all by default')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Simulated Stripe latency in seconds')
+        parser.add_argument('--save', help='Write the results to this file')
+        parser.add_argument('--compare',
+                            help='Fail on regressions against this file')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative p95 increase')
+        parser.add_argument('--floor', type=float, default=5,
+                            help='p95 increases below this many ms are '
+                                 'never regressions')
+        parser.add_argument('--allow-errors', action='store_true',
+                            help='Save and compare results even if some '
+                                 'requests failed')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Cannot read baseline: {error}')
+
+        scenarios = options['scenario'] or list(benchmark.SCENARIOS)
+        workdir = tempfile.TemporaryDirectory()
+
+        # Concurrent clients need a database file, SQLite's shared memory
+        # databases lock whole tables, and checkouts wait for each
+        # other's writes
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = str(
+                Path(workdir.name) / 'benchmark.sqlite3')
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+        old_config = setup_databases(verbosity=0, interactive=False,
+                                     aliases={'default'})
+
+        server = FakeStripeServer(('127.0.0.1', 0),
+                                  latency=options['latency'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            with override_settings(STRIPE_API_BASE=server.url,
+                                   STRIPE_SECRET_KEY='sk_test_benchmark',
+                                   VIEW_STATS_DIR=workdir.name):
+                configure_stripe()
+                results = self.run(scenarios, options)
+        finally:
+            configure_stripe()
+            server.shutdown()
+            server.server_close()
+            teardown_databases(old_config, verbosity=0)
+            workdir.cleanup()
+
+        errors = sum(summary['errors']
+                     for summary in results['endpoints'].values())
+        if errors and not options['allow_errors']:
+            raise CommandError(f'{errors} request(s) failed, the results '
+                               f'are not comparable')
+
+        if options['save']:
+            Path(options['save']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f'Saved results to {options["save"]}')
+
+        if baseline is not None:
+            regressions = benchmark.compare(
+                baseline['endpoints'], results['endpoints'],
+                options['tolerance'], options['floor'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) '
+                                   f'against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(
+                f'No regressions against {options["compare"]}'))
+
+    def run(self, scenarios, options):
+        usernames = benchmark.seed(options['products'], options['clients'],
+                                   options['orders'], options['seed'])
+
+        results = {
+            'options': {name: options[name] for name in (
+                'products', 'orders', 'clients', 'requests', 'seed',
+                'latency')},
+            'scenarios': {},
+            'endpoints': {},
+        }
+
+        for scenario in scenarios:
+            clients = usernames
+            if (connection.vendor == 'sqlite'
+                    and scenario in benchmark.SQLITE_SERIAL_SCENARIOS):
+                clients = usernames[:1]
+                self.stdout.write(self.style.WARNING(
+                    f'{scenario} runs from one client on SQLite, which '
+                    f'fails its concurrent transactions. Load test it on '
+                    f'PostgreSQL.'))
+
+            recorder, elapsed = benchmark.run(
+                scenario, clients, options['requests'], options['seed'])
+            results['scenarios'][scenario] = {
+                'clients': len(clients),
+                'seconds': elapsed,
+                'rps': options['requests'] / elapsed,
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{scenario}: {options["requests"]} iterations in '
+                f'{elapsed:.2f}s ({options["requests"] / elapsed:.1f}/s)'))
+
+            for name, summary in benchmark.summarize(
+                    recorder, elapsed).items():
+                results['endpoints'][f'{scenario}/{name}'] = summary
+                style = (self.style.ERROR if summary['errors']
+                         else lambda line: line)
+                self.stdout.write(style(
+                    f'  {name}: {summary["requests"]} requests, '
+                    f'{summary["rps"]:.1f}/s, p50 {summary["p50"]:.1f}ms '
+                    f'p95 {summary["p95"]:.1f}ms p99 {summary["p99"]:.1f}ms, '
+                    f'{summary["queries"]:.1f} queries'
+                    + (f', {summary["errors"]} errors'
+                       if summary['errors'] else '')))
+
+        return results
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitoring.synthetic import Generator
+
+
+class Command(BaseCommand):
+    help = ('Add a reproducible synthetic catalog, customers and order '
+            'history to the database for testing at scale')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Days of order history')
+        parser.add_argument('--stock', type=int,
+                            help='Units of every product, random by default')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        generator = Generator(options['seed'], options['batch_size'],
+                              options['days'])
+
+        for step, write in (
+                ('products', lambda: generator.products(
+                    options['products'], options['stock'])),
+                ('users', lambda: generator.users(options['users'])),
+                ('orders', lambda: generator.orders(options['orders'])),
+                ('derived tables', generator.finish)):
+            start = time.perf_counter()
+            count = write()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'Wrote {count} {step} in {elapsed:.1f}s' if count is not None
+                else f'Rebuilt {step} in {elapsed:.1f}s')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from monitoring import stats
+
+SORT_KEYS = {
+    'time': lambda view: view.histograms['wall'].total,
+    'p95': lambda view: view.histograms['wall'].percentile(95),
+    'queries': lambda view: view.histograms['queries'].mean,
+    'requests': lambda view: view.histograms['wall'].count,
+}
+
+
+class Command(BaseCommand):
+    help = ('Show request latency, query counts, template time and '
+            'duplicated queries by URL name, merged over every process')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS),
+                            default='time')
+        parser.add_argument('--duplicates', action='store_true',
+                            help='List the duplicated queries of each view')
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete the stats after showing them')
+
+    def handle(self, *args, **options):
+        # Include what this process has not written yet, if anything
+        stats.registry.flush()
+        views = stats.load()
+
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {name: view.to_dict() for name, view in views.items()},
+                indent=2))
+        else:
+            self.show(views, options)
+
+        if options['reset']:
+            stats.clear()
+            self.stdout.write('Stats reset')
+
+    def show(self, views, options):
+        if not views:
+            self.stdout.write('No requests recorded')
+
+        ordered = sorted(views.items(),
+                         key=lambda item: SORT_KEYS[options['sort']](item[1]),
+                         reverse=True)
+        for name, view in ordered:
+            wall = view.histograms['wall']
+            queries = view.histograms['queries']
+            self.stdout.write(
+                f'{name}: {wall.count} requests, '
+                f'p50 {wall.percentile(50):.0f}ms '
+                f'p95 {wall.percentile(95):.0f}ms '
+                f'p99 {wall.percentile(99):.0f}ms '
+                f'max {wall.maximum:.0f}ms, '
+                f'{queries.mean:.1f} queries (max {queries.maximum}) in '
+                f'{view.histograms["sql"].mean:.1f}ms, '
+                f'templates {view.histograms["templates"].mean:.1f}ms, '
+                f'{sum(view.duplicates.values())} duplicated')
+
+            if options['duplicates']:
+                for sql, count in view.duplicates.most_common():
+                    self.stdout.write(f'  {count} x {sql}')
@@ -0,0 +1,166 @@
+import asyncio
+import cProfile
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from . import profiling, stats
+
+logger = logging.getLogger(__name__)
+
+# Recorded for requests that match no URL pattern
+UNRESOLVED = '<unresolved>'
+
+
+class ViewStatsMiddleware:
+    """
+    Record the wall time, SQL count and time, duplicated queries and
+    template render time of every request by URL name, logging those
+    over VIEW_STATS_SLOW_MS or VIEW_STATS_MAX_QUERIES
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler await this middleware, as MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        sample = stats.RequestSample()
+        token = stats.current_sample.set(sample)
+        start = time.perf_counter()
+
+        try:
+            with connection.execute_wrapper(sample.execute):
+                response = self.get_response(request)
+        finally:
+            stats.current_sample.reset(token)
+
+        self.record(request, time.perf_counter() - start, sample)
+        return response
+
+    async def __acall__(self, request):
+        sample = stats.RequestSample()
+        token = stats.current_sample.set(sample)
+        start = time.perf_counter()
+
+        # Under ASGI the queries of a request run on the thread that
+        # sync_to_async keeps for it, so the wrapper is installed there
+        await sync_to_async(
+            lambda: connection.execute_wrappers.append(sample.execute))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(
+                lambda: connection.execute_wrappers.remove(sample.execute))()
+            stats.current_sample.reset(token)
+
+        self.record(request, time.perf_counter() - start, sample)
+        return response
+
+    def record(self, request, wall, sample):
+        match = request.resolver_match
+        view_name = match.view_name if match else UNRESOLVED
+        stats.registry.record(view_name, wall, sample)
+
+        if (wall * 1000 >= settings.VIEW_STATS_SLOW_MS
+                or sample.query_count > settings.VIEW_STATS_MAX_QUERIES):
+            duplicates = sorted(sample.duplicates().items(),
+                                key=lambda item: -item[1])
+            logger.warning(
+                '%s %s (%s) took %.0f ms: %d queries in %.0f ms, '
+                'templates %.0f ms%s',
+                request.method, request.path, view_name, wall * 1000,
+                sample.query_count, sample.sql_time * 1000,
+                sample.template_time * 1000,
+                ''.join(f'\n  {count} x {sql}'
+                        for sql, count in duplicates[:5]))
+
+
+class ProfilerMiddleware:
+    """
+    Run a request under cProfile and store the profile when a superuser
+    asks for it with a signed token, see monitoring.profiling. Must come
+    after AuthenticationMiddleware. Only the thread handling the request
+    is profiled, under ASGI that is the event loop, which may be running
+    other requests too, and the thread sync_to_async runs its sync code
+    on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler await this middleware, as MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        if not self.requested(request):
+            return self.get_response(request)
+
+        sample = stats.current_sample.get()
+        queries = sample.query_count if sample else 0
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        self.save([profiler], request, response, start, queries)
+        return response
+
+    async def __acall__(self, request):
+        if not await sync_to_async(self.requested)(request):
+            return await self.get_response(request)
+
+        sample = stats.current_sample.get()
+        queries = sample.query_count if sample else 0
+        profiler, thread_profiler = cProfile.Profile(), cProfile.Profile()
+        start = time.perf_counter()
+
+        await sync_to_async(thread_profiler.enable)()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+            await sync_to_async(thread_profiler.disable)()
+
+        await sync_to_async(self.save)(
+            [profiler, thread_profiler], request, response, start, queries)
+        return response
+
+    def requested(self, request):
+        token = (request.GET.get(profiling.PROFILE_PARAM)
+                 or request.headers.get(profiling.PROFILE_HEADER))
+        return bool(token) and profiling.is_allowed(request.user, token)
+
+    def save(self, profilers, request, response, start, queries):
+        sample = stats.current_sample.get()
+        match = request.resolver_match
+        response['X-Profile-Id'] = profiling.save(profilers, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view_name': match.view_name if match else UNRESOLVED,
+            'status': response.status_code,
+            'ms': (time.perf_counter() - start) * 1000,
+            'queries': (sample.query_count - queries) if sample else None,
+            'user': request.user.get_username(),
+        })
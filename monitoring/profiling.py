@@ -0,0 +1,181 @@
+"""
+On demand profiles of single requests.
+
+A superuser asks for a request to be profiled by sending a token signed
+for them, as the PROFILE_PARAM query parameter or the PROFILE_HEADER
+header. The request runs under cProfile and the result is kept in
+PROFILER_DIR, which holds the last PROFILER_MAX_PROFILES profiles.
+"""
+import json
+import os
+import pstats
+import re
+import secrets
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile-Token'
+
+_profile_id = re.compile(r'^\d{14}-[0-9a-f]{8}$')
+
+
+def _signer():
+    # Made per call so the current SECRET_KEY is used
+    return signing.TimestampSigner(salt='monitoring.profiling')
+
+
+def make_token(user):
+    """Return a token letting a user profile requests for a while"""
+
+    return _signer().sign(str(user.pk))
+
+
+def is_allowed(user, token):
+    """Whether the token was signed for this superuser and is still valid"""
+
+    if not user.is_authenticated or not user.is_superuser:
+        return False
+    try:
+        return _signer().unsign(
+            token, max_age=settings.PROFILER_TOKEN_MAX_AGE) == str(user.pk)
+    except signing.BadSignature:
+        return False
+
+
+def _directory():
+    return Path(settings.PROFILER_DIR)
+
+
+def save(profilers, meta):
+    """
+    Store finished profilers, merged into one profile, with a dict
+    describing the request,
+    dropping the oldest profiles over PROFILER_MAX_PROFILES. Returns the
+    id of the profile.
+    """
+
+    directory = _directory()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    now = timezone.now()
+    profile_id = f'{now:%Y%m%d%H%M%S}-{secrets.token_hex(4)}'
+    pstats.Stats(*profilers).dump_stats(directory / f'{profile_id}.prof')
+
+    temporary = directory / f'{profile_id}.tmp'
+    temporary.write_text(json.dumps(
+        {**meta, 'id': profile_id, 'time': now.isoformat()}))
+    os.replace(temporary, directory / f'{profile_id}.json')
+
+    for path in sorted(directory.glob('*.json'))[
+            :-settings.PROFILER_MAX_PROFILES]:
+        path.with_suffix('.prof').unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+    return profile_id
+
+
+def recent():
+    """Return the descriptions of the stored profiles, newest first"""
+
+    profiles = []
+    for path in sorted(_directory().glob('*.json'), reverse=True):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # Pruned by another process meanwhile
+            continue
+    return profiles
+
+
+def load(profile_id):
+    """
+    Return the description and pstats.Stats of a stored profile, or
+    None if there is no such profile
+    """
+
+    if not _profile_id.match(profile_id):
+        return None
+    path = _directory() / f'{profile_id}.json'
+    try:
+        return (json.loads(path.read_text()),
+                pstats.Stats(str(path.with_suffix('.prof'))))
+    except (OSError, ValueError):
+        return None
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def call_tree(stats, min_fraction=0.005, max_depth=60):
+    """
+    Return the call tree of a profile as nested dicts with a label,
+    time and self time in ms, a share of the whole and children.
+
+    cProfile keeps the time of each caller and callee pair rather than
+    whole stacks, so a function called from several places has its
+    callees split between them in proportion to time. Calls under
+    min_fraction of the whole are left out, recursion is cut at the
+    first repeated function.
+    """
+
+    callees = defaultdict(dict)
+    roots = []
+    for func, (_, _, _, cumulative, callers) in stats.stats.items():
+        if not callers:
+            roots.append((func, cumulative))
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees[caller][func] = edge_cumulative
+
+    total = sum(cumulative for _, cumulative in roots) or 1
+
+    def node(func, time, path, depth):
+        children = []
+        cumulative = stats.stats[func][3]
+        if depth < max_depth and cumulative:
+            for callee, edge in sorted(callees[func].items(),
+                                       key=lambda item: -item[1]):
+                share = edge * time / cumulative
+                if callee in path or share < total * min_fraction:
+                    continue
+                children.append(node(callee, share, path | {callee},
+                                     depth + 1))
+
+        return {
+            'label': _label(func),
+            'ms': time * 1000,
+            'self_ms': max(0, time * 1000 - sum(child['ms']
+                                                for child in children)),
+            'percent': time / total * 100,
+            'children': children,
+        }
+
+    tree = [node(func, cumulative, {func}, 0) for func, cumulative
+            in sorted(roots, key=lambda item: -item[1])
+            if cumulative >= total * min_fraction]
+
+    # Widths of children are relative to their parent in the flamegraph
+    def relative(nodes, parent_ms):
+        for child in nodes:
+            child['width'] = child['ms'] / parent_ms * 100 if parent_ms else 0
+            relative(child['children'], child['ms'])
+
+    relative(tree, total * 1000)
+    return tree
+
+
+def top_functions(stats, limit=30):
+    """Return the functions with the most time spent in them"""
+
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])
+    return [{'label': _label(func), 'calls': calls,
+             'self_ms': own * 1000, 'ms': cumulative * 1000}
+            for func, (_, calls, own, cumulative, _) in rows[:limit]]
@@ -0,0 +1,251 @@
+"""
+Per view request statistics.
+
+Each process keeps fixed bucket histograms per URL name, so memory does
+not grow with traffic, and adds them to its JSON file in VIEW_STATS_DIR
+every VIEW_STATS_FLUSH_INTERVAL seconds. The view_stats command merges
+the files of every process.
+"""
+import atexit
+import json
+import os
+import re
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+# Upper bounds of the histogram buckets, the last bucket is open ended
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# Duplicated queries remembered per view
+MAX_FINGERPRINTS = 20
+
+# Sample of the request being handled, read by the template backend
+current_sample = ContextVar('current_sample', default=None)
+
+_in_list = re.compile(r'\((?:(?:%s|N|S), )+(?:%s|N|S)\)')
+_number = re.compile(r'\b\d+\b')
+_string = re.compile(r"'(?:[^']|'')*'")
+_savepoint = re.compile(r'"s\d+_x\d+"')
+
+
+def fingerprint(sql):
+    """
+    Return the SQL with strings, numbers, parameter lists and savepoint
+    names folded, so queries differing only in their values match
+    """
+
+    sql = _savepoint.sub('"s"', _string.sub('S', sql))
+    return _in_list.sub('(...)', _number.sub('N', sql))
+
+
+class RequestSample:
+    """Measurements of a single request"""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.render_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper timing every query"""
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.query_count += 1
+            self.queries[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.queries.items()
+                if count > 1}
+
+
+class Histogram:
+    """Counts of values falling into fixed buckets"""
+
+    def __init__(self, bounds, counts=None, total=0, maximum=0):
+        self.bounds = bounds
+        self.counts = counts or [0] * (len(bounds) + 1)
+        self.total = total
+        self.maximum = maximum
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, percent):
+        """
+        Return the upper bound of the bucket holding the percentile, or
+        the largest value seen if it is in the open ended bucket
+        """
+
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def to_dict(self):
+        return {'counts': self.counts, 'total': self.total,
+                'max': self.maximum}
+
+    @classmethod
+    def from_dict(cls, bounds, data):
+        return cls(bounds, data['counts'], data['total'], data['max'])
+
+
+class ViewStats:
+    """Histograms of one URL name"""
+
+    HISTOGRAMS = {
+        'wall': TIME_BUCKETS,
+        'queries': QUERY_BUCKETS,
+        'sql': TIME_BUCKETS,
+        'templates': TIME_BUCKETS,
+    }
+
+    def __init__(self):
+        self.histograms = {name: Histogram(bounds)
+                           for name, bounds in self.HISTOGRAMS.items()}
+        self.duplicates = Counter()
+
+    def add(self, wall, sample):
+        self.histograms['wall'].add(wall * 1000)
+        self.histograms['queries'].add(sample.query_count)
+        self.histograms['sql'].add(sample.sql_time * 1000)
+        self.histograms['templates'].add(sample.template_time * 1000)
+        # Count the queries that need not have run
+        self.duplicates.update({sql: count - 1 for sql, count
+                                in sample.duplicates().items()})
+        self._trim()
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        self.duplicates.update(other.duplicates)
+        self._trim()
+
+    def _trim(self):
+        if len(self.duplicates) > MAX_FINGERPRINTS * 2:
+            self.duplicates = Counter(dict(
+                self.duplicates.most_common(MAX_FINGERPRINTS)))
+
+    def to_dict(self):
+        return {
+            'histograms': {name: histogram.to_dict()
+                           for name, histogram in self.histograms.items()},
+            'duplicates': dict(self.duplicates.most_common(MAX_FINGERPRINTS)),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name, histogram in data['histograms'].items():
+            stats.histograms[name] = Histogram.from_dict(
+                cls.HISTOGRAMS[name], histogram)
+        stats.duplicates = Counter(data['duplicates'])
+        return stats
+
+
+class Registry:
+    """The view stats of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.views = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, view_name, wall, sample):
+        with self.lock:
+            self.views.setdefault(view_name, ViewStats()).add(wall, sample)
+            due = (time.monotonic() - self.last_flush
+                   >= settings.VIEW_STATS_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Merge the stats gathered since the last flush into the file of
+        this process in VIEW_STATS_DIR. The file is read back first, so
+        deleting it resets the stats of a running process too.
+        """
+
+        with self.flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self.lock:
+            views, self.views = self.views, {}
+            self.last_flush = time.monotonic()
+        if not views:
+            return
+
+        directory = Path(settings.VIEW_STATS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{socket.gethostname()}-{os.getpid()}.json'
+
+        if path.exists():
+            for name, data in json.loads(path.read_text()).items():
+                stats = ViewStats.from_dict(data)
+                if name in views:
+                    stats.merge(views[name])
+                views[name] = stats
+
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(
+            {name: stats.to_dict() for name, stats in views.items()}))
+        os.replace(temporary, path)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def load(directory=None):
+    """Return the view stats of every process merged by URL name"""
+
+    merged = {}
+    for path in Path(directory or settings.VIEW_STATS_DIR).glob('*.json'):
+        for name, data in json.loads(path.read_text()).items():
+            stats = ViewStats.from_dict(data)
+            if name in merged:
+                merged[name].merge(stats)
+            else:
+                merged[name] = stats
+    return merged
+
+
+def clear(directory=None):
+    """Delete the stats files of every process"""
+
+    for path in Path(directory or settings.VIEW_STATS_DIR).glob('*.json'):
+        path.unlink()
@@ -0,0 +1,339 @@
+"""
+Synthetic catalogs, customers and orders for testing at scale.
+
+Rows are built in memory a batch at a time with ids assigned up front,
+so related rows can point at them, and written with one multi-row
+INSERT per table and batch. Model save() methods and signals are
+skipped; the derived tables they would keep are rebuilt once at the end.
+Generating with the same sizes and seed on an empty database gives the
+same data.
+"""
+import json
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from checkout import sales
+from checkout.models import Order, OrderLineItem
+from products import cards, catalog_cache, recommendations, search
+from products.models import Book, BoxedSet, Category, Collectible, Product
+from profiles.models import Address, SavedProduct, UserProfile
+
+# Words product names, descriptions and searches are made of
+WORDS = ('war', 'heresy', 'legion', 'siege', 'throne', 'fallen', 'crimson',
+         'iron', 'night', 'storm', 'angel', 'master', 'hunt', 'lost', 'shadow',
+         'empire', 'blood', 'black', 'gate', 'dark', 'void', 'sons', 'fire')
+
+FIRST_NAMES = ('Dan', 'Graham', 'Aaron', 'Guy', 'Chris', 'John', 'Sandy',
+               'Rob', 'Nick', 'Gav', 'Mike', 'Josh', 'David', 'Ben', 'Laurie')
+LAST_NAMES = ('Abnett', 'McNeill', 'Dembski', 'Haley', 'Wraight', 'French',
+              'Mitchell', 'Sanders', 'Kyme', 'Thorpe', 'Lee', 'Reynolds')
+TOWNS = ('Nottingham', 'Leeds', 'Bristol', 'York', 'Bath', 'Derby', 'Hull')
+
+# Share of each product type in the catalog, and its category
+PRODUCT_TYPES = (
+    (Book, 'book', 0.6),
+    (BoxedSet, 'boxed_set', 0.15),
+    (Collectible, 'collectible', 0.25),
+)
+
+# Address fields copied onto the orders of a profile
+ADDRESS_FIELDS = ('phone_number', 'street_address1', 'street_address2',
+                  'town_or_city', 'county', 'postcode', 'country')
+
+# Password of every generated user
+PASSWORD = 'password'
+
+
+def insert_rows(model, objs):
+    """
+    Insert unsaved instances of a model with one multi-row INSERT per
+    batch the database accepts, writing only the model's own table
+    """
+
+    fields = model._meta.local_concrete_fields
+    if not objs:
+        return
+    batch_size = connection.ops.bulk_batch_size(fields, objs)
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column)
+                        for field in fields)
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES '
+                + ', '.join([row] * len(batch)),
+                [field.get_db_prep_save(getattr(obj, field.attname),
+                                        connection)
+                 for obj in batch for field in fields])
+
+
+def _next_id(model):
+    return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+
+class Generator:
+    """
+    Write a reproducible mix of products, users with profiles, addresses
+    and saved products, and orders with line items spread over the last
+    `days` days. Orders favour a minority of products, like real ones do.
+    """
+
+    def __init__(self, seed=0, batch_size=2000, days=365):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.now = timezone.now()
+        self.categories = dict(Category.objects.values_list('name', 'pk'))
+        self.content_types = {
+            model: ContentType.objects.get_for_model(model).pk
+            for model, _, _ in PRODUCT_TYPES}
+        self.product_ids = []
+        self.prices = {}
+        self.profiles = []
+
+    def _batches(self, count):
+        for start in range(0, count, self.batch_size):
+            yield range(start, min(start + self.batch_size, count))
+
+    def _words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def _person(self):
+        return (f'{self.rng.choice(FIRST_NAMES)} '
+                f'{self.rng.choice(LAST_NAMES)}')
+
+    def _date(self):
+        return self.now - timedelta(seconds=self.rng.uniform(
+            0, self.days * 86400))
+
+    def products(self, count, stock=None):
+        """
+        Write products, with `stock` units each or a random quantity of
+        which some are sold out
+        """
+
+        if not self.categories:
+            call_command('loaddata', 'categories', verbosity=0)
+            self.categories = dict(Category.objects.values_list('name', 'pk'))
+
+        models = [model for model, _, _ in PRODUCT_TYPES]
+        weights = [share for _, _, share in PRODUCT_TYPES]
+        category_names = {model: name for model, name, _ in PRODUCT_TYPES}
+        next_id = _next_id(Product)
+
+        for numbers in self._batches(count):
+            parents = []
+            children = {model: [] for model in models}
+            for number in numbers:
+                model = self.rng.choices(models, weights)[0]
+                pk = next_id + number
+                parent = Product(
+                    pk=pk,
+                    polymorphic_ctype_id=self.content_types[model],
+                    category_id=self.categories.get(category_names[model]),
+                    sku=f'GEN{pk:08}',
+                    name=f'{self._words(self.rng.randint(2, 4)).title()} {pk}',
+                    description=self._words(self.rng.randint(20, 120)),
+                    price=Decimal(self.rng.choice((
+                        self.rng.randint(5, 20), self.rng.randint(20, 60),
+                        self.rng.randint(60, 250)))) - Decimal('0.01'),
+                    quantity=(stock if stock is not None else
+                              self.rng.choice((0, *range(1, 100)))),
+                )
+                parents.append(parent)
+                self.prices[pk] = parent.price
+
+                child = model(product_ptr_id=pk,
+                              release_date=self._date().date().isoformat(),
+                              details=self._words(30))
+                if model is Book:
+                    child.author = self._person()
+                    child.pages = self.rng.randint(150, 900)
+                if model is Collectible:
+                    child.dimensions = (f'{self.rng.randint(5, 40)}cm x '
+                                        f'{self.rng.randint(5, 40)}cm')
+                if model is not Collectible:
+                    child.signed_copy = self.rng.choice(('yes', 'no', 'no'))
+                children[model].append(child)
+
+            with transaction.atomic():
+                insert_rows(Product, parents)
+                for model, rows in children.items():
+                    insert_rows(model, rows)
+            self.product_ids.extend(parent.pk for parent in parents)
+
+        return count
+
+    def _catalog(self):
+        """The products orders and saved lists pick from"""
+
+        if not self.product_ids:
+            self.prices = dict(Product.objects.non_polymorphic().values_list(
+                'pk', 'price'))
+            self.product_ids = sorted(self.prices)
+        return self.product_ids
+
+    def _popular_product(self):
+        # Cubing a uniform number crowds picks at the start of the catalog
+        catalog = self._catalog()
+        return catalog[int(len(catalog) * self.rng.random() ** 3)]
+
+    def users(self, count, max_saved=10):
+        """Write users, each with a profile, addresses and saved products"""
+
+        User = get_user_model()
+        password = make_password(PASSWORD)
+        next_user = _next_id(User)
+        next_profile = _next_id(UserProfile)
+        next_address = _next_id(Address)
+        next_saved = _next_id(SavedProduct)
+        catalog = self._catalog()
+
+        for numbers in self._batches(count):
+            users, profiles, addresses, saved = [], [], [], []
+            for number in numbers:
+                user_id = next_user + number
+                first_name, last_name = self._person().split()
+                users.append(User(
+                    pk=user_id, username=f'customer{user_id}',
+                    email=f'customer{user_id}@example.com',
+                    password=password, first_name=first_name,
+                    last_name=last_name, date_joined=self._date()))
+
+                profile = UserProfile(pk=next_profile + number,
+                                      user_id=user_id)
+                profiles.append(profile)
+
+                for index in range(self.rng.randint(1, 3)):
+                    addresses.append(Address(
+                        pk=next_address, profile_id=profile.pk,
+                        default=index == 0,
+                        phone_number=f'07{self.rng.randint(0, 10 ** 9):09}',
+                        street_address1=(f'{self.rng.randint(1, 200)} '
+                                         f'{self.rng.choice(WORDS).title()} '
+                                         f'Street'),
+                        town_or_city=self.rng.choice(TOWNS),
+                        postcode=f'NG{self.rng.randint(1, 99)} '
+                                 f'{self.rng.randint(1, 9)}AB',
+                        country='GB'))
+                    next_address += 1
+                    self.profiles.append((profile.pk, {
+                        field: getattr(addresses[-1], field)
+                        for field in ADDRESS_FIELDS}))
+
+                if catalog:
+                    for product_id in self.rng.sample(
+                            catalog, min(len(catalog),
+                                         self.rng.randint(0, max_saved))):
+                        saved.append(SavedProduct(
+                            pk=next_saved, profile_id=profile.pk,
+                            product_id=product_id))
+                        next_saved += 1
+
+            with transaction.atomic():
+                insert_rows(User, users)
+                insert_rows(UserProfile, profiles)
+                insert_rows(Address, addresses)
+                insert_rows(SavedProduct, saved)
+
+        return count
+
+    def orders(self, count, guest_share=0.3):
+        """
+        Write orders of one to five products, placed by the generated
+        users or, for a share of them, by guests
+        """
+
+        catalog = self._catalog()
+        if not catalog:
+            return 0
+        next_order = _next_id(Order)
+        next_lineitem = _next_id(OrderLineItem)
+
+        for numbers in self._batches(count):
+            orders, lineitems = [], []
+            for number in numbers:
+                order = Order(pk=next_order + number,
+                              order_number='%032X' % self.rng.getrandbits(128),
+                              date=self._date())
+                if self.profiles and self.rng.random() >= guest_share:
+                    order.user_profile_id, address = self.rng.choice(
+                        self.profiles)
+                    order.full_name = self._person()
+                    for field, value in address.items():
+                        setattr(order, field, value)
+                else:
+                    order.full_name = self._person()
+                    order.phone_number = '01234567890'
+                    order.street_address1 = '1 High Street'
+                    order.town_or_city = self.rng.choice(TOWNS)
+                    order.country = 'GB'
+                order.email = f'order{order.pk}@example.com'
+
+                bag = {}
+                for _ in range(self.rng.randint(1, 5)):
+                    bag[self._popular_product()] = self.rng.randint(1, 3)
+                for product_id, quantity in bag.items():
+                    total = self.prices[product_id] * quantity
+                    lineitems.append(OrderLineItem(
+                        pk=next_lineitem, order_id=order.pk,
+                        product_id=product_id, quantity=quantity,
+                        lineitem_total=total))
+                    next_lineitem += 1
+                    order.order_total += total
+                order.grand_total = order.order_total + order.delivery_cost
+                order.original_bag = json.dumps(
+                    {str(pk): quantity for pk, quantity in bag.items()})
+                orders.append(order)
+
+            with transaction.atomic():
+                insert_rows(Order, orders)
+                insert_rows(OrderLineItem, lineitems)
+
+        return count
+
+    def finish(self):
+        """
+        Move the id sequences past the inserted ids and rebuild what the
+        skipped signals and tasks would have kept: product cards, the
+        search index, sales rollups and recommendations
+        """
+
+        User = get_user_model()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [
+                    Product, User, UserProfile, Address, SavedProduct,
+                    Order, OrderLineItem]):
+                cursor.execute(sql)
+
+        cards.rebuild_cards(self.batch_size)
+        search.rebuild_index(Product.objects.non_polymorphic(),
+                             self.batch_size)
+        sales.rebuild(self.batch_size)
+        recommendations.rebuild(self.batch_size)
+        catalog_cache.invalidate_listings()
+
+
+def generate(products=0, users=0, orders=0, seed=0, batch_size=2000,
+             days=365, stock=None):
+    """Write a synthetic data set, returning the generator used"""
+
+    generator = Generator(seed, batch_size, days)
+    generator.products(products, stock)
+    generator.users(users)
+    generator.orders(orders)
+    generator.finish()
+    return generator
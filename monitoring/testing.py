@@ -0,0 +1,170 @@
+"""
+Query and response time budgets for view tests.
+
+Test cases declare a budget per URL name and request each view at a
+small and at a large data size: a customer with one of everything and
+one with a long order history, a full bag and many saved products, or a
+narrow and a broad catalog listing. Both requests must stay within the
+budget. When one does not, the failure shows the queries of the small
+request against those of the large one, so an N+1 shows up as the
+lines the large request added.
+
+Views are measured against a local memory cache, so the queries of
+the shared database cache are not charged to them. Query budgets are
+always checked. Response times depend on the machine,
+so they are only checked when VIEW_BUDGET_TIME_FACTOR is set, e.g.
+VIEW_BUDGET_TIME_FACTOR=1 python manage.py test
+"""
+import difflib
+import time
+from collections import namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from checkout.models import Order, OrderLineItem
+from products.models import Product
+from profiles.models import Address, SavedProduct
+
+from .stats import fingerprint
+from .synthetic import generate
+
+Budget = namedtuple('Budget', ['queries', 'ms'])
+
+Measurement = namedtuple('Measurement', ['response', 'queries', 'ms'])
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Data sizes of the two customers of a budget test case
+SMALL = {'saved': 1, 'addresses': 1, 'orders': 1, 'lines': 1, 'bag': 1}
+LARGE = {'saved': 40, 'addresses': 5, 'orders': 30, 'lines': 5, 'bag': 20}
+
+
+def query_diff(small, large):
+    """Return a diff of the fingerprinted queries of two measurements"""
+
+    return '\n'.join(difflib.unified_diff(
+        [fingerprint(sql) for sql in small.queries],
+        [fingerprint(sql) for sql in large.queries],
+        'small', 'large', lineterm=''))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTestCase(TestCase):
+    """
+    Base of view budget tests, with a synthetic catalog and order
+    history, a small and a large customer and a superuser
+    """
+
+    budgets = {}
+    catalog_size = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(products=cls.catalog_size, users=20, orders=200,
+                 stock=1000)
+        cls.catalog = list(Product.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        cls.small = cls.create_customer('small', **SMALL)
+        cls.large = cls.create_customer('large', **LARGE)
+        cls.superuser = get_user_model().objects.create_superuser(
+            'budget_admin', 'budget_admin@example.com', 'password')
+
+    @classmethod
+    def create_customer(cls, username, saved, addresses, orders, lines, bag):
+        """
+        Create a user with saved products, addresses and orders. The bag
+        to request with is kept on the user as `bag`.
+        """
+
+        user = get_user_model().objects.create_user(
+            username, f'{username}@example.com', 'password')
+        profile = user.userprofile
+
+        SavedProduct.objects.bulk_create([
+            SavedProduct(profile=profile, product_id=product_id)
+            for product_id in cls.catalog[:saved]])
+        Address.objects.bulk_create([
+            Address(profile=profile, default=number == 0,
+                    phone_number='01234567890', street_address1='1 Street',
+                    town_or_city='Town', postcode='AB1 2CD', country='GB')
+            for number in range(addresses)])
+
+        prices = dict(Product.objects.non_polymorphic().filter(
+            pk__in=cls.catalog[:lines]).values_list('pk', 'price'))
+        for number in range(orders):
+            order = Order.objects.create(
+                user_profile=profile, full_name=username,
+                email=user.email, phone_number='01234567890',
+                country='GB', town_or_city='Town', street_address1='1 Street',
+                order_total=sum(prices.values()),
+                grand_total=sum(prices.values()))
+            OrderLineItem.objects.bulk_create([
+                OrderLineItem(order=order, product_id=product_id, quantity=1,
+                              lineitem_total=price)
+                for product_id, price in prices.items()])
+
+        user.bag = {str(product_id): 1 for product_id in cls.catalog[:bag]}
+        return user
+
+    def measure(self, method, path, data=None, user=None, bag=None, **extra):
+        """
+        Make a request from a new client with a cold cache, returning the
+        response, the SQL it ran and the milliseconds it took
+        """
+
+        cache.clear()
+        # Content types are cached for the life of a process, a cold
+        # cache would charge their lookups to whichever view runs first
+        ContentType.objects.get_for_models(*apps.get_models())
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        if bag is not None:
+            session = client.session
+            session['bag'] = bag
+            session.save()
+
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data or {}, **extra)
+            elapsed = time.perf_counter() - start
+
+        return Measurement(response, [query['sql'] for query in captured],
+                           elapsed * 1000)
+
+    def assertWithinBudget(self, small, large):
+        """
+        Assert that the small and the large measurement of a view both
+        succeeded within the budget of its URL name. Times are only
+        checked when VIEW_BUDGET_TIME_FACTOR is set.
+        """
+
+        name = large.response.resolver_match.url_name
+        budget = self.budgets[name]
+        time_budget = budget.ms * settings.VIEW_BUDGET_TIME_FACTOR
+
+        problems = []
+        for size, measurement in (('small', small), ('large', large)):
+            status = measurement.response.status_code
+            if status >= 400:
+                problems.append(f'{name} ({size}) returned {status}')
+            if len(measurement.queries) > budget.queries:
+                problems.append(
+                    f'{name} ({size}) ran {len(measurement.queries)} '
+                    f'queries, the budget is {budget.queries}')
+            if time_budget and measurement.ms > time_budget:
+                problems.append(
+                    f'{name} ({size}) took {measurement.ms:.0f}ms, the '
+                    f'budget is {time_budget:.0f}ms')
+
+        if problems:
+            self.fail('\n'.join(problems) + '\n\nQueries:\n'
+                      + query_diff(small, large))
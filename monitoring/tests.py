@@ -0,0 +1,160 @@
+import logging
+import tempfile
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import benchmark, profiling, stats
+from .stats import fingerprint
+from .testing import Budget, Measurement, QueryBudgetTestCase, query_diff
+
+
+def measurement(queries, ms=10, status=200):
+    response = SimpleNamespace(
+        status_code=status, resolver_match=SimpleNamespace(url_name='view'))
+    return Measurement(response, queries, ms)
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_values_are_folded(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "a" = 1 AND "b" = \'x\'\'y\''),
+            'SELECT * FROM "t" WHERE "a" = N AND "b" = S')
+
+    def test_parameter_lists_are_folded(self):
+        self.assertEqual(fingerprint('WHERE "id" IN (1, 2, 3)'),
+                         fingerprint('WHERE "id" IN (4, 5)'))
+
+    def test_savepoints_are_folded(self):
+        self.assertEqual(fingerprint('SAVEPOINT "s1234_x1"'),
+                         fingerprint('SAVEPOINT "s99_x2"'))
+
+    def test_query_diff_shows_added_queries(self):
+        diff = query_diff(
+            measurement(['SELECT 1']),
+            measurement(['SELECT 1', 'SELECT "x" WHERE "id" = 2']))
+        self.assertIn('+SELECT "x" WHERE "id" = N', diff)
+
+
+class BudgetAssertionTests(SimpleTestCase):
+
+    def assertWithinBudget(self, small, large):
+        case = QueryBudgetTestCase()
+        case.budgets = {'view': Budget(queries=2, ms=100)}
+        case.assertWithinBudget(small, large)
+
+    def test_within_budget(self):
+        self.assertWithinBudget(measurement(['SELECT 1']),
+                                measurement(['SELECT 1', 'SELECT 2']))
+
+    def test_query_budget_is_always_checked(self):
+        with self.assertRaisesMessage(
+                AssertionError, 'view (large) ran 3 queries, the budget is 2'):
+            self.assertWithinBudget(measurement(['SELECT 1']),
+                                    measurement(['SELECT 1'] * 3))
+
+    def test_error_response_fails(self):
+        with self.assertRaisesMessage(AssertionError,
+                                      'view (small) returned 500'):
+            self.assertWithinBudget(measurement([], status=500),
+                                    measurement([]))
+
+    @override_settings(VIEW_BUDGET_TIME_FACTOR=0)
+    def test_time_is_unchecked_by_default(self):
+        self.assertWithinBudget(measurement([], ms=5000),
+                                measurement([], ms=5000))
+
+    @override_settings(VIEW_BUDGET_TIME_FACTOR=2)
+    def test_time_is_checked_when_factor_is_set(self):
+        self.assertWithinBudget(measurement([], ms=150),
+                                measurement([], ms=150))
+        with self.assertRaisesMessage(
+                AssertionError, 'view (large) took 250ms, the budget is 200ms'):
+            self.assertWithinBudget(measurement([], ms=150),
+                                    measurement([], ms=250))
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    """Regressions of benchmark results against a baseline"""
+
+    def endpoint(self, errors=0, p95=100, queries=5):
+        return {'requests': 100, 'errors': errors, 'p95': p95,
+                'queries': queries}
+
+    def test_unchanged(self):
+        self.assertEqual(benchmark.compare(
+            {'checkout': self.endpoint()}, {'checkout': self.endpoint()},
+            tolerance=0.25, floor=5), [])
+
+    def test_failed_requests_are_a_regression(self):
+        self.assertEqual(benchmark.compare(
+            {'checkout': self.endpoint(errors=1)},
+            {'checkout': self.endpoint(errors=25, p95=50)},
+            tolerance=0.25, floor=5),
+            ['checkout: 1/100 -> 25/100 requests failed'])
+
+    def test_slower_and_more_queries(self):
+        self.assertEqual(len(benchmark.compare(
+            {'checkout': self.endpoint()},
+            {'checkout': self.endpoint(p95=200, queries=7)},
+            tolerance=0.25, floor=5)), 2)
+
+
+# The middleware of a deployment, without the DEBUG only browser reload
+ASGI_MIDDLEWARE = [middleware for middleware in settings.MIDDLEWARE
+                   if 'browser_reload' not in middleware]
+
+
+@override_settings(MIDDLEWARE=ASGI_MIDDLEWARE,
+                   VIEW_STATS_FLUSH_INTERVAL=60 * 60)
+class AsyncMiddlewareTests(TestCase):
+    """The middleware runs natively under ASGI"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(PROFILER_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.superuser = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        stats.registry.views.clear()
+
+    @override_settings(DEBUG=True)
+    def test_middleware_is_not_adapted(self):
+        # Django only logs the middleware it adapts in DEBUG
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            # Keeps the assertion from failing when nothing is adapted
+            logging.getLogger('django.request').debug('Loaded')
+            ASGIHandler()
+        self.assertEqual(
+            [line for line in logs.output if 'adapted' in line], [])
+
+    async def test_queries_are_recorded(self):
+        response = await self.async_client.get(reverse('products'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        queries = stats.registry.views['products'].histograms['queries']
+        self.assertEqual(queries.count, 1)
+        self.assertGreater(queries.total, 0)
+
+    async def test_request_is_profiled(self):
+        await sync_to_async(self.async_client.force_login)(self.superuser)
+        token = await sync_to_async(profiling.make_token)(self.superuser)
+        response = await self.async_client.get(
+            reverse('products'), {profiling.PROFILE_PARAM: token})
+        self.assertNotIn('public', response.get('Cache-Control', ''))
+
+        profile, = await sync_to_async(profiling.recent)()
+        self.assertEqual(profile['id'], response['X-Profile-Id'])
+        self.assertGreater(profile['queries'], 0)
+        _, profile_stats = await sync_to_async(profiling.load)(profile['id'])
+        # The view ran on the sync thread, its functions are in the profile
+        self.assertTrue([function for function in profile_stats.stats
+                         if function[2] == 'all_products'])
@@ -0,0 +1,19 @@
+from django.contrib import admin
+from .models import OutboundEmail
+
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    readonly_fields = ('subject', 'from_email', 'recipients', 'status',
+                       'attempts', 'created', 'next_attempt', 'sent',
+                       'last_error')
+
+    exclude = ('message',)
+
+    list_display = ('subject', 'from_email', 'status', 'attempts',
+                    'created', 'sent')
+
+    list_filter = ('status',)
+    ordering = ('-created',)
+
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
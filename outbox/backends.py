@@ -0,0 +1,31 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .models import OutboundEmail
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """
+    Queue messages in the outbox table instead of sending them, so that
+    requests never wait on SMTP. Rows are written in the caller's
+    transaction.
+    """
+
+    def send_messages(self, email_messages):
+        emails = [
+            OutboundEmail(
+                subject=str(email_message.subject)[:998],
+                from_email=email_message.from_email,
+                recipients=email_message.recipients(),
+                message=email_message.message().as_bytes(linesep='\r\n'),
+            )
+            for email_message in email_messages if email_message.recipients()
+        ]
+
+        try:
+            OutboundEmail.objects.bulk_create(emails)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+
+        return len(emails)
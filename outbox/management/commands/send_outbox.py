@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from outbox import sender
+
+
+class Command(BaseCommand):
+    help = ('Deliver queued emails in batches over a reused connection, '
+            'retrying failures with backoff')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Deliver the emails that are due and exit')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Most emails to send per second')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to wait when no emails are due')
+
+    def handle(self, *args, **options):
+        rate = options['rate'] or settings.OUTBOX_RATE_LIMIT
+        limiter = sender.RateLimiter(rate)
+
+        while True:
+            sent, failed = sender.deliver_batch(options['batch_size'],
+                                                limiter=limiter)
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
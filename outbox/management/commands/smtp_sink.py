@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Run a local SMTP server that prints what it receives, to test '
+            'the outbox sender. Requires aiosmtpd.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+            from aiosmtpd.handlers import Debugging
+        except ImportError as error:
+            raise CommandError(
+                'smtp_sink needs aiosmtpd, pip install aiosmtpd') from error
+
+        controller = Controller(Debugging(self.stdout), hostname='127.0.0.1',
+                                port=options['port'])
+        controller.start()
+        self.stdout.write(
+            f'Accepting mail on 127.0.0.1:{options["port"]}, in development '
+            f'run send_outbox with OUTBOX_EMAIL_BACKEND='
+            f'django.core.mail.backends.smtp.EmailBackend')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            controller.stop()
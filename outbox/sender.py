@@ -0,0 +1,145 @@
+import email
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.message import MIMEMixin
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Claimed emails still sending after this long are assumed to belong to
+# a sender that died
+STALE_AFTER = timedelta(minutes=10)
+
+
+class _StoredMIME(MIMEMixin, email.message.Message):
+    """A parsed message that Django's backends can serialize again"""
+
+
+class StoredEmail(EmailMessage):
+    """An EmailMessage replaying the stored MIME source of an outbox row"""
+
+    def __init__(self, outbound_email):
+        self._mime = email.message_from_bytes(bytes(outbound_email.message),
+                                              _class=_StoredMIME)
+        self._recipients = list(outbound_email.recipients)
+        super().__init__(subject=outbound_email.subject,
+                         from_email=outbound_email.from_email,
+                         to=self._recipients)
+
+    def message(self):
+        return self._mime
+
+    def recipients(self):
+        return self._recipients
+
+
+class RateLimiter:
+    """Space calls out so that at most rate happen per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = 0
+
+    def wait(self):
+        delay = self.next_call - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_call = max(self.next_call, time.monotonic()) + self.interval
+
+
+def retry_delay(attempts):
+    """Return the backoff before the next attempt at a failed email"""
+
+    return timedelta(
+        seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim(batch_size):
+    """
+    Claim a batch of due emails with a conditional UPDATE so concurrent
+    senders never deliver the same one, and return them
+    """
+
+    now = timezone.now()
+    due = OutboundEmail.objects.filter(
+        Q(status=OutboundEmail.PENDING, next_attempt__lte=now) |
+        Q(status=OutboundEmail.SENDING, next_attempt__lte=now - STALE_AFTER))
+    pks = list(due.order_by('next_attempt').values_list(
+        'pk', flat=True)[:batch_size])
+    if not pks:
+        return []
+
+    # Re-use the attempt time as a claim token
+    due.filter(pk__in=pks).update(status=OutboundEmail.SENDING,
+                                  next_attempt=now)
+    return list(OutboundEmail.objects.filter(
+        pk__in=pks, status=OutboundEmail.SENDING, next_attempt=now))
+
+
+def _failed(outbound_email, error):
+    outbound_email.attempts += 1
+    outbound_email.last_error = f'{type(error).__name__}: {error}'
+    if outbound_email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        outbound_email.status = OutboundEmail.FAILED
+    else:
+        outbound_email.status = OutboundEmail.PENDING
+        outbound_email.next_attempt = (
+            timezone.now() + retry_delay(outbound_email.attempts))
+    outbound_email.save(update_fields=['attempts', 'last_error', 'status',
+                                       'next_attempt'])
+
+
+def deliver_batch(batch_size=None, limiter=None):
+    """
+    Deliver a batch of due emails over a single connection to the
+    delivery backend, reopening it only if the server drops it. Returns
+    the numbers of emails sent and failed.
+    """
+
+    batch = claim(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0, 0
+
+    limiter = limiter or RateLimiter(settings.OUTBOX_RATE_LIMIT)
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND,
+                                fail_silently=False)
+    sent = []
+    failed = 0
+
+    try:
+        connection.open()
+        for outbound_email in batch:
+            limiter.wait()
+            try:
+                try:
+                    connection.send_messages([StoredEmail(outbound_email)])
+                except smtplib.SMTPServerDisconnected:
+                    connection.close()
+                    connection.open()
+                    connection.send_messages([StoredEmail(outbound_email)])
+            except Exception as error:
+                logger.warning('Could not send email %s: %s',
+                               outbound_email.pk, error)
+                _failed(outbound_email, error)
+                failed += 1
+            else:
+                sent.append(outbound_email.pk)
+    except Exception as error:
+        # The connection could not be opened, so nothing more is sent
+        for outbound_email in batch[len(sent) + failed:]:
+            _failed(outbound_email, error)
+            failed += 1
+    finally:
+        connection.close()
+        OutboundEmail.objects.filter(pk__in=sent).update(
+            status=OutboundEmail.SENT, sent=timezone.now(), last_error='')
+
+    return len(sent), failed
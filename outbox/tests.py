@@ -0,0 +1,99 @@
+import smtplib
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import sender
+from .models import OutboundEmail
+
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class FailingBackend(BaseEmailBackend):
+    """Delivery backend whose server refuses every message"""
+
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPRecipientsRefused({})
+
+
+class UnreachableBackend(BaseEmailBackend):
+    """Delivery backend whose server cannot be reached"""
+
+    def open(self):
+        raise ConnectionRefusedError('Connection refused')
+
+
+@override_settings(
+    EMAIL_BACKEND='outbox.backends.OutboxEmailBackend',
+    OUTBOX_EMAIL_BACKEND=LOCMEM, OUTBOX_RATE_LIMIT=0,
+    OUTBOX_RETRY_DELAY=60, OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(TestCase):
+    """Queueing emails and delivering them in batches"""
+
+    def queue(self, count=1):
+        for number in range(count):
+            mail.send_mail(f'Subject {number}', 'Body',
+                           'shop@example.com', [f'{number}@example.com'])
+
+    def test_send_mail_is_queued_not_sent(self):
+        self.queue()
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, OutboundEmail.PENDING)
+        self.assertEqual(queued.recipients, ['0@example.com'])
+
+    def test_deliver_batch(self):
+        self.queue(3)
+        self.assertEqual(sender.deliver_batch(batch_size=2), (2, 0))
+        self.assertEqual(sender.deliver_batch(batch_size=2), (1, 0))
+        self.assertEqual(sender.deliver_batch(), (0, 0))
+
+        self.assertEqual(sorted(message.subject for message in mail.outbox),
+                         ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(mail.outbox[0].message().get_payload(), 'Body')
+        self.assertFalse(OutboundEmail.objects.exclude(
+            status=OutboundEmail.SENT).exists())
+
+    def test_claimed_email_is_not_claimed_again(self):
+        self.queue()
+        self.assertEqual(len(sender.claim(10)), 1)
+        self.assertEqual(sender.claim(10), [])
+
+    @override_settings(OUTBOX_EMAIL_BACKEND='outbox.tests.FailingBackend')
+    def test_failed_email_is_retried_then_given_up(self):
+        self.queue()
+        before = timezone.now()
+        self.assertEqual(sender.deliver_batch(), (0, 1))
+
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, OutboundEmail.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('SMTPRecipientsRefused', queued.last_error)
+        self.assertGreaterEqual(queued.next_attempt,
+                                before + timedelta(seconds=60))
+        self.assertEqual(sender.deliver_batch(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt=timezone.now())
+        self.assertEqual(sender.deliver_batch(), (0, 1))
+        self.assertEqual(OutboundEmail.objects.get().status,
+                         OutboundEmail.FAILED)
+
+    @override_settings(OUTBOX_EMAIL_BACKEND='outbox.tests.UnreachableBackend')
+    def test_unreachable_server_fails_the_whole_batch(self):
+        self.queue(2)
+        self.assertEqual(sender.deliver_batch(), (0, 2))
+        self.assertEqual(OutboundEmail.objects.filter(
+            status=OutboundEmail.PENDING, attempts=1).count(), 2)
+
+    def test_contact_form_queues_one_email(self):
+        self.client.post(reverse('contact'), {
+            'name': 'Customer', 'email': 'customer@example.com',
+            'subject': 'Order', 'message': 'Where is my order?'})
+        self.assertEqual(OutboundEmail.objects.get().recipients,
+                         ['customer@example.com'])
+        self.assertEqual(sender.deliver_batch(), (1, 0))
+        self.assertEqual(mail.outbox[0].subject, 'Order')
@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+
+from checkout import orders
+
+from . import cards, catalog_cache, search
+from .models import Product
+
+
+@transaction.atomic
+def update_products(changes):
+    """
+    Apply price and quantity changes, given as {product id: {field:
+    value}}, with one bulk UPDATE per field. Only the fields that changed
+    are written, so a quantity edit never overwrites a price changed
+    meanwhile and the other way round. Cards and cached pages of the
+    products are refreshed once for the whole batch since bulk_update
+    sends no signals. Returns the number of products updated.
+    """
+
+    products = Product.objects.non_polymorphic().only(
+        'pk', 'price', 'quantity').in_bulk(list(changes))
+
+    updated = {'price': [], 'quantity': []}
+    for product_id, fields in changes.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        for field, value in fields.items():
+            setattr(product, field, value)
+            updated[field].append(product)
+
+    for field, changed in updated.items():
+        Product.objects.non_polymorphic().bulk_update(
+            changed, [field], batch_size=500)
+
+    pks = {product.pk for changed in updated.values() for product in changed}
+    cards.update_cards(pks)
+    catalog_cache.invalidate_products(pks)
+
+    return len(pks)
+
+
+@transaction.atomic
+def delete_products(pks):
+    """
+    Delete products with set based DELETEs, a table at a time, and their
+    search index entries and the totals of the orders that had them in
+    a single statement each. Subclass rows go first
+    while keeping their parents: collecting the parent of each through
+    polymorphic's ptr accessor would fetch the parents one by one.
+    Returns the number of products deleted.
+    """
+
+    pks = list(pks)
+    by_type = defaultdict(list)
+    for ctype_id, pk in Product.objects.non_polymorphic().filter(
+            pk__in=pks).values_list('polymorphic_ctype_id', 'pk'):
+        by_type[ctype_id].append(pk)
+
+    with search.deferred_removals(), orders.deferred_totals():
+        for ctype_id, type_pks in by_type.items():
+            model = ContentType.objects.get_for_id(ctype_id).model_class()
+            if model is Product:
+                continue
+            collector = Collector(using=router.db_for_write(model))
+            collector.collect(model.objects.non_polymorphic().filter(
+                pk__in=type_pks), keep_parents=True)
+            collector.delete()
+
+        _, deleted = Product.objects.non_polymorphic().filter(
+            pk__in=pks).delete()
+
+    return deleted.get(Product._meta.label, 0)
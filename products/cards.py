@@ -0,0 +1,75 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import default_storage
+
+from .models import Product, ProductCard
+from .thumbnails import srcset
+
+CARD_FIELDS = ('pk', 'category_id', 'polymorphic_ctype_id', 'sku', 'name',
+               'price', 'image', 'image_url', 'thumbnails', 'quantity',
+               'reserved')
+
+
+def build_card(values):
+    """Build an unsaved product card from a dict of product values"""
+
+    if values['image']:
+        image_url = default_storage.url(values['image'])
+    else:
+        image_url = values['image_url']
+
+    product_type = ContentType.objects.get_for_id(
+        values['polymorphic_ctype_id']).model
+
+    return ProductCard(
+        product_id=values['pk'],
+        category_id=values['category_id'],
+        product_type=product_type,
+        sku=values['sku'],
+        name=values['name'],
+        price=values['price'],
+        image_url=image_url,
+        srcset_webp=srcset(values['thumbnails'], 'webp'),
+        srcset_jpeg=srcset(values['thumbnails'], 'jpeg'),
+        sold_out=values['quantity'] <= values['reserved'],
+    )
+
+
+def update_card(product):
+    """Create or replace the card of a saved product instance"""
+
+    values = {field: getattr(product, field) for field in CARD_FIELDS}
+    values['image'] = product.image.name if product.image else None
+    build_card(values).save()
+
+
+def update_cards(pks):
+    """Create or replace the cards of the given product ids from the database"""
+
+    pks = list(pks)
+    rows = Product.objects.non_polymorphic().filter(
+        pk__in=pks).values(*CARD_FIELDS)
+    new_cards = [build_card(values) for values in rows]
+
+    ProductCard.objects.filter(pk__in=pks).delete()
+    ProductCard.objects.bulk_create(new_cards)
+
+
+def rebuild_cards(batch_size=1000):
+    """Replace every product card in batches"""
+
+    ProductCard.objects.all().delete()
+
+    rows = Product.objects.non_polymorphic().order_by('pk').values(
+        *CARD_FIELDS).iterator(chunk_size=batch_size)
+
+    total = 0
+    batch = []
+    for values in rows:
+        batch.append(build_card(values))
+        if len(batch) >= batch_size:
+            ProductCard.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    ProductCard.objects.bulk_create(batch)
+
+    return total + len(batch)
@@ -0,0 +1,121 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_TIMEOUT = 60 * 15
+
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+LISTING_PARAMS = ('sort', 'direction', 'category', 'q', 'cursor')
+
+
+def _incr(key):
+    """
+    Increment a counter, creating it if the cache has evicted it. Redis
+    increments atomically, the database cache reads and writes the value
+    back so racing processes may lose a count.
+    """
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Never reuse a version that may still have entries cached
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def listing_key(params):
+    """
+    Return the cache key of a product listing. Only the parameters that
+    affect the listing are used, normalized so equivalent urls share an
+    entry.
+    """
+
+    parts = []
+    for param in LISTING_PARAMS:
+        value = params.get(param)
+        if value is None:
+            continue
+        if param == 'category':
+            value = ','.join(sorted(set(value.split(','))))
+        elif param == 'q':
+            value = ' '.join(value.lower().split())
+        parts.append(f'{param}={value}')
+
+    digest = hashlib.md5('&'.join(parts).encode('utf-8')).hexdigest()
+    return f'catalog:listing:{_version()}:{digest}'
+
+
+def detail_key(product_id):
+    return f'catalog:detail:{product_id}'
+
+
+def get_or_render(key, render):
+    """
+    Return the cached value for the key, calling render to build and
+    cache it on a miss
+    """
+
+    value = cache.get(key)
+    if value is not None:
+        _incr(HITS_KEY)
+        return value
+
+    _incr(MISSES_KEY)
+    value = render()
+    cache.set(key, value, CACHE_TIMEOUT)
+    return value
+
+
+def invalidate_listings():
+    """Drop every cached listing by moving to a new key version"""
+
+    transaction.on_commit(_bump_version)
+
+
+def invalidate_product(product_id):
+    """Drop the cached detail of a product and every cached listing"""
+
+    transaction.on_commit(lambda: cache.delete(detail_key(product_id)))
+    invalidate_listings()
+
+
+def invalidate_products(product_ids):
+    """Drop the cached details of several products and every cached listing"""
+
+    keys = [detail_key(product_id) for product_id in product_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    invalidate_listings()
+
+
+def stats():
+    """Return the hit and miss counts of the catalog cache"""
+
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
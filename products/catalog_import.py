@@ -0,0 +1,243 @@
+import csv
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from . import cards, catalog_cache, search
+from .models import Book, BoxedSet, Category, Collectible, Product
+
+PRODUCT_TYPES = {model._meta.model_name: model
+                 for model in (Book, BoxedSet, Collectible)}
+
+# Product fields that can be imported, besides category which is
+# resolved by name
+PRODUCT_FIELDS = ('sku', 'name', 'description', 'price', 'image_url',
+                  'quantity')
+
+
+def read_rows(file, file_format):
+    """
+    Stream (line number, row) pairs from a CSV or JSON lines file. JSON
+    rows are returned undecoded so that bad lines are reported with the
+    other validation errors.
+    """
+
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, 1):
+            if line.strip():
+                yield line_number, line
+
+
+def _clean_field(field, raw):
+    if raw is None or raw == '':
+        if field.has_default():
+            return field.get_default()
+        raw = None
+    return field.clean(raw, None)
+
+
+def _child_fields(model):
+    return [field for field in model._meta.local_concrete_fields
+            if not field.primary_key]
+
+
+class CatalogImporter:
+    """
+    Validate and write catalog rows in batches. Each batch costs a fixed
+    number of queries: one sku lookup, one bulk insert of parent rows, one
+    insert per product type for the child rows and bulk updates of the
+    given columns for skus that already exist.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('name', 'pk'))
+        self.content_types = {
+            name: ContentType.objects.get_for_model(model).pk
+            for name, model in PRODUCT_TYPES.items()}
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def clean_row(self, row):
+        """
+        Return the product type, the cleaned parent and child values and
+        the columns given by a row, raising ValidationError if it is
+        invalid
+        """
+
+        if isinstance(row, str):
+            try:
+                row = json.loads(row)
+            except ValueError as error:
+                raise ValidationError(f'Invalid JSON: {error}') from error
+
+        product_type = (row.get('type') or '').strip().lower()
+        if product_type not in PRODUCT_TYPES:
+            raise ValidationError(f'Unknown product type "{product_type}"')
+        model = PRODUCT_TYPES[product_type]
+
+        category = row.get('category')
+        if category and category not in self.categories:
+            raise ValidationError(f'Unknown category "{category}"')
+
+        values = {name: _clean_field(Product._meta.get_field(name),
+                                     row.get(name))
+                  for name in PRODUCT_FIELDS}
+        values['category_id'] = self.categories.get(category)
+
+        child_values = {field.attname: _clean_field(field, row.get(field.name))
+                        for field in _child_fields(model)}
+
+        # Existing products only have the columns of the file updated
+        columns = frozenset(
+            [name for name in PRODUCT_FIELDS if name in row] +
+            (['category_id'] if 'category' in row else []) +
+            [field.attname for field in _child_fields(model)
+             if field.name in row])
+
+        return product_type, values, child_values, columns
+
+    def run(self, rows):
+        """Validate and write (line number, row) pairs"""
+
+        batch = []
+        for line_number, row in rows:
+            try:
+                batch.append((line_number, *self.clean_row(row)))
+            except ValidationError as error:
+                self.errors.append((line_number, '; '.join(error.messages)))
+
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+
+        self.write_batch(batch)
+
+    @transaction.atomic
+    def write_batch(self, batch):
+        """Insert new products and update existing ones matched on sku"""
+
+        if not batch:
+            return
+
+        # The last row wins when a sku repeats within a batch
+        by_sku = {}
+        without_sku = []
+        for entry in batch:
+            sku = entry[2]['sku']
+            if sku:
+                by_sku[sku] = entry
+            else:
+                without_sku.append(entry)
+
+        existing = {
+            sku: (pk, ctype_id) for sku, pk, ctype_id in
+            Product.objects.non_polymorphic().filter(
+                sku__in=list(by_sku)).values_list(
+                    'sku', 'pk', 'polymorphic_ctype_id')}
+
+        new = list(without_sku)
+        updates = []
+        for sku, entry in by_sku.items():
+            if sku not in existing:
+                new.append(entry)
+                continue
+            pk, ctype_id = existing[sku]
+            if ctype_id != self.content_types[entry[1]]:
+                self.errors.append(
+                    (entry[0], f'SKU {sku} exists as a different type'))
+                continue
+            updates.append((pk, entry))
+
+        created = self._create(new)
+        updated = self._update(updates)
+
+        pks = created + updated
+        cards.update_cards(pks)
+        search.index_products(
+            (pk, entry[2]['name'], entry[2]['description'])
+            for pk, entry in zip(pks, new + [entry for _, entry in updates]))
+
+        catalog_cache.invalidate_listings()
+        for pk in updated:
+            catalog_cache.invalidate_product(pk)
+
+        self.created += len(created)
+        self.updated += len(updated)
+
+    def _create(self, entries):
+        parents = [
+            Product(polymorphic_ctype_id=self.content_types[product_type],
+                    **values)
+            for _, product_type, values, _, _ in entries]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Product.objects.non_polymorphic().bulk_create(parents)
+        else:
+            # The database cannot return ids from bulk inserts
+            for parent in parents:
+                parent.save_base(raw=True)
+
+        children = {}
+        for parent, (_, product_type, _, child_values, _) in zip(parents,
+                                                                  entries):
+            children.setdefault(product_type, []).append(
+                (parent.pk, child_values))
+
+        with connection.cursor() as cursor:
+            for product_type, rows in children.items():
+                model = PRODUCT_TYPES[product_type]
+                fields = _child_fields(model)
+                ptr = model._meta.pk
+                columns = ', '.join(connection.ops.quote_name(column)
+                                    for column in [ptr.column] +
+                                    [field.column for field in fields])
+                placeholders = ', '.join(['%s'] * (len(fields) + 1))
+                cursor.executemany(
+                    f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} '
+                    f'({columns}) VALUES ({placeholders})',
+                    [[pk] + [field.get_db_prep_save(child_values[field.attname],
+                                                    connection)
+                             for field in fields]
+                     for pk, child_values in rows])
+
+        return [parent.pk for parent in parents]
+
+    def _update(self, updates):
+        if not updates:
+            return []
+
+        # Rows are grouped by the columns they give, a file has one group
+        # per product type
+        parents = {}
+        children = {}
+        for pk, (_, product_type, values, child_values, columns) in updates:
+            model = PRODUCT_TYPES[product_type]
+            parent_fields = tuple(name for name in
+                                  PRODUCT_FIELDS + ('category_id',)
+                                  if name in columns)
+            child_fields = tuple(field.attname
+                                 for field in _child_fields(model)
+                                 if field.attname in columns)
+            parents.setdefault(parent_fields, []).append(
+                Product(pk=pk, **values))
+            children.setdefault((product_type, child_fields), []).append(
+                model(pk=pk, **child_values))
+
+        for fields, objs in parents.items():
+            if fields:
+                Product.objects.non_polymorphic().bulk_update(
+                    objs, fields, batch_size=self.batch_size)
+
+        for (product_type, fields), objs in children.items():
+            if fields:
+                PRODUCT_TYPES[product_type].objects.bulk_update(
+                    objs, fields, batch_size=self.batch_size)
+
+        return [pk for pk, _ in updates]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django import forms
 
 from .models import Product, Category, Book, BoxedSet, Collectible
@@ -46,3 +48,11 @@ class CollectibleForm(ProductForm):
     class Meta:
         model = Collectible
         fields = '__all__'
+
+
+class ProductStockForm(forms.Form):
+    """Price and quantity of a row of the product management table"""
+
+    price = forms.DecimalField(max_digits=6, decimal_places=2,
+                               min_value=Decimal('0.01'))
+    quantity = forms.IntegerField(min_value=0)
@@ -0,0 +1,215 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.db.models import IntegerField
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import Product, ProductCard, StockReservation
+
+
+class OutOfStock(Exception):
+    """Raised when there is not enough stock available for an order"""
+
+    def __init__(self, product_ids):
+        super().__init__(f'Not enough stock for product(s) {product_ids}')
+        self.product_ids = product_ids
+
+
+def _normalize(items):
+    """Return {product id: quantity} with ids as ints and no empty lines"""
+
+    return {int(pk): int(quantity)
+            for pk, quantity in items.items() if int(quantity) > 0}
+
+
+def _per_product(values, default=0):
+    """Return a CASE expression selecting a value per product id"""
+
+    return Case(*[When(pk=pk, then=Value(value))
+                  for pk, value in values.items()],
+                default=Value(default), output_field=IntegerField())
+
+
+def _short_products(items):
+    """Return the ids of products that cannot cover their quantity"""
+
+    stock = {pk: quantity - reserved for pk, quantity, reserved in
+             Product.objects.non_polymorphic().filter(
+                 pk__in=list(items)).values_list(
+                     'pk', 'quantity', 'reserved')}
+
+    return [pk for pk, quantity in items.items()
+            if stock.get(pk, 0) < quantity]
+
+
+def _claim(items, **updates):
+    """
+    Apply updates to every product that has its quantity available, in a
+    single UPDATE, raising OutOfStock unless all of them matched
+    """
+
+    updated = Product.objects.non_polymorphic().filter(
+        Q(*[Q(pk=pk, quantity__gte=F('reserved') + quantity)
+            for pk, quantity in items.items()], _connector=Q.OR)
+    ).update(**updates)
+
+    if updated != len(items):
+        raise OutOfStock(_short_products(items))
+
+
+def _refresh(product_ids):
+    """Sync listing cards and cached pages with changed stock levels"""
+
+    product_ids = list(product_ids)
+    ProductCard.objects.filter(pk__in=product_ids).update(
+        sold_out=Exists(Product.objects.non_polymorphic().filter(
+            pk=OuterRef('pk'), quantity__lte=F('reserved'))))
+    catalog_cache.invalidate_products(product_ids)
+
+
+def _release_reservations(reservations):
+    """
+    Lock and delete reservations, returning their stock to the products
+    in one UPDATE. Returns the released quantity per product.
+    """
+
+    rows = list(reservations.select_for_update().values_list(
+        'pk', 'product_id', 'quantity'))
+
+    held = {}
+    for _, product_id, quantity in rows:
+        held[product_id] = held.get(product_id, 0) + quantity
+
+    if rows:
+        Product.objects.non_polymorphic().filter(pk__in=list(held)).update(
+            reserved=F('reserved') - _per_product(held))
+        StockReservation.objects.filter(
+            pk__in=[pk for pk, _, _ in rows]).delete()
+
+    return held
+
+
+def _release(payment_intent):
+    """Release the reservations of a payment intent, returning them"""
+
+    return _release_reservations(StockReservation.objects.filter(
+        payment_intent=payment_intent))
+
+
+@transaction.atomic
+def reserve(payment_intent, items, ttl=None):
+    """
+    Hold stock for a payment intent, replacing any reservation it already
+    has. All products are reserved by a single conditional UPDATE, so
+    either every line is held or OutOfStock is raised and nothing is.
+    """
+
+    items = _normalize(items)
+    ttl = ttl or settings.STOCK_RESERVATION_TTL
+    previous = _release(payment_intent)
+
+    if items:
+        _claim(items, reserved=F('reserved') + _per_product(items))
+
+        expires = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=pk, payment_intent=payment_intent,
+                             quantity=quantity, expires=expires)
+            for pk, quantity in items.items()])
+
+    _refresh(set(items) | set(previous))
+
+
+@transaction.atomic
+def release(payment_intent):
+    """Give back the stock held for a payment intent"""
+
+    held = _release(payment_intent)
+    _refresh(held)
+
+
+@transaction.atomic
+def release_all(payment_intents):
+    """Give back the stock held for several payment intents at once"""
+
+    held = _release_reservations(StockReservation.objects.filter(
+        payment_intent__in=list(payment_intents)))
+    _refresh(held)
+
+
+def extend(payment_intent, ttl=None):
+    """
+    Push back the expiry of a payment intent's live reservations without
+    touching stock. Returns the number of reservations still held.
+    """
+
+    ttl = ttl or settings.STOCK_RESERVATION_TTL
+    now = timezone.now()
+    return StockReservation.objects.filter(
+        payment_intent=payment_intent, expires__gt=now).update(
+            expires=now + timedelta(seconds=ttl))
+
+
+@transaction.atomic
+def purchase(items, payment_intent=None, oversell=False):
+    """
+    Decrement stock for an order in a single conditional UPDATE,
+    consuming the reservations of its payment intent. Raises OutOfStock
+    and changes nothing if any product cannot cover its quantity.
+
+    With oversell, as for an order that has already been paid for, the
+    short products are taken down to no stock instead and their ids are
+    returned.
+    """
+
+    items = _normalize(items)
+    if not items:
+        return []
+
+    # The stock held by the payment intent is handed back and claimed
+    # again below while the rows are still locked by this transaction
+    held = _release(payment_intent) if payment_intent else {}
+
+    oversold = []
+    try:
+        with transaction.atomic():
+            _claim(items, quantity=F('quantity') - _per_product(items))
+    except OutOfStock as error:
+        if not oversell:
+            raise
+        oversold = error.product_ids
+        Product.objects.non_polymorphic().filter(pk__in=list(items)).update(
+            quantity=Greatest(F('quantity') - _per_product(items), Value(0)))
+
+    _refresh(set(items) | set(held))
+    return oversold
+
+
+def release_expired(now=None, batch_size=1000):
+    """
+    Release every reservation that has outlived its payment intent, in
+    batches of one UPDATE and one DELETE each. Returns the quantity of
+    stock released.
+    """
+
+    now = now or timezone.now()
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.filter(
+                pk__in=list(StockReservation.objects.filter(
+                    expires__lte=now).values_list(
+                        'pk', flat=True)[:batch_size]))
+            held = _release_reservations(expired)
+            _refresh(held)
+
+        if not held:
+            break
+        total += sum(held.values())
+
+    return total
@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from products import inventory
+from products.models import Collectible, Product
+
+
+class Command(BaseCommand):
+    help = ('Run parallel checkouts against a single product and report '
+            'throughput and overselling')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--legacy', action='store_true',
+                            help='Use the old read-modify-write decrement')
+
+    def legacy_purchase(self, product_id):
+        product = Product.objects.get(pk=product_id)
+        if product.quantity <= 0:
+            raise inventory.OutOfStock([product_id])
+        product.quantity -= 1
+        product.save()
+
+    def checkout(self, product_id, steps, results):
+        sold = 0
+        errors = 0
+        try:
+            while True:
+                payment_intent = f'bench_{uuid.uuid4().hex}'
+                try:
+                    for step in steps:
+                        # SQLite reports lock contention as an error
+                        # instead of waiting, so retry the step
+                        while True:
+                            try:
+                                step(product_id, payment_intent)
+                                break
+                            except DatabaseError:
+                                errors += 1
+                    sold += 1
+                except inventory.OutOfStock:
+                    break
+        finally:
+            connection.close()
+            results.append((sold, errors))
+
+    def handle(self, *args, **options):
+        stock = options['stock']
+        product = Collectible.objects.create(
+            name='Inventory benchmark', description='', sku='BENCHMARK',
+            price=Decimal('1.00'), quantity=stock)
+
+        if options['legacy']:
+            steps = [lambda pk, payment_intent: self.legacy_purchase(pk)]
+        else:
+            steps = [
+                lambda pk, payment_intent: inventory.reserve(
+                    payment_intent, {pk: 1}),
+                lambda pk, payment_intent: inventory.purchase(
+                    {pk: 1}, payment_intent),
+            ]
+
+        results = []
+        threads = [threading.Thread(target=self.checkout,
+                                    args=(product.pk, steps, results))
+                   for _ in range(options['threads'])]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        sold = sum(result[0] for result in results)
+        errors = sum(result[1] for result in results)
+        product.refresh_from_db()
+        product.delete()
+
+        self.stdout.write(f'Checkouts: {sold} in {elapsed:.2f}s '
+                          f'({sold / elapsed:.0f}/s)')
+        self.stdout.write(f'Database errors retried: {errors}')
+        self.stdout.write(f'Remaining stock: {product.quantity}')
+        if sold > stock:
+            self.stdout.write(self.style.ERROR(
+                f'Oversold by {sold - stock} item(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No overselling'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products import catalog_cache
+
+
+class Command(BaseCommand):
+    help = 'Report the hit and miss counts of the catalog page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Reset the counters after reporting')
+
+    def handle(self, *args, **options):
+        stats = catalog_cache.stats()
+        self.stdout.write(f'Hits: {stats["hits"]}')
+        self.stdout.write(f'Misses: {stats["misses"]}')
+        self.stdout.write(f'Hit rate: {stats["hit_rate"]:.1%}')
+
+        if options['reset']:
+            catalog_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
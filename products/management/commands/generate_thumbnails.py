@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.thumbnails import generate_thumbnails, save_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive thumbnails for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of images processed in parallel')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate existing thumbnails')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(
+            image__isnull=True).exclude(image='')
+        if not options['force']:
+            products = products.filter(thumbnails={})
+
+        generated = 0
+        failed = 0
+
+        # Image processing and storage uploads run in the pool, while
+        # database writes stay on this thread's connection
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(generate_thumbnails, product.image):
+                       product for product in products.iterator()}
+            for future in as_completed(futures):
+                product = futures[future]
+                try:
+                    save_thumbnails(product, future.result())
+                    generated += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{product} failed: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated thumbnails for {generated} product(s), '
+            f'{failed} failed'))
@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_import import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Bulk import Book, BoxedSet and Collectible products from a '
+            'CSV or JSON lines file, updating existing products by sku')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            extension = os.path.splitext(path)[1].lower()
+            file_format = 'csv' if extension == '.csv' else 'jsonl'
+
+        try:
+            file = open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error) from error
+
+        importer = CatalogImporter(batch_size=options['batch_size'])
+        start = time.perf_counter()
+        with file:
+            importer.run(read_rows(file, file_format))
+        elapsed = time.perf_counter() - start
+
+        for line_number, message in importer.errors:
+            self.stderr.write(f'Line {line_number}: {message}')
+
+        rows = importer.created + importer.updated
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {importer.created} and updated {importer.updated} '
+            f'product(s), {len(importer.errors)} row(s) rejected, '
+            f'in {elapsed:.2f}s ({rate:.0f} rows/s)'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products import cards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized product listing cards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = cards.rebuild_cards(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Built {total} product card(s)'))
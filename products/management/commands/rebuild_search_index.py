@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products import search
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write('Full text search is not supported by this '
+                              'database, nothing to rebuild')
+            return
+
+        total = search.rebuild_index(
+            Product.objects.non_polymorphic(), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} product(s)'))
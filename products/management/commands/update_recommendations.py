@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Count new orders into the "customers also bought" '
+            'recommendations, or recount every order with --rebuild')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            counted = recommendations.rebuild(
+                batch_size=options['batch_size'])
+        else:
+            counted = recommendations.update(
+                batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Counted {counted} order(s)'))
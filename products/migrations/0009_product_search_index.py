@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from products import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    Product = apps.get_model('products', 'Product')
+    search.index_products(
+        Product.objects.values_list('pk', 'name', 'description'))
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_alter_product_quantity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:25
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+def build_product_cards(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductCard = apps.get_model('products', 'ProductCard')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    model_names = dict(ContentType.objects.values_list('pk', 'model'))
+    cards = []
+    for product in Product.objects.all().iterator():
+        if product.image:
+            image_url = default_storage.url(product.image.name)
+        else:
+            image_url = product.image_url
+        cards.append(ProductCard(
+            product_id=product.pk,
+            category_id=product.category_id,
+            product_type=model_names.get(product.polymorphic_ctype_id, ''),
+            sku=product.sku,
+            name=product.name,
+            price=product.price,
+            image_url=image_url,
+            sold_out=product.quantity == 0,
+        ))
+    ProductCard.objects.bulk_create(cards, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('products', '0009_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('product_type', models.CharField(db_index=True, max_length=100)),
+                ('sku', models.CharField(blank=True, max_length=254, null=True)),
+                ('name', models.CharField(max_length=254)),
+                ('price', models.DecimalField(db_index=True, decimal_places=2, max_digits=6)),
+                ('image_url', models.URLField(blank=True, max_length=1024, null=True)),
+                ('sold_out', models.BooleanField(default=False)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.category')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='productcard_lower_name_idx'),
+        ),
+        migrations.RunPython(build_product_cards, migrations.RunPython.noop),
+    ]
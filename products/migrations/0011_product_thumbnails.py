@@ -0,0 +1,28 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='srcset_jpeg',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='srcset_webp',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
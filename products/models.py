@@ -2,9 +2,12 @@ from decimal import Decimal
 
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Lower
 
 from polymorphic.models import PolymorphicModel
 
+from .thumbnails import srcset
+
 
 class Category(models.Model):
     class Meta:
@@ -31,13 +34,37 @@ class Product(PolymorphicModel):
     image_url = models.URLField(max_length=1024, null=True, blank=True)
     image = models.ImageField(null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
+    # Stock held by pending checkouts, see products.inventory
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
-    def purchase(self):
-        self.quantity -= 1
-        self.save()
+    def save(self, *args, update_fields=None, **kwargs):
+        # reserved is only changed by the UPDATEs of products.inventory,
+        # saving an instance loaded earlier must not write back a stale
+        # count
+        if (update_fields is None and not self._state.adding
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+                and field.attname not in deferred]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @property
+    def srcset_webp(self):
+        return srcset(self.thumbnails, 'webp')
+
+    @property
+    def srcset_jpeg(self):
+        return srcset(self.thumbnails, 'jpeg')
+
+    @property
+    def available(self):
+        return self.quantity - self.reserved
 
 
 class Book(Product):
@@ -58,3 +85,92 @@ class Collectible(Product):
     release_date = models.CharField(max_length=254, null=True, blank=True)
     dimensions = models.CharField(max_length=254, null=True, blank=True)
     details = models.TextField(null=True, blank=True)
+
+
+class StockReservation(models.Model):
+    """Stock held for the lifetime of a pending Stripe PaymentIntent"""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='reservations')
+    payment_intent = models.CharField(max_length=254, db_index=True)
+    quantity = models.PositiveIntegerField()
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} for {self.payment_intent}'
+
+
+class ProductCard(models.Model):
+    """
+    Denormalized listing projection of a product holding only what a
+    product card renders. Kept in sync by products.signals.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(Lower('name'), name='productcard_lower_name_idx'),
+        ]
+
+    product = models.OneToOneField(
+        Product, primary_key=True, on_delete=models.CASCADE,
+        related_name='card')
+    category = models.ForeignKey(
+        Category, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='+')
+    product_type = models.CharField(max_length=100, db_index=True)
+    sku = models.CharField(max_length=254, null=True, blank=True)
+    name = models.CharField(max_length=254)
+    price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
+    image_url = models.URLField(max_length=1024, null=True, blank=True)
+    srcset_webp = models.TextField(blank=True, default='')
+    srcset_jpeg = models.TextField(blank=True, default='')
+    sold_out = models.BooleanField(default=False)
+
+    def __str__(self):
+        return self.name
+
+
+class CoPurchase(models.Model):
+    """
+    Number of orders containing both products. Stored in both directions
+    so that the neighbours of a product are one index range.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'],
+                                    name='unique_copurchase_pair'),
+        ]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.product_id} with {self.other_id}: {self.orders}'
+
+
+class Recommendation(models.Model):
+    """
+    One of the top products bought together with a product, kept by
+    products.recommendations
+    """
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'],
+                                    name='unique_recommendation_rank'),
+        ]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='recommended_by')
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'{self.recommended_id} for {self.product_id} (#{self.rank})'
@@ -0,0 +1,124 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+
+PAGE_SIZE = 24
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(value, pk):
+    """Encode the sort value and primary key of the last row on a page"""
+
+    data = json.dumps([value, pk], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, field=None):
+    """
+    Decode a cursor created by encode_cursor, converting its sort value
+    with the field sorted on. Raises InvalidCursor for anything that
+    encode_cursor could not have produced.
+    """
+
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if isinstance(value, (list, dict)) or isinstance(pk, bool):
+            raise TypeError('Cursors hold a single value and a pk')
+        if field is None:
+            value = None
+        elif value is not None:
+            value = field.to_python(value)
+        return value, int(pk)
+    except (TypeError, ValueError, ValidationError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over a single sort key with the primary key as
+    tie breaker. Each page is fetched with a WHERE clause that seeks past
+    the previous page, so the cost of a page does not depend on how deep
+    into the listing it is.
+    """
+
+    def __init__(self, queryset, sortkey=None, per_page=PAGE_SIZE):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = bool(sortkey) and sortkey.startswith('-')
+        self.field = sortkey.lstrip('-') if sortkey else None
+
+    def _ordering(self):
+        if self.field is None:
+            return ['-pk'] if self.descending else ['pk']
+
+        # Pin null placement so SQLite and Postgres page identically
+        if self.descending:
+            return [F(self.field).desc(nulls_first=True), '-pk']
+        return [F(self.field).asc(nulls_last=True), 'pk']
+
+    def _seek(self, value, pk):
+        pk_after = Q(pk__lt=pk) if self.descending else Q(pk__gt=pk)
+
+        if self.field is None:
+            return pk_after
+
+        lookup = 'lt' if self.descending else 'gt'
+        is_null = Q(**{f'{self.field}__isnull': True})
+
+        if value is None:
+            # Nulls come first when descending and last when ascending
+            if self.descending:
+                return (is_null & pk_after) | ~is_null
+            return is_null & pk_after
+
+        after = (Q(**{f'{self.field}__{lookup}': value})
+                 | Q(**{self.field: value}) & pk_after)
+        if not self.descending:
+            after |= is_null
+        return after
+
+    def _sort_field(self):
+        if self.field is None:
+            return None
+        try:
+            return self.queryset.model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            return self.queryset.query.annotations[self.field].output_field
+
+    def _value(self, obj):
+        if self.field is None:
+            return None
+        try:
+            attname = obj._meta.get_field(self.field).attname
+        except FieldDoesNotExist:
+            # Annotations such as lower_name
+            attname = self.field
+        return getattr(obj, attname)
+
+    def page(self, cursor=None):
+        """
+        Return the objects following the cursor along with the cursor
+        for the next page, or None if this is the last page
+        """
+
+        queryset = self.queryset.order_by(*self._ordering())
+
+        if cursor:
+            value, pk = decode_cursor(cursor, self._sort_field())
+            queryset = queryset.filter(self._seek(value, pk))
+
+        # Fetch one extra row to learn whether there is a next page
+        object_list = list(queryset[:self.per_page + 1])
+        next_cursor = None
+
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            last = object_list[-1]
+            next_cursor = encode_cursor(self._value(last), last.pk)
+
+        return object_list, next_cursor
@@ -0,0 +1,155 @@
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.conf import settings
+from django.db import transaction
+
+from checkout.models import Order, OrderLineItem
+
+from .models import CoPurchase, ProductCard, Recommendation
+
+
+def count_pairs(lineitems):
+    """
+    Return a Counter of how many orders contain each ordered pair of
+    distinct products, given (order_id, product_id) rows
+    """
+
+    baskets = defaultdict(set)
+    for order_id, product_id in lineitems:
+        baskets[order_id].add(product_id)
+
+    counts = Counter()
+    for basket in baskets.values():
+        counts.update(permutations(basket, 2))
+    return counts
+
+
+def _add_pairs(counts):
+    """Add pair counts to the CoPurchase table"""
+
+    product_ids = {product_id for product_id, _ in counts}
+    existing = {
+        (pair.product_id, pair.other_id): pair
+        for pair in CoPurchase.objects.filter(
+            product_id__in=product_ids, other_id__in=product_ids)
+    }
+
+    changed, new = [], []
+    for (product_id, other_id), orders in counts.items():
+        pair = existing.get((product_id, other_id))
+        if pair is None:
+            new.append(CoPurchase(product_id=product_id, other_id=other_id,
+                                  orders=orders))
+        else:
+            pair.orders += orders
+            changed.append(pair)
+
+    CoPurchase.objects.bulk_update(changed, ['orders'], batch_size=500)
+    CoPurchase.objects.bulk_create(new, batch_size=500)
+
+
+def _recommendations(pairs, top_k):
+    """
+    Build the recommendations of (product id, other id, orders) rows
+    sorted by product, then by orders descending
+    """
+
+    ranked = defaultdict(list)
+    for product_id, other_id, orders in pairs:
+        if len(ranked[product_id]) < top_k:
+            ranked[product_id].append((other_id, orders))
+
+    return [
+        Recommendation(product_id=product_id, recommended_id=other_id,
+                       rank=rank, score=orders)
+        for product_id, neighbours in ranked.items()
+        for rank, (other_id, orders) in enumerate(neighbours, start=1)
+    ]
+
+
+def refresh(product_ids, top_k=None):
+    """Replace the recommendations of products from their pair counts"""
+
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    product_ids = list(product_ids)
+
+    recommendations = _recommendations(CoPurchase.objects.filter(
+        product_id__in=product_ids).order_by(
+            'product_id', '-orders', 'other_id').values_list(
+                'product_id', 'other_id', 'orders'), top_k)
+
+    Recommendation.objects.filter(product_id__in=product_ids).delete()
+    Recommendation.objects.bulk_create(recommendations, batch_size=500)
+
+
+def update(batch_size=1000, top_k=None):
+    """
+    Count the orders placed since the last run into the pair table and
+    refresh the recommendations of the products they contain, a batch
+    of orders per transaction. Orders are flagged in the same
+    transaction so a failed batch is counted again on the next run.
+    Meant to be run by one process at a time. Returns the number of
+    orders counted.
+    """
+
+    counted = 0
+
+    while True:
+        with transaction.atomic():
+            order_ids = list(Order.objects.filter(
+                co_purchases_counted=False).order_by('pk').values_list(
+                    'pk', flat=True)[:batch_size])
+            if not order_ids:
+                break
+
+            Order.objects.filter(pk__in=order_ids).update(
+                co_purchases_counted=True)
+            counts = count_pairs(OrderLineItem.objects.filter(
+                order_id__in=order_ids).values_list('order_id', 'product_id'))
+
+            _add_pairs(counts)
+            refresh({product_id for product_id, _ in counts}, top_k)
+
+        counted += len(order_ids)
+
+    return counted
+
+
+@transaction.atomic
+def rebuild(batch_size=1000, top_k=None):
+    """
+    Recount every order from scratch in one pass over the line items.
+    Orders are flagged first, so orders placed meanwhile are left to
+    update. Returns the number of orders counted.
+    """
+
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+
+    CoPurchase.objects.all().delete()
+    Recommendation.objects.all().delete()
+    counted = Order.objects.update(co_purchases_counted=True)
+
+    counts = count_pairs(OrderLineItem.objects.filter(
+        order__co_purchases_counted=True).values_list(
+            'order_id', 'product_id').iterator(chunk_size=batch_size))
+
+    CoPurchase.objects.bulk_create([
+        CoPurchase(product_id=product_id, other_id=other_id, orders=orders)
+        for (product_id, other_id), orders in counts.items()
+    ], batch_size=batch_size)
+    Recommendation.objects.bulk_create(_recommendations(
+        ((product_id, other_id, orders) for (product_id, other_id), orders
+         in sorted(counts.items(),
+                   key=lambda item: (item[0][0], -item[1], item[0][1]))),
+        top_k), batch_size=batch_size)
+
+    return counted
+
+
+def recommended_cards(product_id):
+    """Return the cards of the products recommended for a product"""
+
+    return ProductCard.objects.filter(
+        product__recommended_by__product_id=product_id).order_by(
+            'product__recommended_by__rank')
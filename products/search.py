@@ -0,0 +1,229 @@
+"""
+Full text search over product names and descriptions.
+
+The index lives in a products_search table maintained outside the ORM:
+an FTS5 virtual table on SQLite and a tsvector column with a GIN index
+on Postgres. Other databases fall back to icontains filtering.
+"""
+import re
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SEARCH_TABLE = 'products_search'
+
+# Name matches outrank description matches
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+SQLITE_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    "USING fts5(name, description, tokenize='porter unicode61')"
+)
+
+POSTGRES_CREATE = (
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+    "product_id bigint PRIMARY KEY REFERENCES products_product (id) "
+    "ON DELETE CASCADE, "
+    "document tsvector NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+    f"ON {SEARCH_TABLE} USING gin (document)",
+)
+
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('english', %s), 'A') || "
+    "setweight(to_tsvector('english', %s), 'B')"
+)
+
+
+def is_supported(vendor=None):
+    """Return True if the database has a native full text index"""
+
+    return (vendor or connection.vendor) in ('sqlite', 'postgresql')
+
+
+def create_index(schema_editor):
+    """Create the search table for the schema editor's database"""
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_index(schema_editor):
+    """Drop the search table for the schema editor's database"""
+
+    if is_supported(schema_editor.connection.vendor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def index_products(rows):
+    """
+    Add or replace index entries from (id, name, description) tuples
+    """
+
+    rows = [(pk, name, description or '') for pk, name, description in rows]
+    if not rows or not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description) '
+                'VALUES (%s, %s, %s)',
+                rows)
+        else:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (product_id, document) '
+                f'VALUES (%s, {POSTGRES_DOCUMENT}) '
+                'ON CONFLICT (product_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                rows)
+
+
+def index_product(product):
+    """Add or replace the index entry of a single product"""
+
+    index_products([(product.pk, product.name, product.description)])
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_removals():
+    """
+    Collect the removals made inside the block, such as those of the
+    delete signal of each product in a bulk delete, and remove them all
+    in one statement when it exits
+    """
+
+    _deferred.pks = set()
+    try:
+        yield
+        pks = _deferred.pks
+    finally:
+        _deferred.pks = None
+    remove_products(pks)
+
+
+def remove_products(pks):
+    """Remove the index entries of the given product ids"""
+
+    if getattr(_deferred, 'pks', None) is not None:
+        _deferred.pks.update(pks)
+        return
+
+    pks = list(pks)
+    if not pks or not is_supported():
+        return
+
+    column = 'rowid' if connection.vendor == 'sqlite' else 'product_id'
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE {column} = %s',
+            [(pk,) for pk in pks])
+
+
+def rebuild_index(queryset, batch_size=1000):
+    """Replace the whole index with the products of the queryset"""
+
+    if not is_supported():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'name', 'description').iterator(chunk_size=batch_size)
+
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            index_products(batch)
+            total += len(batch)
+            batch = []
+    index_products(batch)
+
+    return total + len(batch)
+
+
+def _terms(query):
+    """The words of free text, so user input is never parsed as syntax"""
+
+    return re.findall(r'\w+', query)
+
+
+def _fts5_query(terms):
+    """Turn search terms into an FTS5 query of quoted prefix terms"""
+
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms):
+    """Turn search terms into a to_tsquery query of prefix terms"""
+
+    return ' & '.join(f"'{term}':*" for term in terms)
+
+
+def search(queryset, query):
+    """
+    Filter a queryset keyed by product id (products or product cards) to
+    matches for the query and annotate each row with a search_rank,
+    where higher ranks are better. Every term must match, as a word or
+    the start of one.
+
+    The index is joined to the queryset's table once, so the rank of a
+    row is read from its joined entry instead of a subquery per row.
+    """
+
+    table = queryset.model._meta.db_table
+    pk = queryset.model._meta.pk.column
+    terms = _terms(query)
+
+    if not terms and is_supported():
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())).none()
+
+    if connection.vendor == 'sqlite':
+        rank = RawSQL(f'-bm25({SEARCH_TABLE}, %s, %s)',
+                      (NAME_WEIGHT, DESCRIPTION_WEIGHT),
+                      output_field=FloatField())
+        joined = queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE}.rowid = "{table}"."{pk}"',
+                   f'{SEARCH_TABLE} MATCH %s'],
+            params=[_fts5_query(terms)])
+
+    elif connection.vendor == 'postgresql':
+        tsquery = _tsquery(terms)
+        rank = RawSQL(f"ts_rank_cd({SEARCH_TABLE}.document, "
+                      f"to_tsquery('english', %s))",
+                      (tsquery,), output_field=FloatField())
+        joined = queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE}.product_id = "{table}"."{pk}"',
+                   f"{SEARCH_TABLE}.document @@ to_tsquery('english', %s)"],
+            params=[tsquery])
+
+    else:
+        queries = Q(name__icontains=query) | Q(description__icontains=query)
+        matches = Product.objects.non_polymorphic().filter(
+            queries).values('pk')
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+
+    return joined.annotate(search_rank=rank)
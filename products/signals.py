@@ -0,0 +1,52 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import cards, catalog_cache, search
+from .models import Product, Category
+
+
+@receiver(post_save)
+def update_product_card(sender, instance, raw=False, **kwargs):
+    """Refresh the listing card of a product and its subclasses when saved"""
+
+    if not isinstance(instance, Product):
+        return
+
+    if raw:
+        cards.update_cards([instance.pk])
+    else:
+        cards.update_card(instance)
+
+
+@receiver(post_save)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Reindex a product and its subclasses when saved"""
+
+    if not isinstance(instance, Product):
+        return
+
+    if raw:
+        # Fixtures save subclass rows without the parent fields
+        search.index_products(Product.objects.non_polymorphic().filter(
+            pk=instance.pk).values_list('pk', 'name', 'description'))
+    else:
+        search.index_product(instance)
+
+
+@receiver(post_delete)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Remove a deleted product from the search index"""
+
+    if isinstance(instance, Product):
+        search.remove_products([instance.pk])
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """Drop cached catalog pages affected by a product or category change"""
+
+    if isinstance(instance, Product):
+        catalog_cache.invalidate_product(instance.pk)
+    elif isinstance(instance, Category):
+        catalog_cache.invalidate_listings()
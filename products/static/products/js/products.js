@@ -1,6 +1,7 @@
 const scrollToTopBtn = document.querySelector("#scrollToTop");
 const categorySelect = document.querySelector("#category_selector");
 const sortSelect = document.querySelector("#sort_selector");
+const productGrid = document.querySelector("#product-grid");
 const currentUrl = new URL(window.location);
 
 // show button if user scrolls down 20px from the top
@@ -43,6 +44,33 @@ const sortProducts = () => {
   }
 };
 
+// fetch the next page of product cards when the end of the grid is visible
+const loadNextPage = async (observer) => {
+  const nextPage = document.querySelector("#next-page");
+  if (!nextPage) return;
+  observer.unobserve(nextPage);
+  const response = await fetch(nextPage.dataset.url);
+  if (!response.ok) return;
+  const html = await response.text();
+  nextPage.remove();
+  productGrid.insertAdjacentHTML("beforeend", html);
+  const next = document.querySelector("#next-page");
+  if (next) observer.observe(next);
+};
+
+if ("IntersectionObserver" in window) {
+  const pageObserver = new IntersectionObserver(
+    (entries, observer) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        loadNextPage(observer);
+      }
+    },
+    { rootMargin: "400px" }
+  );
+  const nextPage = document.querySelector("#next-page");
+  if (nextPage) pageObserver.observe(nextPage);
+}
+
 scrollToTopBtn.addEventListener("click", scrollToTop);
 categorySelect.addEventListener("change", selectCategory);
 sortSelect.addEventListener("change", sortProducts);
@@ -0,0 +1,13 @@
+from taskqueue.registry import task
+
+from .models import Product
+from .thumbnails import update_thumbnails
+
+
+@task
+def generate_product_thumbnails(product_id):
+    """Generate and upload the thumbnails of a product's image"""
+
+    product = Product.objects.filter(pk=product_id).first()
+    if product is not None:
+        update_thumbnails(product)
@@ -1,3 +1,423 @@
+import base64
+import io
+import json
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connection
+from django.db.models.functions import Lower
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from checkout.models import Order, OrderLineItem
+from monitoring.testing import Budget, QueryBudgetTestCase
+from products import catalog_cache, inventory, recommendations, search
+from products.catalog_import import CatalogImporter, read_rows
+from products.pagination import (CursorPaginator, InvalidCursor,
+                                 decode_cursor, encode_cursor)
+from products.models import (Book, Category, Collectible, CoPurchase,
+                             Product, ProductCard, Recommendation,
+                             StockReservation)
+
+
+class ProductViewBudgetTests(QueryBudgetTestCase):
+    """Narrow and broad listings, and products with few and many links"""
+
+    budgets = {
+        'products': Budget(queries=4, ms=500),
+        'products_page': Budget(queries=4, ms=250),
+        'product_detail': Budget(queries=5, ms=250),
+        'save_product': Budget(queries=7, ms=250),
+    }
+
+    def test_products(self):
+        path = reverse('products')
+        self.assertWithinBudget(
+            self.measure('get', path, {'q': 'heresy legion'}),
+            self.measure('get', path, {'sort': 'price', 'direction': 'desc'},
+                         user=self.large, bag=self.large.bag))
+
+    def test_products_page(self):
+        path = reverse('products_page')
+        self.assertWithinBudget(
+            self.measure('get', path, {'category': 'collectible'}),
+            self.measure('get', path, {'sort': 'name'}, user=self.large,
+                         bag=self.large.bag))
+
+    def test_product_detail(self):
+        linked = Recommendation.objects.values_list(
+            'product_id', flat=True).order_by('-rank').first()
+        unlinked = Recommendation.objects.values_list(
+            'product_id', flat=True)
+        lonely = next(pk for pk in reversed(self.catalog)
+                      if pk not in set(unlinked))
+        self.assertWithinBudget(
+            self.measure('get', reverse('product_detail', args=[lonely])),
+            self.measure('get', reverse('product_detail', args=[linked]),
+                         user=self.large, bag=self.large.bag))
+
+    def test_save_product(self):
+        path = reverse('save_product', args=[self.catalog[-1]])
+        data = {'redirect_url': reverse('products')}
+        self.assertWithinBudget(
+            self.measure('post', path, data, user=self.small),
+            self.measure('post', path, data, user=self.large,
+                         bag=self.large.bag))
+
+
+class InventoryTests(TestCase):
+    """Reserving, purchasing and releasing stock"""
+
+    def setUp(self):
+        self.book = Book.objects.create(name='Horus Rising', description='',
+                                        price='10.00', quantity=5)
+
+    def stock(self):
+        self.book.refresh_from_db()
+        return self.book.quantity, self.book.reserved
+
+    def test_reserve_and_release(self):
+        inventory.reserve('pi_1', {self.book.pk: 3})
+        self.assertEqual(self.stock(), (5, 3))
+        inventory.release('pi_1')
+        self.assertEqual(self.stock(), (5, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_reserve_replaces_previous_reservation(self):
+        inventory.reserve('pi_1', {self.book.pk: 3})
+        inventory.reserve('pi_1', {self.book.pk: 1})
+        self.assertEqual(self.stock(), (5, 1))
+
+    def test_reserved_stock_is_not_oversold(self):
+        inventory.reserve('pi_1', {self.book.pk: 3})
+        with self.assertRaises(inventory.OutOfStock) as raised:
+            inventory.reserve('pi_2', {str(self.book.pk): 3})
+        self.assertEqual(raised.exception.product_ids, [self.book.pk])
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.purchase({self.book.pk: 3})
+        self.assertEqual(self.stock(), (5, 3))
+        self.assertFalse(StockReservation.objects.filter(
+            payment_intent='pi_2').exists())
+
+    def test_purchase_consumes_reservation(self):
+        inventory.reserve('pi_1', {self.book.pk: 5})
+        self.assertTrue(ProductCard.objects.get(pk=self.book.pk).sold_out)
+        inventory.purchase({self.book.pk: 5}, payment_intent='pi_1')
+        self.assertEqual(self.stock(), (0, 0))
+        self.assertTrue(ProductCard.objects.get(pk=self.book.pk).sold_out)
+
+    def test_paid_purchase_oversells_to_no_stock(self):
+        inventory.reserve('pi_1', {self.book.pk: 2})
+        self.assertEqual(inventory.purchase(
+            {self.book.pk: 2}, payment_intent='pi_1', oversell=True), [])
+        self.assertEqual(self.stock(), (3, 0))
+        self.assertEqual(inventory.purchase(
+            {self.book.pk: 4}, oversell=True), [self.book.pk])
+        self.assertEqual(self.stock(), (0, 0))
+        self.assertTrue(ProductCard.objects.get(pk=self.book.pk).sold_out)
+
+    def test_release_expired(self):
+        inventory.reserve('pi_1', {self.book.pk: 2})
+        inventory.reserve('pi_2', {self.book.pk: 1}, ttl=60 * 60)
+        released = inventory.release_expired(
+            now=timezone.now() + timedelta(minutes=59), batch_size=1)
+        self.assertEqual(released, 2)
+        self.assertEqual(self.stock(), (5, 1))
+        self.assertEqual(list(StockReservation.objects.values_list(
+            'payment_intent', flat=True)), ['pi_2'])
+
+    def test_saving_stale_product_keeps_reservations(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        inventory.reserve('pi_1', {self.book.pk: 3})
+        stale.price = '12.00'
+        stale.save()
+        self.assertEqual(self.stock(), (5, 3))
+        self.assertEqual(str(self.book.price), '12.00')
+        inventory.release('pi_1')
+        self.assertEqual(self.stock(), (5, 0))
+
+
+class RecommendationTests(TestCase):
+    """Counting orders into "customers also bought" recommendations"""
+
+    def setUp(self):
+        self.first, self.second, self.third = [
+            Book.objects.create(name=name, description='', price='10.00')
+            for name in ('Horus Rising', 'False Gods', 'Galaxy in Flames')]
+
+    def order(self, *products):
+        order = Order.objects.create(
+            full_name='Customer', email='customer@example.com',
+            phone_number='01234567890', country='GB', town_or_city='Town',
+            street_address1='1 Street')
+        OrderLineItem.objects.bulk_create([
+            OrderLineItem(order=order, product=product, quantity=1,
+                          lineitem_total=product.price)
+            for product in products])
+
+    def recommended(self, product):
+        return list(Recommendation.objects.filter(product=product).values_list(
+            'recommended_id', 'rank', 'score'))
+
+    def test_count_pairs(self):
+        self.assertEqual(recommendations.count_pairs(
+            [(1, 10), (1, 11), (1, 10), (2, 10), (2, 11), (3, 12)]),
+            Counter({(10, 11): 2, (11, 10): 2}))
+        self.assertEqual(recommendations.count_pairs([]), Counter())
+
+    def test_update_counts_new_orders_once(self):
+        self.order(self.first, self.second)
+        self.order(self.first, self.second, self.third)
+        self.assertEqual(recommendations.update(batch_size=1), 2)
+        self.assertEqual(self.recommended(self.first),
+                         [(self.second.pk, 1, 2), (self.third.pk, 2, 1)])
+        self.assertEqual(recommendations.update(), 0)
+
+        self.order(self.first, self.third)
+        self.order(self.first, self.third)
+        self.assertEqual(recommendations.update(), 2)
+        self.assertEqual(self.recommended(self.first),
+                         [(self.third.pk, 1, 3), (self.second.pk, 2, 2)])
+        self.assertEqual(self.recommended(self.second),
+                         [(self.first.pk, 1, 2), (self.third.pk, 2, 1)])
+
+    def test_refresh_keeps_the_top_k(self):
+        self.order(self.first, self.second)
+        self.order(self.first, self.second, self.third)
+        recommendations.update()
+        recommendations.refresh([self.first.pk], top_k=1)
+        self.assertEqual(self.recommended(self.first),
+                         [(self.second.pk, 1, 2)])
+        self.assertEqual(len(self.recommended(self.third)), 2)
+
+    def test_rebuild_matches_update(self):
+        self.order(self.first, self.second)
+        self.order(self.first, self.second, self.third)
+        self.order(self.second, self.third)
+        recommendations.update()
+        updated = list(Recommendation.objects.order_by(
+            'product', 'rank').values_list(
+                'product_id', 'recommended_id', 'rank', 'score'))
+
+        CoPurchase.objects.update(orders=0)
+        self.assertEqual(recommendations.rebuild(batch_size=2), 3)
+        self.assertEqual(list(Recommendation.objects.order_by(
+            'product', 'rank').values_list(
+                'product_id', 'recommended_id', 'rank', 'score')), updated)
+        self.assertEqual(CoPurchase.objects.get(
+            product=self.second, other=self.third).orders, 2)
+        self.assertEqual(recommendations.update(), 0)
+
+
+class CatalogCacheTests(TestCase):
+    """Cached catalog pages live in the cache shared by every process"""
+
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(name='Horus Rising', description='',
+                                        price='10.00', quantity=5)
+
+    def other_process(self):
+        """Return a cache reading the table, as another process would"""
+
+        return DatabaseCache(settings.CACHES['default']['LOCATION'], {})
+
+    def test_change_in_one_process_invalidates_all(self):
+        url = reverse('product_detail', args=[self.book.pk])
+        self.assertContains(self.client.get(url), 'Horus Rising')
+        self.assertIsNotNone(self.other_process().get(
+            catalog_cache.detail_key(self.book.pk)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(pk=self.book.pk).update(name='False Gods')
+            inventory.purchase({self.book.pk: 1})
+        self.assertIsNone(self.other_process().get(
+            catalog_cache.detail_key(self.book.pk)))
+        self.assertContains(self.client.get(url), 'False Gods')
+
+    def test_stats_are_shared(self):
+        url = reverse('product_detail', args=[self.book.pk])
+        self.client.get(url)
+        self.client.get(url)
+        with mock.patch.object(catalog_cache, 'cache', self.other_process()):
+            self.assertEqual(catalog_cache.stats(),
+                             {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+class CatalogImportTests(TestCase):
+    """Importing new products and updating existing ones by sku"""
+
+    def setUp(self):
+        Category.objects.create(name='book')
+
+    def run_import(self, text, file_format='csv'):
+        importer = CatalogImporter(batch_size=2)
+        importer.run(read_rows(io.StringIO(text), file_format))
+        return importer
+
+    def test_create(self):
+        importer = self.run_import(
+            'type,sku,name,description,price,quantity,category,author\n'
+            'book,b1,Horus Rising,Book one,10.00,4,book,Dan Abnett\n'
+            'collectible,c1,Statue,Resin,50.00,,,\n'
+            'book,b2,False Gods,Book two,10.00,2,book,Graham McNeill\n')
+
+        self.assertEqual((importer.created, importer.errors), (3, []))
+        book = Book.objects.get(sku='b1')
+        self.assertEqual((book.author, book.quantity, book.category.name),
+                         ('Dan Abnett', 4, 'book'))
+        self.assertEqual(Collectible.objects.get(sku='c1').quantity, 1)
+        self.assertEqual(ProductCard.objects.count(), 3)
+
+    def test_create_without_bulk_insert_ids(self):
+        with mock.patch.object(type(connection.features),
+                               'can_return_rows_from_bulk_insert', False):
+            importer = self.run_import(
+                '{"type": "book", "sku": "b1", "name": "Horus Rising", '
+                '"description": "Book one", "price": "10.00"}\n'
+                '{"type": "book", "sku": "b2", "name": "False Gods", '
+                '"description": "Book two", "price": "10.00"}\n', 'jsonl')
+
+        self.assertEqual(importer.created, 2)
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_update_only_given_columns(self):
+        self.run_import(
+            'type,sku,name,description,price,quantity,image_url,author\n'
+            'book,b1,Horus Rising,Book one,10.00,4,https://example.com/b1.jpg,'
+            'Dan Abnett\n')
+        importer = self.run_import(
+            'type,sku,name,description,price\n'
+            'book,b1,Horus Rising,New description,12.00\n')
+
+        self.assertEqual((importer.created, importer.updated), (0, 1))
+        book = Book.objects.get(sku='b1')
+        self.assertEqual(book.description, 'New description')
+        self.assertEqual(str(book.price), '12.00')
+        self.assertEqual(book.quantity, 4)
+        self.assertEqual(book.image_url, 'https://example.com/b1.jpg')
+        self.assertEqual(book.author, 'Dan Abnett')
+
+    def test_invalid_rows_are_reported(self):
+        importer = self.run_import(
+            'type,sku,name,description,price\n'
+            'scroll,s1,Scroll,Old,1.00\n'
+            'book,b1,Horus Rising,Book one,-1\n'
+            'book,b2,False Gods,Book two,10.00\n')
+
+        self.assertEqual(importer.created, 1)
+        self.assertEqual([line for line, _ in importer.errors], [2, 3])
+
+
+class SearchTests(TestCase):
+    """Full text search of product names and descriptions"""
+
+    def setUp(self):
+        self.horus = Book.objects.create(
+            name='Horus Rising', description='The Great Crusade', price='10')
+        self.heresy = Book.objects.create(
+            name='False Gods', description='Horus falls to heresy',
+            price='10')
+        self.other = Book.objects.create(
+            name='Galaxy in Flames', description='Isstvan III', price='10')
+
+    def search(self, query):
+        return search.search(ProductCard.objects.all(), query)
+
+    def test_names_outrank_descriptions(self):
+        self.assertEqual(
+            list(self.search('horus').order_by('-search_rank').values_list(
+                'pk', flat=True)),
+            [self.horus.pk, self.heresy.pk])
+
+    def test_every_term_matches_as_a_prefix(self):
+        self.assertEqual(list(self.search('hor fal').values_list(
+            'pk', flat=True)), [self.heresy.pk])
+        self.assertFalse(self.search('"* OR').exists())
+
+    def test_index_is_joined_once(self):
+        sql = str(self.search('horus').query)
+        self.assertEqual(sql.count('SELECT'), 1)
+        self.assertEqual(sql.count('MATCH'), 1)
+
+    def test_pages_follow_the_rank(self):
+        paginator = CursorPaginator(self.search('horus'), '-search_rank',
+                                    per_page=1)
+        first, cursor = paginator.page()
+        second, cursor = paginator.page(cursor)
+        self.assertEqual([card.pk for card in first + second],
+                         [self.horus.pk, self.heresy.pk])
+
+
+class CursorPaginationTests(TestCase):
+    """Keyset pages cover a listing once, and bad cursors are rejected"""
+
+    def setUp(self):
+        books = Category.objects.create(name='book')
+        for number in range(7):
+            Book.objects.create(
+                name=f'Book {number % 3}', description='', quantity=1,
+                price=f'{10 + number % 4}.00',
+                category=books if number % 2 else None)
+
+    def walk(self, queryset, sortkey):
+        paginator = CursorPaginator(queryset, sortkey, per_page=2)
+        pks = []
+        cursor = None
+        while True:
+            page, cursor = paginator.page(cursor)
+            pks += [card.pk for card in page]
+            if cursor is None:
+                return pks
+
+    def test_pages_follow_the_ordering(self):
+        cards = ProductCard.objects.annotate(lower_name=Lower('name'))
+        for sortkey in (None, 'price', '-price', 'category', '-category',
+                        'lower_name', '-lower_name'):
+            ordering = CursorPaginator(cards, sortkey)._ordering()
+            self.assertEqual(
+                self.walk(cards, sortkey),
+                list(cards.order_by(*ordering).values_list('pk', flat=True)),
+                sortkey)
+
+    def test_cursor_round_trip(self):
+        price = ProductCard._meta.get_field('price')
+        self.assertEqual(decode_cursor(encode_cursor(Decimal('10.50'), 3),
+                                       price), (Decimal('10.50'), 3))
+        self.assertEqual(decode_cursor(encode_cursor(None, 3), price),
+                         (None, 3))
+
+    def tampered(self, value, pk=1):
+        data = json.dumps([value, pk]).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def test_tampered_cursors_are_invalid(self):
+        price = ProductCard._meta.get_field('price')
+        category = ProductCard._meta.get_field('category')
+        for cursor, field in ((self.tampered('abc'), price),
+                              (self.tampered('abc'), category),
+                              (self.tampered([1, 2]), price),
+                              (self.tampered(1, pk='x'), price),
+                              (self.tampered(1, pk=None), price),
+                              ('not base64!', price),
+                              ('w6k=', price)):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, field)
 
-# Create your tests here.
+    def test_views_reject_tampered_cursors(self):
+        for sort, value in (('price', 'abc'), ('category', 'abc'),
+                            ('name', ['abc'])):
+            cursor = self.tampered(value)
+            response = self.client.get(reverse('products_page'),
+                                       {'sort': sort, 'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get(reverse('products'),
+                                       {'sort': sort, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
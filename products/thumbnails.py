@@ -0,0 +1,107 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from PIL import Image, ImageOps
+
+THUMBNAIL_WIDTHS = (320, 640, 960)
+
+# Output formats as (Pillow format, file extension, save options)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True,
+                             'progressive': True}),
+}
+
+THUMBNAIL_DIR = 'thumbnails'
+
+
+def _encode(image, fmt):
+    pil_format, _, options = THUMBNAIL_FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_thumbnails(image_field, storage=default_storage):
+    """
+    Generate resized copies of an uploaded image in every thumbnail
+    width and format, and return their storage names as
+    {format: {width: name}}. Widths larger than the original are skipped.
+    """
+
+    stem = os.path.splitext(os.path.basename(image_field.name))[0]
+
+    with image_field.open('rb') as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.mode else 'RGB')
+
+    widths = [width for width in THUMBNAIL_WIDTHS if width < original.width]
+    widths.append(min(original.width, max(THUMBNAIL_WIDTHS)))
+
+    thumbnails = {fmt: {} for fmt in THUMBNAIL_FORMATS}
+    for width in sorted(set(widths)):
+        height = round(original.height * width / original.width)
+        resized = original.resize((width, height), Image.LANCZOS)
+
+        for fmt, (_, extension, _) in THUMBNAIL_FORMATS.items():
+            name = storage.save(
+                f'{THUMBNAIL_DIR}/{stem}-{width}w.{extension}',
+                ContentFile(_encode(resized, fmt)))
+            thumbnails[fmt][str(width)] = name
+
+    return thumbnails
+
+
+def delete_thumbnails(thumbnails, storage=default_storage):
+    """Delete previously generated thumbnails from storage"""
+
+    for names in thumbnails.values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def srcset(thumbnails, fmt, storage=default_storage):
+    """Return the srcset attribute value for one thumbnail format"""
+
+    names = (thumbnails or {}).get(fmt, {})
+    return ', '.join(
+        f'{storage.url(name)} {width}w'
+        for width, name in sorted(names.items(), key=lambda item: int(item[0])))
+
+
+def save_thumbnails(product, thumbnails):
+    """
+    Record newly generated thumbnails on a product and delete the ones
+    they replace
+    """
+
+    old_thumbnails = product.thumbnails or {}
+    product.thumbnails = thumbnails
+    product.save(update_fields=['thumbnails'])
+
+    # Storages that overwrite may have reused an old name
+    current = {name for names in thumbnails.values()
+               for name in names.values()}
+    delete_thumbnails({
+        fmt: {width: name for width, name in names.items()
+              if name not in current}
+        for fmt, names in old_thumbnails.items()})
+
+
+def update_thumbnails(product):
+    """Regenerate the thumbnails of a product after its image has changed"""
+
+    if product.image:
+        thumbnails = generate_thumbnails(product.image)
+    else:
+        thumbnails = {}
+
+    save_thumbnails(product, thumbnails)
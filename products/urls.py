@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.all_products, name='products'),
+    path('page/', views.products_page, name='products_page'),
     path('<int:product_id>/', views.product_detail, name='product_detail'),
     path('save/<int:product_id>/', views.save_product, name='save_product'),
 ]
@@ -1,23 +1,29 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.contrib import messages
-from django.db.models import Q
 from django.db.models.functions import Lower
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.template.loader import render_to_string
 
 from profiles.models import UserProfile, SavedProduct
 
-from .models import Product, Category
+from . import catalog_cache, recommendations, search
+from .models import Product, ProductCard, Category
+from .pagination import CursorPaginator, InvalidCursor
 
 
-def all_products(request):
-    """Return all products, including sorting and filtering"""
+def filter_products(request):
+    """
+    Apply the sorting, category and search parameters of the request
+    to the product listing. Returns None if the search term is empty.
+    """
 
-    products = Product.objects.all()
-    all_categories = Category.objects.all()
+    products = ProductCard.objects.all()
     query = None
     categories = None
     sort = None
     direction = None
+    sortkey = None
 
     if request.GET:
         if 'sort' in request.GET:
@@ -30,7 +36,6 @@ def all_products(request):
                 direction = request.GET['direction']
                 if direction == 'desc':
                     sortkey = f'-{sortkey}'
-            products = products.order_by(sortkey)
 
         if 'category' in request.GET:
             categories = request.GET['category'].split(',')
@@ -40,33 +45,121 @@ def all_products(request):
         if 'q' in request.GET:
             query = request.GET['q']
             if not query:
-                messages.error(request, 'No search criteria entered')
-                return redirect(reverse('products'))
+                return None
 
-            queries = Q(name__icontains=query) | Q(
-                description__icontains=query)
-            products = products.filter(queries)
+            products = search.search(products, query)
+            if sort is None:
+                # Relevance ordering, best matches first
+                sortkey = '-search_rank'
 
-    current_sorting = f'{sort}_{direction}'
-
-    context = {
+    return {
         'products': products,
+        'sortkey': sortkey,
         'search_term': query,
         'current_categories': categories,
-        'all_categories': all_categories,
-        'current_sorting': current_sorting,
+        'current_sorting': f'{sort}_{direction}',
+    }
+
+
+def next_page_url(params, cursor):
+    """Return the products page url for the page following the cursor"""
+
+    if not cursor:
+        return None
+
+    params = params.copy()
+    params['cursor'] = cursor
+
+    return f'{reverse("products_page")}?{params.urlencode()}'
+
+
+def cached_listing(request, listing, params):
+    """
+    Return the rendered product cards for the page selected by params,
+    served from the catalog cache when possible
+    """
+
+    def render_listing():
+        paginator = CursorPaginator(listing['products'], listing['sortkey'])
+        products, cursor = paginator.page(params.get('cursor'))
+        context = {
+            'products': products,
+            'next_page_url': next_page_url(params, cursor),
+        }
+        return {
+            'products_html': render_to_string(
+                'products/product_page.html', context, request),
+            'all_categories': list(Category.objects.all()),
+        }
+
+    return catalog_cache.get_or_render(
+        catalog_cache.listing_key(params), render_listing)
+
+
+def all_products(request):
+    """Return all products, including sorting and filtering"""
+
+    listing = filter_products(request)
+    if listing is None:
+        messages.error(request, 'No search criteria entered')
+        return redirect(reverse('products'))
+
+    try:
+        page = cached_listing(request, listing, request.GET)
+    except InvalidCursor:
+        params = request.GET.copy()
+        del params['cursor']
+        page = cached_listing(request, listing, params)
+
+    context = {
+        'products_html': page['products_html'],
+        'search_term': listing['search_term'],
+        'current_categories': listing['current_categories'],
+        'all_categories': page['all_categories'],
+        'current_sorting': listing['current_sorting'],
     }
 
     return render(request, 'products/products.html', context)
 
 
+def products_page(request):
+    """Return the next page of product cards for infinite scroll"""
+
+    listing = filter_products(request)
+    if listing is None:
+        return HttpResponseBadRequest('No search criteria entered')
+
+    try:
+        page = cached_listing(request, listing, request.GET)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+
+    return HttpResponse(page['products_html'])
+
+
 def product_detail(request, product_id):
     """Return individual product details"""
 
-    product = get_object_or_404(Product, pk=product_id)
+    def render_detail():
+        product = get_object_or_404(Product, pk=product_id)
+        return {
+            'pk': product.pk,
+            'name': product.name,
+            'sold_out': product.available <= 0,
+            'image_html': render_to_string(
+                'products/product_detail_image.html',
+                {'product': product}, request),
+            'info_html': render_to_string(
+                'products/product_detail_info.html',
+                {'product': product}, request),
+        }
+
+    product = catalog_cache.get_or_render(
+        catalog_cache.detail_key(product_id), render_detail)
 
     context = {
         'product': product,
+        'recommended': recommendations.recommended_cards(product_id),
     }
 
     return render(request, 'products/product_detail.html', context)
@@ -1,3 +1,261 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from checkout import sales
+from checkout.models import Order, OrderLineItem
+from monitoring import profiling
+from monitoring.testing import Budget, QueryBudgetTestCase
+from products.models import Book, Category, Product, ProductCard
+
+
+class ProfileViewBudgetTests(QueryBudgetTestCase):
+    """Account pages of a new customer and of a long standing one"""
+
+    budgets = {
+        'profile': Budget(queries=2, ms=250),
+        'order_history': Budget(queries=6, ms=500),
+        'order_summary': Budget(queries=4, ms=250),
+        'details': Budget(queries=3, ms=250),
+        'address_book': Budget(queries=6, ms=500),
+        'add_address': Budget(queries=3, ms=1000),
+        'edit_address': Budget(queries=4, ms=1000),
+        'saved': Budget(queries=4, ms=500),
+        'remove_product': Budget(queries=7, ms=250),
+    }
+
+    def assertAccountPageWithinBudget(self, method, url_name, data=None):
+        path = reverse(url_name)
+        self.assertWithinBudget(
+            self.measure(method, path, data, user=self.small),
+            self.measure(method, path, data, user=self.large,
+                         bag=self.large.bag))
+
+    def test_profile(self):
+        self.assertAccountPageWithinBudget('get', 'profile')
+
+    def test_order_history(self):
+        self.assertAccountPageWithinBudget('get', 'order_history')
+
+    def test_order_summary(self):
+        def order_number(user):
+            return Order.objects.filter(
+                user_profile=user.userprofile).first().order_number
+
+        self.assertWithinBudget(
+            self.measure('get', reverse('order_summary', args=[
+                order_number(self.small)]), user=self.small),
+            self.measure('get', reverse('order_summary', args=[
+                order_number(self.large)]), user=self.large,
+                bag=self.large.bag))
+
+    def test_details(self):
+        self.assertAccountPageWithinBudget('get', 'details')
+
+    def test_address_book(self):
+        self.assertAccountPageWithinBudget('get', 'address_book')
+
+    def test_add_address(self):
+        self.assertAccountPageWithinBudget('get', 'add_address')
+
+    def test_edit_address(self):
+        def address_id(user):
+            return user.userprofile.addresses.first().pk
+
+        self.assertWithinBudget(
+            self.measure('get', reverse('edit_address', args=[
+                address_id(self.small)]), user=self.small),
+            self.measure('get', reverse('edit_address', args=[
+                address_id(self.large)]), user=self.large,
+                bag=self.large.bag))
+
+    def test_saved(self):
+        self.assertAccountPageWithinBudget('get', 'saved')
+
+    def test_remove_product(self):
+        path = reverse('remove_product', args=[self.catalog[0]])
+        data = {'redirect_url': reverse('saved')}
+        self.assertWithinBudget(
+            self.measure('post', path, data, user=self.small),
+            self.measure('post', path, data, user=self.large,
+                         bag=self.large.bag))
+
+
+class ProductManagementViewBudgetTests(QueryBudgetTestCase):
+    """Store management pages over one product and over many"""
+
+    budgets = {
+        'admin': Budget(queries=6, ms=500),
+        'sales': Budget(queries=6, ms=500),
+        'add_product': Budget(queries=3, ms=500),
+        'edit_product': Budget(queries=6, ms=500),
+        'update_products': Budget(queries=11, ms=500),
+        'delete_product': Budget(queries=36, ms=500),
+    }
+
+    def measure_admin(self, method, path, data=None):
+        return self.measure(method, path, data, user=self.superuser)
+
+    def test_admin(self):
+        path = reverse('admin')
+        self.assertWithinBudget(
+            self.measure_admin('get', path, {'q': f'{self.catalog[-1]}'}),
+            self.measure_admin('get', path))
+
+    def test_sales(self):
+        path = reverse('sales')
+        self.assertWithinBudget(self.measure_admin('get', path, {'days': 7}),
+                                self.measure_admin('get', path,
+                                                   {'days': 365}))
+
+    def test_add_product(self):
+        category = Category.objects.get(name='book')
+        self.assertWithinBudget(
+            self.measure_admin('get', reverse('add_product',
+                                              args=[category.pk])),
+            self.measure_admin('get', reverse('add_product',
+                                              args=[category.pk])))
+
+    def test_edit_product(self):
+        first, last = self.catalog[0], self.catalog[-1]
+        self.assertWithinBudget(
+            self.measure_admin('get', reverse('edit_product', args=[first])),
+            self.measure_admin('get', reverse('edit_product', args=[last])))
+
+    def edits(self, count):
+        data = {'product': [], 'redirect_url': reverse('admin')}
+        products = Product.objects.non_polymorphic().filter(
+            pk__in=self.catalog[:count])
+        for product in products:
+            data['product'].append(str(product.pk))
+            data[f'price-{product.pk}'] = product.price + 1
+            data[f'quantity-{product.pk}'] = product.quantity + 1
+            data[f'original-price-{product.pk}'] = product.price
+            data[f'original-quantity-{product.pk}'] = product.quantity
+        return data
+
+    def test_update_products(self):
+        path = reverse('update_products')
+        self.assertWithinBudget(
+            self.measure_admin('post', path, self.edits(1)),
+            self.measure_admin('post', path, self.edits(50)))
+
+    def test_delete_product(self):
+        path = reverse('delete_product')
+        small = self.measure_admin(
+            'post', path, {'delete': [str(self.catalog[-1])]})
+        large = self.measure_admin(
+            'post', path, {'delete': [str(pk) for pk in self.catalog[-21:-1]]})
+        self.assertFalse(ProductCard.objects.filter(
+            pk__in=self.catalog[-21:]).exists())
+        self.assertWithinBudget(small, large)
+
+
+class RequestProfileViewBudgetTests(QueryBudgetTestCase):
+    """Stored request profiles, few of them and many"""
+
+    budgets = {
+        'request_profiles': Budget(queries=2, ms=500),
+        'request_profile': Budget(queries=2, ms=1000),
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(PROFILER_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def profile(self, path):
+        """Profile a request as the superuser, returning the profile id"""
+
+        response = self.measure(
+            'get', path, {profiling.PROFILE_PARAM: profiling.make_token(
+                self.superuser)}, user=self.superuser).response
+        self.assertEqual(response.status_code, 200)
+        return response['X-Profile-Id']
+
+    def test_token_is_checked(self):
+        token = profiling.make_token(self.superuser)
+        for user in (self.small, None):
+            response = self.measure('get', reverse('home'),
+                                    {profiling.PROFILE_PARAM: token},
+                                    user=user).response
+            self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.recent(), [])
+
+    def test_token_follows_secret_key(self):
+        token = profiling.make_token(self.superuser)
+        self.assertTrue(profiling.is_allowed(self.superuser, token))
+        with override_settings(SECRET_KEY='rotated'):
+            self.assertFalse(profiling.is_allowed(self.superuser, token))
+
+    def test_request_profiles(self):
+        path = reverse('request_profiles')
+        small = self.measure('get', path, user=self.superuser)
+        for _ in range(20):
+            self.profile(reverse('home'))
+        large = self.measure('get', path, user=self.superuser)
+        self.assertEqual(len(profiling.recent()), 20)
+        self.assertWithinBudget(small, large)
+
+    def test_request_profile(self):
+        small = self.profile(reverse('home'))
+        large = self.profile(reverse('products'))
+        self.assertWithinBudget(
+            self.measure('get', reverse('request_profile', args=[small]),
+                         user=self.superuser),
+            self.measure('get', reverse('request_profile', args=[large]),
+                         {'view': 'tree'}, user=self.superuser))
+
+
+class SalesDashboardTests(TestCase):
+    """The sales dashboard totals the selected period only"""
+
+    def setUp(self):
+        self.superuser = get_user_model().objects.create_superuser(
+            'sales_admin', 'sales_admin@example.com', 'password')
+        self.client.force_login(self.superuser)
+        self.old = Book.objects.create(name='Old seller', description='',
+                                       price=Decimal('50.00'))
+        self.recent = Book.objects.create(name='Recent seller',
+                                          description='',
+                                          price=Decimal('10.00'))
+
+    def sell(self, product, quantity, days_ago):
+        order = Order.objects.create(
+            full_name='Customer', email='customer@example.com',
+            phone_number='01234567890', country='GB', town_or_city='Town',
+            street_address1='1 Street')
+        OrderLineItem.objects.bulk_create([OrderLineItem(
+            order=order, product=product, quantity=quantity,
+            lineitem_total=product.price * quantity)])
+        Order.objects.filter(pk=order.pk).update(
+            date=timezone.now() - timedelta(days=days_ago))
+        sales.record_order(order.pk)
+
+    def top_products(self, days):
+        response = self.client.get(reverse('sales'), {'days': days})
+        return [(row['name'], row['orders'], row['units'])
+                for row in response.context['top_products']]
+
+    def test_top_products_follow_the_period(self):
+        self.sell(self.old, 4, days_ago=60)
+        self.sell(self.recent, 1, days_ago=1)
+        self.sell(self.recent, 2, days_ago=2)
+
+        self.assertEqual(self.top_products(7), [('Recent seller', 2, 3)])
+        self.assertEqual(self.top_products(90), [('Old seller', 1, 4),
+                                                 ('Recent seller', 2, 3)])
+
+    def test_rebuild_matches_recorded_totals(self):
+        self.sell(self.old, 4, days_ago=60)
+        self.sell(self.recent, 1, days_ago=1)
+        recorded = self.top_products(90)
+        sales.rebuild()
+        self.assertEqual(self.top_products(90), recorded)
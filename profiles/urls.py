@@ -14,9 +14,14 @@ urlpatterns = [
     path('saved', views.saved, name='saved'),
     path('saved/remove/<int:product_id>', views.remove, name='remove_product'),
     path('admin/', views.admin, name='admin'),
+    path('admin/sales/', views.sales, name='sales'),
+    path('admin/profiles/', views.request_profiles, name='request_profiles'),
+    path('admin/profiles/<profile_id>/',
+         views.request_profile, name='request_profile'),
     path('admin/add/<int:category_id>', views.add_product, name='add_product'),
     path('admin/edit/<int:product_id>/',
          views.edit_product, name='edit_product'),
+    path('admin/update/', views.update_products, name='update_products'),
     path('admin/delete/',
          views.delete_product,
          name='delete_product'),
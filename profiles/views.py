@@ -1,18 +1,36 @@
+from datetime import timedelta
 from unittest import case
 from django.shortcuts import redirect, render, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.contrib import messages
+from django.http import Http404
 from django.urls import reverse
-
-from checkout.models import Order
-from products.models import Product
-from products.forms import ProductForm, BookForm, BoxedSetForm, CollectibleForm
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+
+from checkout.models import (DailyCategorySales, DailyProductSales,
+                             DailySales, Order)
+from checkout.summaries import render_orders
+from monitoring import profiling
+from products import bulk
+from products.models import Category, Product, ProductCard
+from products.pagination import CursorPaginator, InvalidCursor
+from products.forms import (ProductForm, BookForm, BoxedSetForm, CollectibleForm,
+                            ProductStockForm)
+from products.tasks import generate_product_thumbnails
 
 from .models import UserProfile, Address
 from .forms import UserForm, AddressForm
 
+ORDERS_PER_PAGE = 20
+PRODUCTS_PER_PAGE = 50
+# days the sales dashboard can report on
+SALES_PERIODS = (7, 30, 90, 365)
+
 
 @login_required
 def profile(request):
@@ -23,15 +41,25 @@ def profile(request):
     return render(request, template)
 
 
+@login_required
 def order_history(request):
-    """Return the user' order history"""
+    """Return the user's order history, a page at a time"""
 
     user_profile = get_object_or_404(UserProfile, user=request.user)
-    orders = user_profile.orders.all().order_by('-date')
+    orders = user_profile.orders.all()
+
+    paginator = CursorPaginator(orders, '-date', per_page=ORDERS_PER_PAGE)
+    try:
+        page, cursor = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        page, cursor = paginator.page(None)
 
     template = 'profiles/order_history.html'
     context = {
-        'orders': orders,
+        'order_count': orders.count(),
+        'order_htmls': render_orders(page, 'history', request),
+        'next_page_url': (f'{reverse("order_history")}?cursor={cursor}'
+                          if cursor else None),
     }
 
     return render(request, template, context)
@@ -46,6 +74,7 @@ def order_summary(request, order_number):
     template = 'checkout/checkout_success.html'
     context = {
         'order': order,
+        'order_html': render_orders([order], 'details', request)[0],
         'from_profile': True,
     }
 
@@ -197,7 +226,8 @@ def edit_address(request, address_id):
 def saved(request):
 
     user_profile = get_object_or_404(UserProfile, user=request.user)
-    saved_products = user_profile.saved.all()
+    saved_products = ProductCard.objects.filter(
+        product__saved__profile=user_profile)
 
     template = 'profiles/saved_products.html'
     context = {
@@ -225,18 +255,150 @@ def remove(request, product_id):
     return redirect(redirect_url)
 
 
+def filter_product_table(params):
+    """Apply the filters of the product management table to the cards"""
+
+    products = ProductCard.objects.select_related('category').annotate(
+        lower_name=Lower('name'), quantity=F('product__quantity'),
+        reserved=F('product__reserved'))
+
+    query = params.get('q', '').strip()
+    if query:
+        products = products.filter(
+            Q(name__icontains=query) | Q(sku__icontains=query))
+    if params.get('category'):
+        products = products.filter(category__name=params['category'])
+    if params.get('type'):
+        products = products.filter(product_type=params['type'])
+    if params.get('stock') == 'sold_out':
+        products = products.filter(sold_out=True)
+    elif params.get('stock') == 'in_stock':
+        products = products.filter(sold_out=False)
+
+    return products
+
+
 @login_required
 def admin(request):
-    """Return admin template for super users"""
+    """Return admin template for super users, a filtered page at a time"""
     if not request.user.is_superuser:
         messages.error(request, 'Unauthorized access')
         return redirect(reverse('home'))
 
-    products = Product.objects.all()
+    products = filter_product_table(request.GET)
+    paginator = CursorPaginator(products, 'lower_name',
+                                per_page=PRODUCTS_PER_PAGE)
+    try:
+        page, cursor = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        page, cursor = paginator.page(None)
+
+    next_page_url = None
+    if cursor:
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        next_page_url = f'{reverse("admin")}?{params.urlencode()}'
 
     template = 'profiles/admin.html'
     context = {
-        'products': products
+        'products': page,
+        'product_count': products.count(),
+        'next_page_url': next_page_url,
+        'categories': Category.objects.all(),
+        'product_types': ProductCard.objects.order_by(
+            'product_type').values_list('product_type', flat=True).distinct(),
+        'filters': request.GET,
+    }
+
+    return render(request, template, context)
+
+
+@login_required
+def sales(request):
+    """Return the sales dashboard for super users, read from the rollups"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Unauthorized access')
+        return redirect(reverse('home'))
+
+    try:
+        days = int(request.GET.get('days', SALES_PERIODS[1]))
+    except ValueError:
+        days = SALES_PERIODS[1]
+    if days not in SALES_PERIODS:
+        days = SALES_PERIODS[1]
+    since = timezone.localdate() - timedelta(days=days - 1)
+
+    daily = DailySales.objects.filter(day__gte=since).order_by('-day')
+    amounts = {'orders': Sum('orders'), 'units': Sum('units'),
+               'revenue': Sum('revenue')}
+
+    template = 'profiles/sales.html'
+    context = {
+        'days': days,
+        'period_options': SALES_PERIODS,
+        'totals': daily.aggregate(**amounts),
+        'daily': daily,
+        'categories': DailyCategorySales.objects.filter(
+            day__gte=since).values('category', 'product_type').annotate(
+                **amounts).order_by('-revenue'),
+        'top_products': DailyProductSales.objects.filter(
+            day__gte=since).values(
+                'product', name=F('product__name')).annotate(
+                    **amounts, last_sold=Max('day')).order_by('-revenue')[:20],
+    }
+
+    return render(request, template, context)
+
+
+@login_required
+def request_profiles(request):
+    """
+    Return the stored request profiles for super users, or send them to
+    a page of the site with the flag that profiles it
+    """
+    if not request.user.is_superuser:
+        messages.error(request, 'Unauthorized access')
+        return redirect(reverse('home'))
+
+    token = profiling.make_token(request.user)
+
+    path = request.GET.get('path', '').strip()
+    if path:
+        if url_has_allowed_host_and_scheme(
+                path, allowed_hosts={request.get_host()}):
+            separator = '&' if '?' in path else '?'
+            return redirect(
+                f'{path}{separator}{urlencode({profiling.PROFILE_PARAM: token})}')
+        messages.error(request, 'Only pages of this site can be profiled')
+
+    template = 'profiles/request_profiles.html'
+    context = {
+        'profiles': profiling.recent(),
+        'token': token,
+        'header': profiling.PROFILE_HEADER,
+    }
+
+    return render(request, template, context)
+
+
+@login_required
+def request_profile(request, profile_id):
+    """Return a stored request profile as a flamegraph or a call tree"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Unauthorized access')
+        return redirect(reverse('home'))
+
+    loaded = profiling.load(profile_id)
+    if loaded is None:
+        raise Http404('No such profile')
+    profile, stats = loaded
+
+    template = 'profiles/request_profile.html'
+    context = {
+        'profile': profile,
+        'view': 'tree' if request.GET.get('view') == 'tree' else 'flame',
+        'tree': profiling.call_tree(stats),
+        'top_functions': profiling.top_functions(stats),
     }
 
     return render(request, template, context)
@@ -264,6 +426,8 @@ def add_product(request, category_id):
             if instance.image:
                 instance.image_url = instance.image.url
             instance.save()
+            if instance.image:
+                generate_product_thumbnails.delay(instance.pk)
             messages.success(request, 'Product added successfully')
             return redirect(reverse('admin'))
         else:
@@ -313,6 +477,8 @@ def edit_product(request, product_id):
             if instance.image:
                 instance.image_url = instance.image.url
             instance.save()
+            if 'image' in form.changed_data:
+                generate_product_thumbnails.delay(instance.pk)
             messages.success(request, 'Product updated successfully')
             return redirect(reverse('admin'))
     else:
@@ -334,16 +500,61 @@ def edit_product(request, product_id):
     return render(request, template, context)
 
 
+@login_required
+@require_POST
+def update_products(request):
+    """Apply the inline price and quantity edits of the product table"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Unauthorized access')
+        return redirect(reverse('home'))
+
+    changes = {}
+    invalid = []
+    for pid in request.POST.getlist('product'):
+        form = ProductStockForm({
+            'price': request.POST.get(f'price-{pid}'),
+            'quantity': request.POST.get(f'quantity-{pid}'),
+        })
+        original = ProductStockForm({
+            'price': request.POST.get(f'original-price-{pid}'),
+            'quantity': request.POST.get(f'original-quantity-{pid}'),
+        })
+        if not form.is_valid() or not pid.isdigit():
+            invalid.append(pid)
+            continue
+
+        # Only fields edited on the page are written
+        edited = {
+            field: value for field, value in form.cleaned_data.items()
+            if not original.is_valid() or original.cleaned_data[field] != value
+        }
+        if edited:
+            changes[int(pid)] = edited
+
+    updated = bulk.update_products(changes)
+
+    if invalid:
+        messages.error(request, f'{len(invalid)} row(s) had an invalid '
+                                'price or quantity and were not saved')
+    messages.success(request, f'Updated {updated} item(s)')
+
+    redirect_url = request.POST.get('redirect_url')
+    if not url_has_allowed_host_and_scheme(
+            redirect_url, allowed_hosts={request.get_host()}):
+        redirect_url = reverse('admin')
+    return redirect(redirect_url)
+
+
 @login_required
 @require_POST
 def delete_product(request):
-    """Delete a product from the store"""
+    """Delete the selected products from the store"""
     if not request.user.is_superuser:
         messages.error(request, 'Unauthorized access')
         return redirect(reverse('home'))
 
-    product_ids = request.POST.getlist('delete')
-    for pid in product_ids:
-        Product.objects.get(id=pid).delete()
-    messages.success(request, f'Deleted {len(product_ids)} item(s)')
+    product_ids = [pid for pid in request.POST.getlist('delete')
+                   if pid.isdigit()]
+    deleted = bulk.delete_products(product_ids)
+    messages.success(request, f'Deleted {deleted} item(s)')
     return redirect(reverse(admin))
@@ -2,15 +2,13 @@ const hamburger = document.querySelector("#hamburger");
 const sidebar = document.querySelector("#sidebar");
 const closeBtn = document.querySelector("#close-btn");
 const sidebarElements = document.querySelectorAll(".sidebar-focusable");
-const bag = document.querySelector("#bag");
-const bagPreview = document.querySelector("#bag-preview");
-const closeBagPreviewBtn = document.querySelector("#close-bag-preview");
-const removeItemBtn = document.querySelectorAll(".remove-item-btn");
-const clearBagBtn = document.querySelector("#clear-bag");
+const bagSlot = document.querySelector("#bag-slot");
+const bagCounts = document.querySelectorAll(".bag-count");
+// cacheable pages are served without a csrf cookie
 const csrfToken = document.cookie
   .split("; ")
   .find((row) => row.startsWith("csrftoken="))
-  .split("=")[1];
+  ?.split("=")[1];
 
 const openSidebar = () => {
   const width = getComputedStyle(sidebar).width;
@@ -34,6 +32,7 @@ const closeSidebar = () => {
 };
 
 const toggleBagPreview = () => {
+  const bagPreview = document.querySelector("#bag-preview");
   if (bagPreview) {
     const classList = bagPreview.classList;
     const message = document.querySelector(".js-snackbar__close");
@@ -80,21 +79,49 @@ const clearBag = async () => {
   }).then(() => location.reload());
 };
 
-hamburger.addEventListener("click", openSidebar);
-closeBtn.addEventListener("click", closeSidebar);
-if (bag) bag.addEventListener("click", toggleBagPreview);
-if (closeBagPreviewBtn)
-  closeBagPreviewBtn.addEventListener("click", function () {
-    if (bagPreview) {
-      const classList = bagPreview.classList;
-      closeBagPreview(classList);
-    }
-  });
-if (removeItemBtn) {
-  removeItemBtn.forEach((button) => {
-    button.addEventListener("click", function () {
-      removeItem(this);
+const bindBagControls = (root) => {
+  const bag = root.querySelector("#bag");
+  const closeBagPreviewBtn = root.querySelector("#close-bag-preview");
+  const removeItemBtn = root.querySelectorAll(".remove-item-btn");
+  const clearBagBtn = root.querySelector("#clear-bag");
+
+  if (bag) bag.addEventListener("click", toggleBagPreview);
+  if (closeBagPreviewBtn)
+    closeBagPreviewBtn.addEventListener("click", function () {
+      const bagPreview = document.querySelector("#bag-preview");
+      if (bagPreview) {
+        const classList = bagPreview.classList;
+        closeBagPreview(classList);
+      }
     });
+  if (removeItemBtn) {
+    removeItemBtn.forEach((button) => {
+      button.addEventListener("click", function () {
+        removeItem(this);
+      });
+    });
+  }
+  if (clearBagBtn) clearBagBtn.addEventListener("click", clearBag);
+};
+
+// the bag is loaded separately so page html is the same for every session
+const loadBagPreview = async () => {
+  if (!bagSlot) return;
+  const response = await fetch(bagSlot.dataset.url, {
+    credentials: "same-origin",
   });
-}
-if (clearBagBtn) clearBagBtn.addEventListener("click", clearBag);
+  if (!response.ok) return;
+  const data = await response.json();
+  if (data.count) {
+    bagSlot.innerHTML = data.html;
+    bindBagControls(bagSlot);
+    bagCounts.forEach((element) => {
+      element.textContent = `(${data.count})`;
+    });
+  }
+};
+
+hamburger.addEventListener("click", openSidebar);
+closeBtn.addEventListener("click", closeSidebar);
+bindBagControls(document.querySelector("main"));
+loadBagPreview();
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    readonly_fields = ('name', 'args', 'kwargs', 'status', 'attempts',
+                       'max_attempts', 'run_after', 'locked_by', 'created',
+                       'started', 'finished', 'duration', 'last_error')
+
+    list_display = ('name', 'status', 'attempts', 'created', 'finished',
+                    'duration')
+
+    list_filter = ('status', 'name')
+    ordering = ('-created',)
+
+
+admin.site.register(Task, TaskAdmin)
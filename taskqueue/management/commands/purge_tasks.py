@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from taskqueue import worker
+
+
+class Command(BaseCommand):
+    help = ('Delete the tasks that finished more than TASK_KEEP_FINISHED '
+            'seconds ago')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true',
+                            help='Delete failed tasks too')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(
+            seconds=settings.TASK_KEEP_FINISHED)
+        deleted = worker.purge(before, failed=options['failed'],
+                               batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} task(s)'))
@@ -0,0 +1,41 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from taskqueue.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds a worker waits when the queue '
+                                 'is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        workers = [Worker(stop, interval=options['interval'],
+                          once=options['once'])
+                   for _ in range(options['workers'])]
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        processed = sum(worker.processed for worker in workers)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Ran {processed} task(s) in {elapsed:.2f}s')
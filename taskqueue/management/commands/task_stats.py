@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q
+
+from taskqueue.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Show counts and run times of background tasks by name'
+
+    def handle(self, *args, **options):
+        rows = Task.objects.values('name').annotate(
+            pending=Count('pk', filter=Q(status=Task.PENDING)),
+            running=Count('pk', filter=Q(status=Task.RUNNING)),
+            done=Count('pk', filter=Q(status=Task.DONE)),
+            failed=Count('pk', filter=Q(status=Task.FAILED)),
+            avg_duration=Avg('duration'),
+            max_duration=Max('duration'),
+        ).order_by('name')
+
+        for row in rows:
+            avg_duration = (row['avg_duration'] or 0) * 1000
+            max_duration = (row['max_duration'] or 0) * 1000
+            self.stdout.write(
+                f'{row["name"]}: {row["pending"]} pending, '
+                f'{row["running"]} running, {row["done"]} done, '
+                f'{row["failed"]} failed, avg {avg_duration:.1f}ms, '
+                f'max {max_duration:.1f}ms')
+
+        if not rows:
+            self.stdout.write('No tasks')
@@ -0,0 +1,49 @@
+from django.utils import timezone
+
+from .models import Task
+
+registry = {}
+
+
+class TaskFunction:
+    """A registered task, called directly or queued with delay"""
+
+    def __init__(self, func, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the task to run as soon as a worker is free"""
+
+        return self.schedule(timezone.now(), *args, **kwargs)
+
+    def schedule(self, run_after, *args, **kwargs):
+        """
+        Queue the task to run after a given time. The row is written in
+        the caller's transaction, so the task is dropped if it rolls back.
+        """
+
+        return Task.objects.create(name=self.name, args=list(args),
+                                   kwargs=kwargs, run_after=run_after,
+                                   max_attempts=self.max_attempts)
+
+
+def task(func=None, max_attempts=5):
+    """
+    Register a function as a task. Arguments must be JSON serializable.
+
+    A task runs at least once, not exactly once: if its worker dies, or
+    it runs longer than TASK_LEASE, another worker runs it again, so task
+    functions must be safe to repeat. max_attempts counts those runs too.
+    """
+
+    def register(func):
+        task_function = TaskFunction(func, max_attempts)
+        registry[task_function.name] = task_function
+        return task_function
+
+    return register(func) if func else register
@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Task
+from .registry import task
+from .worker import claim, purge, run_task
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def fail():
+    raise ValueError('boom')
+
+
+@override_settings(TASK_RETRY_DELAY=10, TASK_LEASE=60)
+class TaskQueueTests(TestCase):
+    """Queueing, claiming, retrying and failing tasks"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_and_worker_runs(self):
+        queued = record.delay('first')
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertEqual(queued.args, ['first'])
+
+        claimed = claim('worker', limit=10)
+        self.assertEqual([claimed_task.pk for claimed_task in claimed],
+                         [queued.pk])
+        finished = run_task(claimed[0])
+
+        self.assertEqual(calls, ['first'])
+        finished.refresh_from_db()
+        self.assertEqual(finished.status, Task.DONE)
+        self.assertEqual(finished.attempts, 1)
+        self.assertEqual(finished.locked_by, '')
+
+    def test_claimed_task_is_not_claimed_again(self):
+        record.delay('once')
+        self.assertEqual(len(claim('first', limit=10)), 1)
+        self.assertEqual(claim('second', limit=10), [])
+
+    def test_task_of_dead_worker_is_claimed_after_its_lease(self):
+        record.delay('lost')
+        self.assertEqual(len(claim('dead')), 1)
+        self.assertEqual(claim('alive'), [])
+        # The lease runs out
+        Task.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+        claimed = claim('alive')
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_task_that_kills_its_worker_fails_on_its_last_attempt(self):
+        fail.delay()
+        for attempt in (1, 2):
+            self.assertEqual(len(claim(f'dead {attempt}')), 1)
+            Task.objects.update(
+                run_after=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(claim('alive'), [])
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.attempts, failed.locked_by),
+                         (Task.FAILED, 2, ''))
+        self.assertIn('Lease expired', failed.last_error)
+
+    def test_purge_finished_tasks(self):
+        old = timezone.now() - timedelta(days=8)
+        done = Task.objects.create(name='done', status=Task.DONE,
+                                   finished=old)
+        failed = Task.objects.create(name='failed', status=Task.FAILED,
+                                     finished=old)
+        recent = Task.objects.create(name='recent', status=Task.DONE,
+                                     finished=timezone.now())
+        pending = record.delay('later')
+        before = timezone.now() - timedelta(days=7)
+
+        self.assertEqual(purge(before, batch_size=1), 1)
+        self.assertFalse(Task.objects.filter(pk=done.pk).exists())
+        self.assertEqual(purge(before, failed=True), 1)
+        self.assertEqual(
+            set(Task.objects.values_list('pk', flat=True)),
+            {recent.pk, pending.pk})
+        self.assertFalse(Task.objects.filter(pk=failed.pk).exists())
+
+    def test_scheduled_task_waits(self):
+        record.schedule(timezone.now() + timedelta(minutes=5), 'later')
+        self.assertEqual(claim('worker'), [])
+
+    def test_failed_task_is_retried_with_backoff(self):
+        fail.delay()
+        before = timezone.now()
+        retried = run_task(claim('worker')[0])
+
+        self.assertEqual(retried.status, Task.PENDING)
+        self.assertEqual(retried.last_error, 'ValueError: boom')
+        self.assertGreaterEqual(retried.run_after,
+                                before + timedelta(seconds=10))
+        self.assertEqual(claim('worker'), [])
+
+        Task.objects.update(run_after=timezone.now())
+        failed = run_task(claim('worker')[0])
+        self.assertEqual(failed.status, Task.FAILED)
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual(claim('worker'), [])
+
+    def test_unknown_task_fails(self):
+        Task.objects.create(name='taskqueue.tests.missing', max_attempts=1)
+        failed = run_task(claim('worker')[0])
+        self.assertEqual(failed.status, Task.FAILED)
+        self.assertIn('Unknown task', failed.last_error)
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+SAVE_ATTEMPTS = 5
+
+
+def _claimable(now):
+    return Task.objects.filter(
+        Q(status=Task.PENDING)
+        | Q(status=Task.RUNNING, attempts__lt=F('max_attempts')),
+        run_after__lte=now)
+
+
+def fail_abandoned(now):
+    """
+    Fail the running tasks whose lease ran out on their last attempt,
+    so a task that kills its worker is not claimed again forever.
+    Returns the number of tasks failed.
+    """
+
+    return Task.objects.filter(
+        status=Task.RUNNING, run_after__lte=now,
+        attempts__gte=F('max_attempts')).update(
+            status=Task.FAILED, locked_by='', finished=now,
+            last_error='Lease expired: the worker stopped or the task ran '
+                       'longer than TASK_LEASE')
+
+
+def claim(worker_id, limit=1):
+    """
+    Claim up to limit due tasks for a worker and return them. Postgres
+    skips rows other workers have locked; SQLite cannot, so the claiming
+    UPDATE repeats the due condition and only the rows it changed are
+    returned.
+    """
+
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.TASK_LEASE)
+
+    with transaction.atomic():
+        fail_abandoned(now)
+        due = _claimable(now).order_by('run_after')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        pks = list(due.values_list('pk', flat=True)[:limit])
+        if not pks:
+            return []
+
+        _claimable(now).filter(pk__in=pks).update(
+            status=Task.RUNNING, locked_by=worker_id, started=now,
+            run_after=lease, attempts=F('attempts') + 1)
+
+    return list(Task.objects.filter(pk__in=pks, locked_by=worker_id,
+                                    status=Task.RUNNING, started=now))
+
+
+def purge(before, failed=False, batch_size=1000):
+    """
+    Delete the tasks that finished before a time, a batch per statement,
+    the failed ones too with failed. Pending and running tasks are kept.
+    Returns the number of tasks deleted.
+    """
+
+    statuses = [Task.DONE, Task.FAILED] if failed else [Task.DONE]
+    deleted = 0
+    while True:
+        pks = list(Task.objects.filter(
+            status__in=statuses, finished__lt=before).values_list(
+                'pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += Task.objects.filter(pk__in=pks).delete()[0]
+
+
+def retry_delay(attempts):
+    """Return the backoff before the next attempt at a failed task"""
+
+    return timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def run_task(task):
+    """Run a claimed task and record its outcome and timing"""
+
+    start = time.perf_counter()
+    try:
+        task_function = registry.get(task.name)
+        if task_function is None:
+            raise LookupError(f'Unknown task {task.name}')
+        task_function(*task.args, **task.kwargs)
+    except Exception as error:
+        logger.exception('Task %s (%s) failed', task.pk, task.name)
+        task.last_error = f'{type(error).__name__}: {error}'
+        if task.attempts >= task.max_attempts:
+            task.status = Task.FAILED
+        else:
+            task.status = Task.PENDING
+            task.run_after = timezone.now() + retry_delay(task.attempts)
+    else:
+        task.status = Task.DONE
+        task.last_error = ''
+
+    task.finished = timezone.now()
+    task.duration = time.perf_counter() - start
+    task.locked_by = ''
+
+    for attempt in range(1, SAVE_ATTEMPTS + 1):
+        try:
+            task.save(update_fields=['status', 'run_after', 'finished',
+                                     'duration', 'locked_by', 'last_error'])
+            break
+        except DatabaseError:
+            # SQLite reports a concurrent write as a locked database
+            if attempt == SAVE_ATTEMPTS:
+                raise
+            time.sleep(0.1 * attempt)
+
+    return task
+
+
+class Worker(threading.Thread):
+    """Claim and run tasks one at a time until stopped"""
+
+    def __init__(self, stop, interval=1.0, once=False):
+        super().__init__(daemon=True)
+        self.worker_id = uuid.uuid4().hex
+        self.stop = stop
+        self.interval = interval
+        self.once = once
+        self.processed = 0
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    tasks = claim(self.worker_id)
+                except DatabaseError:
+                    # SQLite reports a concurrent claim as a locked database
+                    logger.warning('Could not claim a task, retrying')
+                    self.stop.wait(self.interval)
+                    continue
+
+                if not tasks:
+                    if self.once:
+                        break
+                    self.stop.wait(self.interval)
+                    continue
+
+                for task in tasks:
+                    try:
+                        run_task(task)
+                    except DatabaseError:
+                        # The task runs again once its lease runs out
+                        logger.exception('Could not record task %s', task.pk)
+                    self.processed += 1
+        finally:
+            connection.close()
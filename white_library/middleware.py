@@ -0,0 +1,52 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+
+
+class PublicCacheMiddleware:
+    """
+    Mark pages served to anonymous users as publicly cacheable, as long
+    as the response does not carry anything specific to the client such
+    as cookies or an explicit cache policy of its own
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler await this middleware, as MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        if self.cacheable(request, response) and self.anonymous(request):
+            self.make_public(response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Looking up the user may query the session and user tables
+        if (self.cacheable(request, response)
+                and await sync_to_async(self.anonymous)(request)):
+            self.make_public(response)
+        return response
+
+    def cacheable(self, request, response):
+        return (request.method in ('GET', 'HEAD')
+                and response.status_code == 200
+                and not response.cookies
+                and not response.has_header('Cache-Control'))
+
+    def anonymous(self, request):
+        return not request.user.is_authenticated
+
+    def make_public(self, response):
+        patch_cache_control(response, public=True,
+                            max_age=settings.PUBLIC_CACHE_MAX_AGE)
@@ -59,11 +59,18 @@ INSTALLED_APPS = [
     'bag',
     'checkout',
     'profiles',
+    'taskqueue',
+    'outbox',
+    'monitoring',
     'storages',
 ]
 
 TAILWIND_APP_NAME = 'theme'
 
+# bootstrap icons are fetched from the CDN once and kept here, rather
+# than fetched on every render
+BS_ICONS_CACHE = os.getenv('BS_ICONS_CACHE', BASE_DIR / 'icon_cache')
+
 # required by django-tailwind
 INTERNAL_IPS = [
     "127.0.0.1"
@@ -71,20 +78,29 @@ INTERNAL_IPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'monitoring.middleware.ViewStatsMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'white_library.middleware.PublicCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
 
+# Only injects its script when DEBUG is on. It is sync only, so under
+# ASGI it would cost every request a switch to a thread and back.
+if DEBUG:
+    MIDDLEWARE.append(
+        "django_browser_reload.middleware.BrowserReloadMiddleware")
+
 ROOT_URLCONF = 'white_library.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'monitoring.backends.TimedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
             os.path.join(BASE_DIR, 'templates', 'allauth')
@@ -123,6 +139,9 @@ LOGIN_REDIRECT_URL = '/'
 
 WSGI_APPLICATION = 'white_library.wsgi.application'
 
+# max-age in seconds of pages served to anonymous users
+PUBLIC_CACHE_MAX_AGE = 60
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -139,6 +158,27 @@ else:
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# The cache is shared by every web and worker process so that a change
+# saved in one of them invalidates the pages cached by all of them
+
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_entries',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -213,13 +253,74 @@ STRIPE_CURRENCY = 'gbp'
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_WH_SECRET = os.getenv('STRIPE_WH_SECRET', '')
-
+# point the Stripe client at a local server such as fake_stripe
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+# (connect, read) seconds before a Stripe call is abandoned
+STRIPE_TIMEOUT = (3.05, 15)
+STRIPE_MAX_NETWORK_RETRIES = 2
+# pooled connections kept open to Stripe per process
+STRIPE_POOL_SIZE = 32
+
+# seconds stock stays reserved for an unpaid PaymentIntent
+STOCK_RESERVATION_TTL = 60 * 30
+
+# products shown as bought together on a product page
+RECOMMENDATIONS_TOP_K = 8
+
+# seconds before a failed webhook is retried, doubled on every attempt
+WEBHOOK_RETRY_DELAY = 5
+WEBHOOK_MAX_ATTEMPTS = 8
+# seconds a worker may process a webhook before another can reclaim it
+WEBHOOK_LEASE = 60 * 5
+# seconds a payment webhook leaves the checkout view to save its order
+WEBHOOK_ORDER_GRACE = 10
+
+# requests slower than this many milliseconds or running more queries
+# than VIEW_STATS_MAX_QUERIES are logged
+VIEW_STATS_SLOW_MS = 500
+VIEW_STATS_MAX_QUERIES = 30
+# where every process adds its view stats for the view_stats command
+VIEW_STATS_DIR = os.getenv('VIEW_STATS_DIR', BASE_DIR / 'view_stats')
+# seconds between writes of a process's view stats
+VIEW_STATS_FLUSH_INTERVAL = 30
+# where profiles of single requests are kept, and how many of them
+PROFILER_DIR = os.getenv('PROFILER_DIR', BASE_DIR / 'request_profiles')
+PROFILER_MAX_PROFILES = 50
+# seconds a superuser's profiling token stays valid
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+# multiplier of the response time budgets of view tests. They depend on
+# the machine, so they are only checked when this is set
+VIEW_BUDGET_TIME_FACTOR = float(os.getenv('VIEW_BUDGET_TIME_FACTOR', 0))
+
+# seconds before a failed task is retried, doubled on every attempt
+TASK_RETRY_DELAY = 10
+# seconds a worker may run a task before another worker can claim it.
+# Tasks that run longer are run twice, so keep them well under it
+TASK_LEASE = 60 * 5
+# seconds finished tasks are kept for task_stats before purge_tasks
+# deletes them
+TASK_KEEP_FINISHED = 60 * 60 * 24 * 7
+
+
+# mail is queued in the outbox and delivered by send_outbox through
+# OUTBOX_EMAIL_BACKEND
+EMAIL_BACKEND = 'outbox.backends.OutboxEmailBackend'
+OUTBOX_BATCH_SIZE = 50
+# most emails send_outbox delivers per second
+OUTBOX_RATE_LIMIT = 5
+# seconds before a failed email is retried, doubled on every attempt
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_MAX_ATTEMPTS = 5
 
 if 'DEVELOPMENT' in os.environ:
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+    # set OUTBOX_EMAIL_BACKEND to the smtp backend to deliver to smtp_sink
+    OUTBOX_EMAIL_BACKEND = os.environ.get(
+        'OUTBOX_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+    EMAIL_HOST = 'localhost'
+    EMAIL_PORT = 8025
     DEFAULT_FROM_EMAIL = 'white-library@example.com'
 else:
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
     EMAIL_USE_TLS = True
     EMAIL_PORT = 587
     EMAIL_HOST = 'smtp.gmail.com'